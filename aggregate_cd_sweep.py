@@ -0,0 +1,203 @@
+import os
+import glob
+import json
+import argparse
+import numpy as np
+import matplotlib.pyplot as plt
+from concurrent.futures import ThreadPoolExecutor
+
+from read_force_coeffs import find_segments, read_function_object
+from history_store import load_history
+
+COEFFS = ['Cd', 'Cl']
+
+def find_cases(save_path_base = None):
+    '''Returns list of (slant angle, case path) of all slant_angle_* folders, sorted by angle'''
+
+    if save_path_base is None:
+        save_path_base = os.environ['AHMED_SLANT_PATH']
+    cases = []
+    for case_path in glob.glob(os.path.join(save_path_base, 'slant_angle_*')):
+        try:
+            angle = float(os.path.basename(case_path)[len('slant_angle_'):])
+        except ValueError:
+            continue
+        if os.path.isdir(case_path):
+            cases.append((angle, case_path))
+    return sorted(cases)
+
+def load_sweep_histories(save_path_base = None, mmap_mode = 'r'):
+    '''Memory-map residuals/history.npy of every slant_angle_* case
+
+    Returns
+        histories (dict) : slant angle -> history
+    '''
+    histories = {}
+    for angle, case_path in find_cases(save_path_base):
+        fn_history = os.path.join(case_path, 'residuals', 'history.npy')
+        if os.path.exists(fn_history):
+            histories[angle] = load_history(fn_history, mmap_mode = mmap_mode)
+    return histories
+
+def case_sources(case_path):
+    '''Files holding the force coefficient history of a case, the first available of the
+    forceCoeffs output, residuals/history.npy (parse_solve_log.py) and residuals/cd.txt
+    (gather_cd.sh).
+
+    Returns
+        kind (str)      : 'forceCoeffs', 'history' or 'cd_txt', None if nothing is found
+        sources (list)  : [file, size, mtime] per file, changes whenever the files change
+    '''
+    _, fn_sources = find_segments(case_path, 'forceCoeffs')
+    kind = 'forceCoeffs'
+    if len(fn_sources) == 0:
+        for kind, fn_local in [('history', 'history.npy'), ('cd_txt', 'cd.txt')]:
+            fn_sources = [os.path.join(case_path, 'residuals', fn_local)]
+            if os.path.exists(fn_sources[0]):
+                break
+        else:
+            return None, []
+    return kind, [[os.path.relpath(fn, case_path), os.path.getsize(fn), os.path.getmtime(fn)] for fn in fn_sources]
+
+def load_case_coeffs(case_path, kind):
+    '''Returns dict of coefficient name -> history (np.ndarray) for the source kind of case_sources'''
+
+    if kind == 'forceCoeffs':
+        history = read_function_object(case_path, 'forceCoeffs')
+    elif kind == 'history':
+        history = load_history(os.path.join(case_path, 'residuals', 'history.npy'))
+    else:
+        return {'Cd' : np.atleast_1d(np.loadtxt(os.path.join(case_path, 'residuals', 'cd.txt')))}
+    return {coeff : np.asarray(history[coeff]) for coeff in COEFFS if coeff in history.dtype.names}
+
+def trailing_window_stats(values, window = 200):
+    '''Converged value of an iterative history from its last window values (nan ignored)
+
+    Returns
+        mean (float)    : mean over the window
+        std (float)     : standard deviation over the window, the uncertainty of the mean value
+        drift (float)   : mean of the second half of the window minus the first half
+    '''
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)][-window:]
+    if len(values) == 0:
+        return np.nan, np.nan, np.nan
+    half = len(values) // 2
+    drift = values[half:].mean() - values[:half].mean() if half > 0 else np.nan
+    return float(values.mean()), float(values.std()), float(drift)
+
+def aggregate_case(case_path, kind, window = 200):
+    '''Trailing window statistics of all coefficients of a case, as a flat dict'''
+
+    coeffs = load_case_coeffs(case_path, kind)
+    result = {'n_iterations' : max(len(values) for values in coeffs.values())}
+    for coeff in COEFFS:
+        mean, std, drift = trailing_window_stats(coeffs.get(coeff, []), window = window)
+        result.update({coeff : mean, '{}_std'.format(coeff) : std, '{}_drift'.format(coeff) : drift})
+    return result
+
+def aggregate_cd_sweep( save_path_base  = None,
+                        window          = 200,
+                        n_threads       = 16,
+                        is_cache        = True,
+                        is_plot         = True ):
+    '''Converged Cd and Cl of every case under save_path_base, one row per slant angle.
+
+    Cases are loaded concurrently by a thread pool (reading files, I/O bound). With is_cache
+    the per-case results are kept in save_path_base/cd_vs_slant_angle.json together with the
+    size and mtime of their source files, and only new or changed cases are read again.
+
+    Writes save_path_base/cd_vs_slant_angle.txt, and with is_plot cd_vs_slant_angle.jpg.
+
+    Args
+        save_path_base (str)    : defaults to $AHMED_SLANT_PATH
+        window (int)            : number of trailing iterations averaged
+        n_threads (int)         : number of reader threads
+        is_cache (bool)         : reuse and update the per-case cache
+        is_plot (bool)          : plot Cd and Cl vs. slant angle with the window standard deviation
+    Returns
+        table (np.ndarray) : structured array, slant_angle, n_iterations, Cd, Cd_std, Cd_drift, Cl, ...
+    '''
+    if save_path_base is None:
+        save_path_base = os.environ['AHMED_SLANT_PATH']
+    fn_cache = os.path.join(save_path_base, 'cd_vs_slant_angle.json')
+
+    cache = {}
+    if is_cache:
+        try:
+            with open(fn_cache, 'r') as f:
+                cache = json.load(f)
+            if cache.get('window') != window:
+                cache = {}
+        except (OSError, ValueError):
+            cache = {}
+    cases_cached = cache.get('cases', {})
+
+    cases   = find_cases(save_path_base)
+    sources = {case_path : case_sources(case_path) for _, case_path in cases}
+    results = {}
+    to_read = []
+    for angle, case_path in cases:
+        case_name = os.path.basename(case_path)
+        kind, fn_sources = sources[case_path]
+        if kind is None:
+            continue
+        cached = cases_cached.get(case_name)
+        if cached is not None and cached['kind'] == kind and cached['sources'] == fn_sources:
+            results[case_name] = cached
+        else:
+            to_read.append((case_name, case_path, kind, fn_sources))
+
+    def read_case(case):
+        case_name, case_path, kind, fn_sources = case
+        try:
+            result = aggregate_case(case_path, kind, window = window)
+        except (OSError, ValueError) as e:
+            print('{}: {}'.format(case_name, e))
+            return case_name, None
+        result.update({'kind' : kind, 'sources' : fn_sources})
+        return case_name, result
+
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        for case_name, result in executor.map(read_case, to_read):
+            if result is not None:
+                results[case_name] = result
+
+    if is_cache:
+        with open(fn_cache + '.tmp', 'w') as f:
+            json.dump({'window' : window, 'cases' : results}, f, indent=1)
+        os.replace(fn_cache + '.tmp', fn_cache)
+
+    columns = ['slant_angle', 'n_iterations'] + [name for coeff in COEFFS
+                                                  for name in [coeff, '{}_std'.format(coeff), '{}_drift'.format(coeff)]]
+    rows = [tuple([angle] + [results[os.path.basename(case_path)][name] for name in columns[1:]])
+            for angle, case_path in cases if os.path.basename(case_path) in results]
+    table = np.array(rows, dtype=[(name, 'f8') for name in columns])
+
+    fn_table = os.path.join(save_path_base, 'cd_vs_slant_angle.txt')
+    np.savetxt(fn_table, table.view('f8').reshape(len(table), len(columns)), fmt='%.8e', header=' '.join(columns))
+    print('{:d} cases, {:d} read, {:d} from cache'.format(len(table), len(to_read), len(table) - len(to_read)))
+
+    if is_plot and len(table) > 0:
+        fig, axes = plt.subplots(len(COEFFS), 1, sharex=True)
+        for ax, coeff in zip(axes, COEFFS):
+            ax.errorbar(table['slant_angle'], table[coeff], yerr=table['{}_std'.format(coeff)], marker='.', capsize=2)
+            ax.set_ylabel(coeff)
+        axes[-1].set_xlabel('slant angle [deg]')
+        fn_save = os.path.join(save_path_base, 'cd_vs_slant_angle.jpg')
+        plt.savefig(fn_save, dpi=150, bbox_inches='tight')
+        plt.close(fig)
+    return table
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tabulate and plot converged Cd, Cl vs. slant angle for all cases')
+    parser.add_argument('--window', type=int, default=200, help='number of trailing iterations averaged')
+    parser.add_argument('--threads', type=int, default=16, help='number of reader threads')
+    parser.add_argument('--no-cache', action='store_true', help='read every case again')
+    parser.add_argument('--no-plot', action='store_true', help='only write the table')
+    args = parser.parse_args()
+
+    aggregate_cd_sweep( window      = args.window,
+                        n_threads   = args.threads,
+                        is_cache    = not args.no_cache,
+                        is_plot     = not args.no_plot )
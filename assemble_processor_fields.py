@@ -0,0 +1,221 @@
+import os
+import re
+import sys
+import glob
+import json
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from read_foam_field import read_field, read_file_header, read_label_list, find_field_file, _n_components
+
+PROCESSOR_PATTERN   = re.compile(r'processor(\d+)$')
+# cell count in the note of the polyMesh owner header, e.g. "nPoints:123 nCells:456 ..."
+N_CELLS_PATTERN     = re.compile(r'nCells:\s*(\d+)')
+
+def processor_paths(case_path):
+    '''processor* folders of a decomposed case, ordered by processor number'''
+
+    paths = [path for path in glob.glob(os.path.join(case_path, 'processor*'))
+             if PROCESSOR_PATTERN.search(path) is not None and os.path.isdir(path)]
+    if len(paths) == 0:
+        raise FileNotFoundError('no processor folders in {}'.format(case_path))
+    return sorted(paths, key=lambda path: int(PROCESSOR_PATTERN.search(path).group(1)))
+
+def time_names(proc_path):
+    '''Time folder names of a processor folder, ordered by time'''
+
+    names = []
+    for name in os.listdir(proc_path):
+        try:
+            float(name)
+        except ValueError:
+            continue
+        names.append(name)
+    return sorted(names, key=float)
+
+def _resolve_time_name(case_path, time_name):
+    '''time_name, or the last time written to processor0 for 'latest' '''
+
+    if time_name != 'latest':
+        return time_name
+    names = time_names(processor_paths(case_path)[0])
+    if len(names) == 0:
+        raise FileNotFoundError('no time folders in {}'.format(processor_paths(case_path)[0]))
+    return names[-1]
+
+def _cell_proc_addressing(proc_path):
+    return os.path.join(proc_path, 'constant', 'polyMesh', 'cellProcAddressing')
+
+def count_cells(case_path, proc_paths = None):
+    '''Number of cells of the undecomposed mesh, from the header of constant/polyMesh/owner
+    if there is one, otherwise the sum of the processor cell counts'''
+
+    try:
+        note = N_CELLS_PATTERN.search(read_file_header(os.path.join(case_path, 'constant', 'polyMesh', 'owner')).get('note', ''))
+        if note is not None:
+            return int(note.group(1))
+    except (OSError, ValueError):
+        pass
+    if proc_paths is None:
+        proc_paths = processor_paths(case_path)
+    n_cells = 0
+    for proc_path in proc_paths:
+        try:
+            note = N_CELLS_PATTERN.search(read_file_header(os.path.join(proc_path, 'constant', 'polyMesh', 'owner')).get('note', ''))
+        except (OSError, ValueError):
+            note = None
+        n_cells += int(note.group(1)) if note is not None else len(read_label_list(_cell_proc_addressing(proc_path)))
+    return n_cells
+
+def _field_source(case_path, proc_paths, time_name, field_name):
+    '''[relative path, size, mtime] of the processor files of one field, to tell whether an
+    assembled field is up to date'''
+
+    source = []
+    for proc_path in proc_paths:
+        for fn in [_cell_proc_addressing(proc_path), find_field_file(proc_path, time_name, field_name)]:
+            if not os.path.exists(fn):
+                fn += '.gz'
+            source.append([os.path.relpath(fn, case_path), os.path.getsize(fn), os.path.getmtime(fn)])
+    return source
+
+def _scatter_processor(proc_path, time_name, field_names, fn_outputs = None):
+    '''Read the cell addressing and the internalField of field_names of one processor.
+
+    With fn_outputs (field name -> .npy of the global field) the values are written straight
+    into the memory-mapped global arrays, processors own disjoint cells so workers never
+    write the same rows, and nothing but the cell count is sent back.
+
+    Returns
+        n_cells (int)           : cells of the processor
+        addressing (np.ndarray) : global cell of each processor cell, None with fn_outputs
+        values (dict)           : field name -> (n_cells, ...) values, None with fn_outputs
+    '''
+    addressing  = read_label_list(_cell_proc_addressing(proc_path))
+    n_cells     = len(addressing)
+    values      = {}
+    for field_name in field_names:
+        field = read_field(find_field_file(proc_path, time_name, field_name), is_boundary = False)
+        values[field_name] = field['internalField']
+        if not field['is_uniform'] and len(field['internalField']) != n_cells:
+            raise ValueError('{} of {} has {:d} values for {:d} cells'.format(
+                                field_name, proc_path, len(field['internalField']), n_cells))
+
+    if fn_outputs is None:
+        return n_cells, addressing, values
+    for field_name, fn_output in fn_outputs.items():
+        output = np.load(fn_output, mmap_mode='r+')
+        output[addressing] = values[field_name]
+        output.flush()
+        del output
+    return n_cells, None, None
+
+def assemble_fields(case_path,
+                    time_name   = 'latest',
+                    field_names = ['U', 'p'],
+                    n_workers   = None,
+                    out_path    = None,
+                    is_cache    = True ):
+    '''Global internal fields of a decomposed case, assembled from the processor* folders
+    without reconstructPar. Processors are read in parallel and scattered into preallocated
+    global arrays through constant/polyMesh/cellProcAddressing. Only the requested fields
+    and time are read, nothing is written to the case time folders.
+
+    Args
+        case_path (str)         : case folder
+        time_name (str)         : time folder name, e.g. '1500', or 'latest'
+        field_names (list)      : fields to assemble, e.g. ['U', 'p']
+        n_workers (int)         : number of worker processes, defaults to os.cpu_count(), 1 reads
+                                  in this process
+        out_path (str)          : if given, fields are written to out_path/<field>.npy and
+                                  returned memory-mapped, so the global fields never have to
+                                  fit in memory. 'cache' for case_path/field_cache/<time>
+        is_cache (bool)         : with out_path, keep an assembled field whose processor files
+                                  are unchanged (checked against <field>.npy.json)
+    Returns
+        fields (dict) : field name -> (n_cells,) or (n_cells, n_components) values
+    '''
+    time_name   = _resolve_time_name(case_path, time_name)
+    proc_paths  = processor_paths(case_path)
+    if out_path == 'cache':
+        out_path = os.path.join(case_path, 'field_cache', time_name)
+
+    fields, sources = {}, {}
+    if out_path is not None and is_cache:
+        for field_name in field_names:
+            fn_output = os.path.join(out_path, '{}.npy'.format(field_name))
+            sources[field_name] = _field_source(case_path, proc_paths, time_name, field_name)
+            try:
+                with open(fn_output + '.json', 'r') as f:
+                    if json.load(f) == sources[field_name]:
+                        fields[field_name] = np.load(fn_output, mmap_mode='r')
+            except (OSError, ValueError):
+                pass
+    field_names = [field_name for field_name in field_names if field_name not in fields]
+    if len(field_names) == 0:
+        return fields
+
+    n_cells = count_cells(case_path, proc_paths)
+    assembled   = {}
+    fn_outputs  = None if out_path is None else {}
+    for field_name in field_names:
+        header = read_file_header(find_field_file(proc_paths[0], time_name, field_name))
+        n_components = _n_components(header['class'])
+        shape = (n_cells,) if n_components == 1 else (n_cells, n_components)
+        if out_path is None:
+            assembled[field_name] = np.full(shape, np.nan)
+        else:
+            os.makedirs(out_path, exist_ok=True)
+            fn_output = os.path.join(out_path, '{}.npy'.format(field_name))
+            if os.path.exists(fn_output + '.json'):
+                os.remove(fn_output + '.json')
+            np.lib.format.open_memmap(fn_output, mode='w+', dtype=np.float64, shape=shape).fill(np.nan)
+            fn_outputs[field_name] = fn_output
+
+    n_assembled = 0
+    def scatter(result):
+        n_proc_cells, addressing, values = result
+        if addressing is not None:
+            for field_name, field_values in values.items():
+                assembled[field_name][addressing] = field_values
+        return n_proc_cells
+
+    if n_workers == 1:
+        for proc_path in proc_paths:
+            n_assembled += scatter(_scatter_processor(proc_path, time_name, field_names, fn_outputs))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(_scatter_processor, proc_path, time_name, field_names, fn_outputs)
+                       for proc_path in proc_paths]
+            for future in as_completed(futures):
+                n_assembled += scatter(future.result())
+    if n_assembled != n_cells:
+        raise ValueError('processors hold {:d} cells, the mesh has {:d}'.format(n_assembled, n_cells))
+
+    if out_path is not None:
+        for field_name, fn_output in fn_outputs.items():
+            if is_cache:
+                with open(fn_output + '.json', 'w') as f:
+                    json.dump(sources[field_name], f)
+            assembled[field_name] = np.load(fn_output, mmap_mode='r')
+    fields.update(assembled)
+    return fields
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Assemble global fields from the processor folders of a case, without reconstructPar')
+    parser.add_argument('case_path', help='decomposed case folder')
+    parser.add_argument('--time', default='latest', help='time folder name, default the latest')
+    parser.add_argument('--fields', nargs='+', default=['U', 'p'], help='fields to assemble')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--out', default='cache',
+                        help='folder for the <field>.npy files, default case_path/field_cache/<time>')
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    fields = assemble_fields(args.case_path, time_name = args.time, field_names = args.fields,
+                             n_workers = args.workers, out_path = args.out)
+    for field_name, values in fields.items():
+        print('{:>8s} {} {}'.format(field_name, values.shape, getattr(values, 'filename', '')))
+    print('{:.2f} s'.format(time.perf_counter() - t0))
@@ -0,0 +1,183 @@
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import itertools
+import numpy as np
+import gmsh
+
+from stl_generator_slant_angle import ahmed_stl_generator_v3_sym, ahmed_stl_generator_v4_nonsym
+
+# generator classes and fixed arguments benchmarked, the v4 generator is mostly used free-stream
+GENERATORS = {  'v3_sym'            : (ahmed_stl_generator_v3_sym,      {'is_freestream' : False}),
+                'v4_nonsym'         : (ahmed_stl_generator_v4_nonsym,   {'is_freestream' : True}),
+                'v4_nonsym_legs'    : (ahmed_stl_generator_v4_nonsym,   {'is_freestream' : False}), }
+
+# 0 takes the branch without the slant wedge cut
+SLANT_ANGLES = [0, 12.5, 25, 35]
+
+FN_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_geometry_baseline.json')
+
+def benchmark_cases(generators      = ['v3_sym', 'v4_nonsym'],
+                    slant_angles    = SLANT_ANGLES,
+                    body_sizes      = [20, 10],
+                    legs_sizes      = [10],
+                    domain_sizes    = [None] ):
+    '''All combinations of generator, angle and mesh sizes
+
+    Returns
+        cases (list of dict) : name, generator, slant_angle_deg, gmsh_*_mesh_size
+    '''
+    cases = []
+    for generator, angle, body, legs, domain in itertools.product(generators, slant_angles, body_sizes,
+                                                                  legs_sizes, domain_sizes):
+        name = '{}_a{:g}_b{:g}_l{:g}_d{}'.format(generator, angle, body, legs, 'auto' if domain is None else '{:g}'.format(domain))
+        cases.append({  'name'                  : name,
+                        'generator'             : generator,
+                        'slant_angle_deg'       : angle,
+                        'gmsh_body_mesh_size'   : body,
+                        'gmsh_legs_mesh_size'   : legs,
+                        'gmsh_domain_mesh_size' : domain, })
+    return cases
+
+def run_case(case, save_path_base):
+    '''Build all components of one case end to end (body, domain, legs unless free-stream,
+    merged .stl) in a single gmsh session, writing to save_path_base
+
+    Returns
+        result (dict) : wall_s, n_triangles (all patches), stl_bytes (domain_merged.stl),
+                        stl_bytes_patches (the per-patch files)
+    '''
+    generator_class, generator_args = GENERATORS[case['generator']]
+    mesh_sizes = {name : case[name] for name in ['gmsh_body_mesh_size', 'gmsh_legs_mesh_size', 'gmsh_domain_mesh_size']}
+
+    t0 = time.perf_counter()
+    generator = generator_class(slant_angle_deg = case['slant_angle_deg'],
+                                save_path_base  = save_path_base,
+                                **generator_args, **mesh_sizes)
+    with generator:
+        gmsh.option.setNumber('General.Terminal', 0)
+        generator.generate_body(is_surface_patches = True, is_write_msh = False)
+        generator.generate_domain()
+        if not generator.is_freestream:
+            generator.generate_legs()
+        fn_merged = generator.write_merged_stl()
+    wall_s = time.perf_counter() - t0
+
+    fn_patches = [fn for fn in glob.glob(os.path.join(generator.save_path, '*.stl'))
+                  if os.path.basename(fn) != 'domain_merged.stl']
+    return {'wall_s'            : wall_s,
+            'n_triangles'       : int(sum(len(triangles) for _, triangles in generator.patches.values())),
+            'stl_bytes'         : os.path.getsize(fn_merged),
+            'stl_bytes_patches' : int(sum(os.path.getsize(fn) for fn in fn_patches)), }
+
+def benchmark_geometry(cases, n_repeat = 3):
+    '''Time every case n_repeat times, keeping the fastest run. Cases are written to a
+    temporary folder which is removed afterwards.
+
+    Returns
+        results (dict) : case name -> case parameters and run_case result
+    '''
+    save_path_base = tempfile.mkdtemp(prefix='ahmed_benchmark_')
+    results = {}
+    try:
+        for case in cases:
+            runs = []
+            for _ in range(n_repeat):
+                run_path = tempfile.mkdtemp(dir=save_path_base)
+                runs.append(run_case(case, run_path))
+                shutil.rmtree(run_path, ignore_errors=True)
+            result = min(runs, key=lambda run: run['wall_s'])
+            result['wall_s_all'] = [run['wall_s'] for run in runs]
+            results[case['name']] = dict(case, **result)
+            print('{:36s} {:8.3f} s {:10d} triangles {:12d} bytes'.format(
+                    case['name'], result['wall_s'], result['n_triangles'], result['stl_bytes']), flush=True)
+    finally:
+        shutil.rmtree(save_path_base, ignore_errors=True)
+    return results
+
+def machine_info():
+    '''Identifies where a baseline was recorded, timings only compare on the same machine'''
+
+    return {'platform'  : platform.platform(),
+            'processor' : platform.processor() or platform.machine(),
+            'n_cpus'    : os.cpu_count(),
+            'python'    : platform.python_version(),
+            'numpy'     : np.__version__,
+            'gmsh'      : gmsh.__version__, }
+
+def compare_to_baseline(results, baseline, threshold = 0.2):
+    '''Flag cases slower than the baseline by more than threshold (relative), and cases
+    whose triangle count or .stl size changed (different mesh, timings not comparable)
+
+    Returns
+        regressions (list of str)   : one line per slower case
+        changed (list of str)       : one line per case with a different mesh
+    '''
+    regressions, changed = [], []
+    for name, result in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        ratio = result['wall_s'] / base['wall_s']
+        if ratio > 1 + threshold:
+            regressions.append('{}: {:.3f} s vs. baseline {:.3f} s ({:+.0f}%)'.format(
+                                name, result['wall_s'], base['wall_s'], 100 * (ratio - 1)))
+        if result['n_triangles'] != base['n_triangles'] or result['stl_bytes'] != base['stl_bytes']:
+            changed.append('{}: {:d} triangles, {:d} bytes vs. baseline {:d} triangles, {:d} bytes'.format(
+                            name, result['n_triangles'], result['stl_bytes'], base['n_triangles'], base['stl_bytes']))
+    return regressions, changed
+
+def save_baseline(results, fn_baseline = FN_BASELINE):
+    with open(fn_baseline + '.tmp', 'w') as f:
+        json.dump({'machine' : machine_info(), 'time' : time.time(), 'results' : results}, f, indent=1)
+    os.replace(fn_baseline + '.tmp', fn_baseline)
+
+def _mesh_size(value):
+    '''Command line mesh size, 0 or "auto" for the gmsh default (None)'''
+
+    return None if value in ['0', 'auto', 'none', 'None'] else float(value)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the stl generators end to end and compare against a stored baseline')
+    parser.add_argument('--generators', nargs='+', default=['v3_sym', 'v4_nonsym'], choices=list(GENERATORS.keys()))
+    parser.add_argument('--angles', nargs='+', type=float, default=SLANT_ANGLES, help='slant angles in degrees')
+    parser.add_argument('--body', nargs='+', type=float, default=[20, 10], help='gmsh_body_mesh_size values')
+    parser.add_argument('--legs', nargs='+', type=float, default=[10], help='gmsh_legs_mesh_size values')
+    parser.add_argument('--domain', nargs='+', type=_mesh_size, default=[None],
+                        help='gmsh_domain_mesh_size values, auto for the gmsh default')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case, the fastest is kept')
+    parser.add_argument('--baseline', default=FN_BASELINE, help='baseline json file')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slow-down flagged as a regression')
+    args = parser.parse_args()
+
+    cases   = benchmark_cases(args.generators, args.angles, args.body, args.legs, args.domain)
+    results = benchmark_geometry(cases, n_repeat = args.repeat)
+
+    status = 0
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print('baseline saved to {}'.format(args.baseline))
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline['machine'] != machine_info():
+            print('warning: baseline recorded on {}'.format(baseline['machine']))
+        regressions, changed = compare_to_baseline(results, baseline, threshold = args.threshold)
+        n_compared = len([name for name in results if name in baseline['results']])
+        print('{:d} of {:d} cases compared, {:d} regressions, {:d} with a changed mesh'.format(
+                n_compared, len(results), len(regressions), len(changed)))
+        for line in regressions:
+            print('REGRESSION ' + line)
+        for line in changed:
+            print('CHANGED    ' + line)
+        status = int(len(regressions) > 0)
+    else:
+        print('no baseline at {}, run with --save-baseline to store one'.format(args.baseline))
+    sys.exit(status)
@@ -0,0 +1,428 @@
+import os
+import re
+import json
+import time
+import argparse
+import numpy as np
+
+from aggregate_cd_sweep import find_cases
+from read_foam_field import read_internal_field, read_file_header, read_label_list, find_field_file, _n_components
+from read_foam_mesh import read_cell_geometry, _mesh_file, MESH_FILES
+from assemble_processor_fields import assemble_fields, count_cells, time_names, processor_paths, _cell_proc_addressing, \
+                                      N_CELLS_PATTERN
+
+INPUT_NAMES     = ['x', 'y', 'z', 'slant_angle', 'dist']
+OUTPUT_FIELDS   = ['U', 'p', 'k', 'omega']
+FN_META         = 'dataset.json'
+FN_INDEX        = 'index.npy'
+START_TIME      = re.compile(r'^\s*startTime\s+([^;\s]+)\s*;', re.M)
+
+def case_times(case_path):
+    '''Time folder names of a case, reconstructed or in processor0, ordered by time'''
+
+    names = set(time_names(case_path))
+    if os.path.isdir(os.path.join(case_path, 'processor0')):
+        names.update(time_names(processor_paths(case_path)[0]))
+    return sorted(names, key=float)
+
+def case_n_cells(case_path):
+    '''Number of cells, from the polyMesh owner note, else from the cell geometry, else (case
+    only decomposed) from the processor cell counts'''
+
+    fn_owner = _mesh_file(os.path.join(case_path, 'constant', 'polyMesh'), 'owner')
+    if not os.path.exists(fn_owner):
+        if not os.path.isdir(os.path.join(case_path, 'processor0')):
+            raise FileNotFoundError('no mesh, neither constant/polyMesh nor processor folders')
+        return count_cells(case_path)
+    note = N_CELLS_PATTERN.search(read_file_header(fn_owner).get('note', ''))
+    if note is not None:
+        return int(note.group(1))
+    return len(read_cell_geometry(case_path)['cell_volumes'])
+
+def read_case_cell_centres(case_path):
+    '''Cell centres of the case mesh, from constant/polyMesh (see read_cell_geometry), else from
+    the processor meshes. Each processor mesh holds whole cells of the global mesh, so their
+    centres are scattered through cellProcAddressing into
+    case_path/field_cache/polyMesh/cell_centres_processors.npy, memory-mapped. It is reused as
+    long as the size and mtime of the processor polyMesh and cellProcAddressing files are
+    unchanged (checked against cell_centres_processors.npy.json).
+
+    Returns
+        cell_centres (np.ndarray) : (n_cells, 3)
+    '''
+    if os.path.exists(_mesh_file(os.path.join(case_path, 'constant', 'polyMesh'), 'faces')):
+        return read_cell_geometry(case_path)['cell_centres']
+
+    proc_paths  = processor_paths(case_path)
+    cache_path  = os.path.join(case_path, 'field_cache', 'polyMesh')
+    fn_centres  = os.path.join(cache_path, 'cell_centres_processors.npy')
+    source = []
+    for proc_path in proc_paths:
+        for name in MESH_FILES + ['cellProcAddressing']:
+            fn = _mesh_file(os.path.join(proc_path, 'constant', 'polyMesh'), name)
+            source.append([os.path.relpath(fn, case_path), os.path.getsize(fn), os.path.getmtime(fn)])
+    try:
+        with open(fn_centres + '.json', 'r') as f:
+            if json.load(f) == source:
+                return np.load(fn_centres, mmap_mode='r')
+    except (OSError, ValueError):
+        pass
+
+    os.makedirs(cache_path, exist_ok=True)
+    if os.path.exists(fn_centres + '.json'):
+        os.remove(fn_centres + '.json')
+    centres = np.lib.format.open_memmap(fn_centres, mode='w+', dtype=np.float64,
+                                        shape=(count_cells(case_path, proc_paths), 3))
+    for proc_path in proc_paths:
+        addressing = read_label_list(_cell_proc_addressing(proc_path))
+        centres[addressing] = read_cell_geometry(proc_path, is_cache = False)['cell_centres']
+    centres.flush()
+    del centres
+    with open(fn_centres + '.json', 'w') as f:
+        json.dump(source, f)
+    return np.load(fn_centres, mmap_mode='r')
+
+def read_case_field(case_path, time_name, field_name, n_cells):
+    '''internalField of a case, memory-mapped from its field_cache. Read from the time folder
+    if it was reconstructed, else assembled from the processor folders. A field parsed now is
+    cached and mapped again, so only one parsed field is held in memory at a time. Uniform
+    fields are broadcast to n_cells without a copy.
+
+    Returns
+        values (np.ndarray) : (n_cells,) or (n_cells, n_components)
+    '''
+    try:
+        fn_field = find_field_file(case_path, time_name, field_name)
+    except FileNotFoundError:
+        if not os.path.isdir(os.path.join(case_path, 'processor0')):
+            raise
+        return assemble_fields(case_path, time_name, [field_name], out_path = 'cache')[field_name]
+
+    n_components = _n_components(read_file_header(fn_field)['class'])
+    values = read_internal_field(case_path, time_name, field_name)
+    if np.ndim(values) == (0 if n_components == 1 else 1):
+        return np.broadcast_to(values, (n_cells,) if n_components == 1 else (n_cells, n_components))
+    if not isinstance(values, np.memmap):
+        del values
+        values = read_internal_field(case_path, time_name, field_name)
+    return values
+
+def has_field(case_path, time_name, field_name):
+    '''Whether time_name of the case holds field_name, reconstructed or in processor0'''
+
+    paths = [case_path]
+    if os.path.isdir(os.path.join(case_path, 'processor0')):
+        paths.append(processor_paths(case_path)[0])
+    return any(os.path.exists(os.path.join(path, time_name, field_name)) or
+               os.path.exists(os.path.join(path, time_name, field_name + '.gz')) for path in paths)
+
+def find_field_time(case_path, field_name, times):
+    '''Last of times holding field_name, reconstructed or decomposed'''
+
+    for time_name in reversed(times):
+        if has_field(case_path, time_name, field_name):
+            return time_name
+    raise FileNotFoundError('no {} in any time folder'.format(field_name))
+
+def read_start_time(case_path):
+    '''startTime of system/controlDict, 0 if it cannot be read'''
+
+    try:
+        with open(os.path.join(case_path, 'system', 'controlDict'), 'r') as f:
+            match = START_TIME.search(f.read())
+        return float(match.group(1)) if match is not None else 0.
+    except (OSError, ValueError):
+        return 0.
+
+def plan_case(case_path, time_name, dist_field, output_fields):
+    '''Time folders and size of one case. Raises (OSError or ValueError, with the reason) for
+    cases that cannot be used: not solved (the time is the start time, i.e. only the initial
+    conditions), a field missing, or no mesh.
+
+    Returns
+        case (dict) : case_path, time, dist_time, n_rows
+    '''
+    times = case_times(case_path)
+    if len(times) == 0:
+        raise FileNotFoundError('no time folders')
+    case_time = times[-1] if time_name == 'latest' else time_name
+    if float(case_time) <= read_start_time(case_path):
+        raise ValueError('time {} is the start time, the case is not solved'.format(case_time))
+    missing = [field_name for field_name in output_fields if not has_field(case_path, case_time, field_name)]
+    if len(missing) > 0:
+        raise FileNotFoundError('no {} at time {}'.format(', '.join(missing), case_time))
+    return {'case_path' : case_path,
+            'time'      : case_time,
+            'dist_time' : find_field_time(case_path, dist_field, times),
+            'n_rows'    : case_n_cells(case_path), }
+
+class shard_writer():
+    def __init__(self, out_path, n_rows, shard_rows, n_inputs, n_outputs, dtype):
+        '''Writes rows into fixed-size shards of memory-mapped .npy files,
+        inputs_<i>.npy and outputs_<i>.npy, preallocated since n_rows is known up front.
+        Only the shard being written is mapped.
+
+        ARGS:
+            out_path    : dataset folder
+            n_rows      : total number of rows
+            shard_rows  : rows per shard, the last shard holds the remainder
+            n_inputs    : input columns
+            n_outputs   : output columns
+            dtype       : shard dtype
+        '''
+        self.out_path   = out_path
+        self.n_rows     = n_rows
+        self.shard_rows = shard_rows
+        self.n_columns  = {'inputs' : n_inputs, 'outputs' : n_outputs}
+        self.dtype      = dtype
+        self.i_shard    = None
+        self.shards     = {}
+        self.n_shards   = int(np.ceil(n_rows / shard_rows))
+
+    def shard_names(self, i_shard):
+        return {kind : '{}_{:05d}.npy'.format(kind, i_shard) for kind in self.n_columns}
+
+    def _open(self, i_shard):
+        self.close()
+        n_shard_rows = min(self.shard_rows, self.n_rows - i_shard * self.shard_rows)
+        for kind, fn_local in self.shard_names(i_shard).items():
+            self.shards[kind] = np.lib.format.open_memmap(os.path.join(self.out_path, fn_local), mode='w+',
+                                                          dtype=self.dtype, shape=(n_shard_rows, self.n_columns[kind]))
+        self.i_shard = i_shard
+
+    def write(self, row, inputs, outputs):
+        '''Write rows starting at global row, splitting them across shards as needed'''
+
+        n = len(inputs)
+        i = 0
+        while i < n:
+            i_shard, i_row = divmod(row + i, self.shard_rows)
+            if i_shard != self.i_shard:
+                self._open(i_shard)
+            n_write = min(n - i, len(self.shards['inputs']) - i_row)
+            self.shards['inputs'][i_row:i_row + n_write] = inputs[i:i + n_write]
+            self.shards['outputs'][i_row:i_row + n_write] = outputs[i:i + n_write]
+            i += n_write
+
+    def close(self):
+        for shard in self.shards.values():
+            shard.flush()
+        self.shards = {}
+        self.i_shard = None
+
+def build_training_dataset( out_path,
+                            save_path_base  = None,
+                            time_name       = 'latest',
+                            dist_field      = 'distAhmed',
+                            output_fields   = OUTPUT_FIELDS,
+                            shard_rows      = 1 << 22,
+                            chunk_rows      = 1 << 18,
+                            dtype           = np.float32 ):
+    '''Stream (x, y, z, slant angle, dist) -> (U, p, k, omega) rows of every slant_angle_* case
+    into fixed-size shards of memory-mapped arrays.
+
+    Cell centres come from read_foam_mesh.read_cell_geometry, fields from the case time
+    folder or, for decomposed cases, assembled from the processor folders; both are cached
+    as .npy in the case field_cache and memory-mapped. Rows are copied chunk_rows at a time,
+    so memory use is bounded by one chunk, one shard mapping and parsing one field file,
+    whatever the number of cases or cells.
+
+    Writes to out_path
+        inputs_<i>.npy, outputs_<i>.npy : (shard_rows, 5) and (shard_rows, 6) shards, global row r
+                                          is row r % shard_rows of shard r // shard_rows
+        index.npy                       : global index, one row per case: case, slant_angle,
+                                          time, first_row, n_rows (cell c of the case is global
+                                          row first_row + c)
+        dataset.json                    : columns, shard_rows, n_rows, shard files, cases and the
+                                          skipped cases with the reason, written last, once all
+                                          shards are complete
+
+    Cases are skipped, with a message, if their time is the start time (not solved, only
+    the initial conditions), a field is missing at that time, or there is no mesh. Cases
+    only available decomposed take their cell centres from the processor meshes.
+
+    Args
+        out_path (str)          : dataset folder
+        save_path_base (str)    : folder of the slant_angle_* cases, defaults to $AHMED_SLANT_PATH
+        time_name (str)         : time folder of the outputs, 'latest' for the last of each case
+        dist_field (str)        : wall distance field written by ahmedPatchDist, taken from the
+                                  last time folder holding it
+        output_fields (list)    : output fields, vectors add one column per component
+        shard_rows (int)        : rows per shard
+        chunk_rows (int)        : rows copied at a time
+        dtype (np.dtype)        : dtype of the shards
+    Returns
+        meta (dict) : contents of dataset.json
+    '''
+    cases = find_cases(save_path_base)
+    if len(cases) == 0:
+        raise FileNotFoundError('no slant_angle_* cases in {}'.format(save_path_base or os.environ['AHMED_SLANT_PATH']))
+
+    # every case is sized and its times resolved first, so shards can be preallocated. Cases
+    # that are not solved or lack a field or mesh are skipped
+    case_info, skipped = [], []
+    first_row = 0
+    for angle, case_path in cases:
+        try:
+            case = plan_case(case_path, time_name, dist_field, output_fields)
+        except (OSError, ValueError) as e:
+            print('{:48s} skipped: {}'.format(os.path.basename(case_path), e), flush=True)
+            skipped.append({'case_path' : case_path, 'slant_angle' : angle, 'reason' : str(e)})
+            continue
+        case.update({'slant_angle' : angle, 'first_row' : first_row})
+        case_info.append(case)
+        first_row += case['n_rows']
+    n_rows = first_row
+    if len(case_info) == 0:
+        raise ValueError('none of the {:d} cases can be used'.format(len(cases)))
+
+    index = np.zeros(len(case_info), dtype=[('case', 'i4'), ('slant_angle', 'f8'), ('time', 'f8'),
+                                            ('first_row', 'i8'), ('n_rows', 'i8')])
+    for i_case, case in enumerate(case_info):
+        index[i_case] = (i_case, case['slant_angle'], float(case['time']), case['first_row'], case['n_rows'])
+
+    if os.path.exists(os.path.join(out_path, FN_META)):
+        os.remove(os.path.join(out_path, FN_META))
+    os.makedirs(out_path, exist_ok=True)
+
+    output_columns = []
+    writer = None
+    for case in case_info:
+        t0 = time.perf_counter()
+        case_path   = case['case_path']
+        centres     = read_case_cell_centres(case_path)
+        dist        = read_case_field(case_path, case['dist_time'], dist_field, case['n_rows'])
+        outputs     = [read_case_field(case_path, case['time'], field_name, case['n_rows']) for field_name in output_fields]
+
+        columns = []
+        for field_name, values in zip(output_fields, outputs):
+            if np.ndim(values) == 1:
+                columns.append(field_name)
+            else:
+                columns += ['{}{}'.format(field_name, 'xyz'[i] if values.shape[1] == 3 else i) for i in range(values.shape[1])]
+        if writer is None:
+            output_columns = columns
+            writer = shard_writer(out_path, n_rows, shard_rows, len(INPUT_NAMES), len(output_columns), dtype)
+        elif columns != output_columns:
+            raise ValueError('{}: output columns {} differ from {}'.format(case_path, columns, output_columns))
+
+        for start in range(0, case['n_rows'], chunk_rows):
+            stop        = min(start + chunk_rows, case['n_rows'])
+            chunk_in    = np.empty((stop - start, len(INPUT_NAMES)), dtype=dtype)
+            chunk_in[:, :3] = centres[start:stop]
+            chunk_in[:, 3]  = case['slant_angle']
+            chunk_in[:, 4]  = dist[start:stop]
+            chunk_out   = np.concatenate([np.reshape(values[start:stop], (stop - start, -1)) for values in outputs], axis=1)
+            writer.write(case['first_row'] + start, chunk_in, chunk_out)
+        del centres, dist, outputs
+        print('{:48s} {:10d} rows {:8.2f} s'.format(os.path.basename(case_path), case['n_rows'],
+                                                     time.perf_counter() - t0), flush=True)
+    writer.close()
+
+    np.save(os.path.join(out_path, FN_INDEX), index)
+    meta = {'input_columns'     : INPUT_NAMES,
+            'output_columns'    : output_columns,
+            'dist_field'        : dist_field,
+            'dtype'             : np.dtype(dtype).str,
+            'n_rows'            : n_rows,
+            'shard_rows'        : shard_rows,
+            'shards'            : [writer.shard_names(i_shard) for i_shard in range(writer.n_shards)],
+            'cases'             : case_info,
+            'skipped'           : skipped, }
+    with open(os.path.join(out_path, FN_META + '.tmp'), 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(os.path.join(out_path, FN_META + '.tmp'), os.path.join(out_path, FN_META))
+    return meta
+
+class training_dataset():
+    def __init__(self, data_path, mmap_mode = 'r'):
+        '''Read access to a dataset written by build_training_dataset. Shards are memory-mapped
+        when first used, global row r is row r % shard_rows of shard r // shard_rows.
+
+        ARGS:
+            data_path   : dataset folder
+            mmap_mode   : np.load mmap_mode of the shards
+        '''
+        with open(os.path.join(data_path, FN_META), 'r') as f:
+            self.meta = json.load(f)
+        self.data_path  = data_path
+        self.mmap_mode  = mmap_mode
+        self.n_rows     = self.meta['n_rows']
+        self.shard_rows = self.meta['shard_rows']
+        self.index      = np.load(os.path.join(data_path, FN_INDEX))
+        self._shards    = {}
+
+    def __len__(self):
+        return self.n_rows
+
+    def shard(self, i_shard):
+        '''(inputs, outputs) of shard i_shard'''
+
+        if i_shard not in self._shards:
+            names = self.meta['shards'][i_shard]
+            self._shards[i_shard] = tuple(np.load(os.path.join(self.data_path, names[kind]), mmap_mode=self.mmap_mode)
+                                          for kind in ['inputs', 'outputs'])
+        return self._shards[i_shard]
+
+    def get_rows(self, rows):
+        '''Inputs and outputs of global rows, in the order given
+
+        Returns
+            inputs (np.ndarray)     : (len(rows), 5)
+            outputs (np.ndarray)    : (len(rows), n_outputs)
+        '''
+        rows        = np.asarray(rows, dtype=np.int64)
+        shards      = rows // self.shard_rows
+        inputs      = np.empty((len(rows), len(self.meta['input_columns'])), dtype=self.meta['dtype'])
+        outputs     = np.empty((len(rows), len(self.meta['output_columns'])), dtype=self.meta['dtype'])
+        for i_shard in np.unique(shards):
+            is_shard = shards == i_shard
+            shard_inputs, shard_outputs = self.shard(i_shard)
+            local = rows[is_shard] - i_shard * self.shard_rows
+            inputs[is_shard]    = shard_inputs[local]
+            outputs[is_shard]   = shard_outputs[local]
+        return inputs, outputs
+
+    def row_cases(self, rows):
+        '''index entries (case, slant_angle, time, ...) of global rows'''
+
+        return self.index[np.searchsorted(self.index['first_row'], rows, side='right') - 1]
+
+    def batches(self, batch_size, seed = None, shards_per_block = 4):
+        '''Shuffled batches over all rows. Shards are visited in random order, shards_per_block
+        at a time, and the rows of each block are shuffled together, so memory is bounded by
+        the rows of shards_per_block shards whatever the size of the dataset.
+
+        Yields
+            inputs, outputs (np.ndarray)
+        '''
+        rng = np.random.default_rng(seed)
+        shard_order = rng.permutation(len(self.meta['shards']))
+        for i_block in range(0, len(shard_order), shards_per_block):
+            rows = np.concatenate([np.arange(i_shard * self.shard_rows, min((i_shard + 1) * self.shard_rows, self.n_rows))
+                                   for i_shard in shard_order[i_block:i_block + shards_per_block]])
+            rng.shuffle(rows)
+            for start in range(0, len(rows), batch_size):
+                yield self.get_rows(rows[start:start + batch_size])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build a sharded, memory-mapped training dataset from all slant_angle_* cases')
+    parser.add_argument('out_path', help='dataset folder')
+    parser.add_argument('--time', default='latest', help='time folder of the outputs, default the latest of each case')
+    parser.add_argument('--dist-field', default='distAhmed', help='wall distance field written by ahmedPatchDist')
+    parser.add_argument('--fields', nargs='+', default=OUTPUT_FIELDS, help='output fields')
+    parser.add_argument('--shard-rows', type=int, default=1 << 22, help='rows per shard')
+    parser.add_argument('--chunk-rows', type=int, default=1 << 18, help='rows copied at a time')
+    parser.add_argument('--float64', action='store_true', help='store float64 instead of float32')
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    meta = build_training_dataset(  args.out_path,
+                                    time_name       = args.time,
+                                    dist_field      = args.dist_field,
+                                    output_fields   = args.fields,
+                                    shard_rows      = args.shard_rows,
+                                    chunk_rows      = args.chunk_rows,
+                                    dtype           = np.float64 if args.float64 else np.float32 )
+    print('{:d} cases, {:d} skipped, {:d} rows in {:d} shards, {:.1f} s'.format(len(meta['cases']), len(meta['skipped']),
+                                                                   meta['n_rows'], len(meta['shards']), time.perf_counter() - t0))
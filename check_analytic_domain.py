@@ -0,0 +1,54 @@
+import sys
+import shutil
+import tempfile
+import numpy as np
+
+from stl_generator_slant_angle import ahmed_stl_generator_v3_sym, ahmed_stl_generator_v4_nonsym
+
+def surface_bounds_area(points, triangles):
+    '''Returns bounding box (2, 3) and total area of a triangulated surface'''
+
+    vertices = points[triangles]
+    area = 0.5 * np.linalg.norm(np.cross(vertices[:,1] - vertices[:,0], vertices[:,2] - vertices[:,0]), axis=1).sum()
+    return np.stack([points.min(axis=0), points.max(axis=0)]), area
+
+def check_analytic_domain(  generator_class         = ahmed_stl_generator_v3_sym,
+                            gmsh_domain_mesh_size   = 500,
+                            rtol                    = 1e-9,
+                            **generator_kwargs ):
+    '''Generate the domain planes with gmsh and with the analytic numpy path, and check
+    that every plane has equal bounds and area.
+
+    Returns
+        is_equal (bool) : True if all planes agree within rtol
+    '''
+    is_equal = True
+    save_path_base = tempfile.mkdtemp(prefix='ahmed_domain_check_')
+    try:
+        surfaces = {}
+        for is_analytic in [False, True]:
+            generator = generator_class(gmsh_domain_mesh_size   = gmsh_domain_mesh_size,
+                                        save_path_base          = save_path_base,
+                                        **generator_kwargs)
+            generator.generate_domain(is_analytic = is_analytic)
+            surfaces[is_analytic] = generator.patches
+
+        print('{:>16s} {:>10s} {:>10s} {:>14s} {:>14s} {:>6s}'.format(
+                'patch', 'n_tri_gmsh', 'n_tri_np', 'area_gmsh', 'area_np', 'equal'))
+        for patch_name, (points, triangles) in surfaces[False].items():
+            bounds_gmsh, area_gmsh  = surface_bounds_area(points, triangles)
+            bounds_np, area_np      = surface_bounds_area(*surfaces[True][patch_name])
+            scale = np.abs(bounds_gmsh).max()
+            is_patch_equal = (np.allclose(bounds_np, bounds_gmsh, rtol=0, atol=rtol*scale)
+                              and np.isclose(area_np, area_gmsh, rtol=rtol))
+            is_equal = is_equal and is_patch_equal
+            print('{:>16s} {:10d} {:10d} {:14.6e} {:14.6e} {:>6s}'.format(
+                    patch_name, len(triangles), len(surfaces[True][patch_name][1]), area_gmsh, area_np, str(is_patch_equal)))
+    finally:
+        shutil.rmtree(save_path_base, ignore_errors=True)
+    return is_equal
+
+if __name__ == '__main__':
+    is_equal = (check_analytic_domain(ahmed_stl_generator_v3_sym)
+                and check_analytic_domain(ahmed_stl_generator_v4_nonsym))
+    sys.exit(int(not is_equal))
@@ -2,6 +2,9 @@ import sys
 import os
 
 from stl_generator_slant_angle import ahmed_stl_generator_v3_sym
+from geometry_cache import geometry_cache, run_cached
+from merge_stl_patches import merge_stl_patches
+from geometry_profiler import stage_profiler
 
 def generate_geometry_slant(slant_angle_deg,
                             is_freestream                   = False,
@@ -12,15 +15,77 @@ def generate_geometry_slant(slant_angle_deg,
                             domain_multiplier_height        = 3,
                             domain_multiplier_after_body    = 10,
                             domain_multiplier_before_body   = 3,
-                            save_path_base                  = os.environ['AHMED_SLANT_PATH'], ):
+                            save_path_base                  = None,
+                            is_gmsh_session                 = True,
+                            is_analytic_domain              = False,
+                            is_write_patches                = True,
+                            is_profile                      = False,
+                            cache_path                      = None,
+                            cache_max_gb                    = 20,
+                            is_legs                         = True ):
+    '''Generate the geometry for a single slant angle. If cache_path is given, components
+    already generated with the same parameters (see geometry_cache.py) are reused. With
+    is_analytic_domain the domain planes are triangulated in numpy instead of gmsh. With
+    is_profile every gmsh phase is timed and appended to geometry/geometry_profile.jsonl
+    (see geometry_profiler.py). Without is_legs the legs are not generated
+    (generate_case_geometry_nolegs.py).'''
 
     gen_args = locals()
+    is_gmsh_session = gen_args.pop('is_gmsh_session')
+    is_analytic_domain = gen_args.pop('is_analytic_domain')
+    is_write_patches = gen_args.pop('is_write_patches')
+    is_profile      = gen_args.pop('is_profile')
+    cache_path      = gen_args.pop('cache_path')
+    cache_max_gb    = gen_args.pop('cache_max_gb')
+    is_legs         = gen_args.pop('is_legs')
+
+    cache = None
+    if cache_path is not None:
+        cache = geometry_cache(cache_path = cache_path, max_gb = cache_max_gb)
+
     generator = ahmed_stl_generator_v3_sym( **gen_args)
+    if is_profile:
+        meta = {name : gen_args[name] for name in gen_args if name != 'save_path_base'}
+        meta['is_analytic_domain'] = is_analytic_domain
+        meta['is_legs'] = is_legs
+        generator.profiler = stage_profiler(fn_jsonl    = os.path.join(generator.save_path, 'geometry_profile.jsonl'),
+                                            meta        = meta)
+    if is_gmsh_session:
+        with generator:
+            build_geometry(generator, cache = cache, is_analytic_domain = is_analytic_domain,
+                           is_write_patches = is_write_patches, is_legs = is_legs)
+    else:
+        build_geometry(generator, cache = cache, is_analytic_domain = is_analytic_domain,
+                       is_write_patches = is_write_patches, is_legs = is_legs)
+
+def build_geometry(generator, cache = None, is_analytic_domain = False, is_write_patches = True, is_legs = True):
+    '''Generate and save all geometry components for a single case, restoring components
+    from cache (geometry_cache) where possible. The body patches are taken from the meshed
+    model directly. Without a cache and with is_write_patches False only domain_merged.stl
+    is written. The legs are only generated with is_legs.'''
+
+    if cache is None and not is_write_patches:
+        generator.generate_surfaces(is_analytic_domain = is_analytic_domain, is_legs = is_legs)
+        generator.write_merged_stl()
+        return
+
+    body_options = {'is_surface_patches' : True, 'is_write_msh' : False}
+
+    components = [  run_cached(cache, generator, 'body',    [generator.generate_body], build_options = body_options),
+                    run_cached(cache, generator, 'domain',  [generator.generate_domain],
+                               build_options = {'is_analytic' : is_analytic_domain}), ]
+    if is_legs:
+        components.append(run_cached(cache, generator, 'legs', [generator.generate_legs]))
+    is_hit, patch_names = zip(*components)
 
-    generator.generate_body()
-    generator.body_surface_stl_separate()
-    generator.generate_domain()
-    generator.generate_legs()
+    # restored components are only on disk, merge the files instead of the in-memory patches.
+    # Only the patches of this run, other .stl files in the folder may be left from earlier runs
+    if any(is_hit):
+        merge_stl_patches(  read_path       = generator.save_path,
+                            fn_merged_copy  = os.path.join(os.path.dirname(generator.save_path), 'domain_merged.stl'),
+                            patch_names     = [name for names in patch_names for name in names])
+    else:
+        generator.write_merged_stl()
 
 
 if __name__ == '__main__':
@@ -1,25 +1,21 @@
 import sys
-import os
 
-from stl_generator_slant_angle import ahmed_stl_generator_v3_sym
+import generate_case_geometry
 
-def generate_geometry_slant(slant_angle_deg,
-                            is_freestream                   = False,
-                            gmsh_body_mesh_size             = 1.5,
-                            gmsh_legs_mesh_size             = 2,
-                            gmsh_domain_mesh_size           = None,
-                            domain_multiplier_width         = 6,
-                            domain_multiplier_height        = 3,
-                            domain_multiplier_after_body    = 10,
-                            domain_multiplier_before_body   = 3,
-                            save_path_base                  = os.environ['AHMED_SLANT_PATH'], ):
+def generate_geometry_slant(slant_angle_deg, gmsh_body_mesh_size = 1.5, **kwargs):
+    '''Generate the geometry for a single slant angle without legs, see
+    generate_case_geometry.generate_geometry_slant for the other arguments.'''
 
-    gen_args = locals()
-    generator = ahmed_stl_generator_v3_sym( **gen_args)
-    generator.generate_body()
-    generator.body_surface_stl_separate()
-    generator.generate_domain()
+    generate_case_geometry.generate_geometry_slant(slant_angle_deg,
+                                                   gmsh_body_mesh_size  = gmsh_body_mesh_size,
+                                                   is_legs              = False,
+                                                   **kwargs)
+
+def build_geometry(generator, **kwargs):
+    '''generate_case_geometry.build_geometry without legs'''
+
+    generate_case_geometry.build_geometry(generator, is_legs = False, **kwargs)
 
 if __name__ == '__main__':
     slant_angle = float(sys.argv[1])
-    generate_geometry_slant( slant_angle_deg = slant_angle)
\ No newline at end of file
+    generate_geometry_slant( slant_angle_deg = slant_angle)
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import shutil
+import inspect
+import hashlib
+
+import stl_writer
+import output_sink
+from merge_stl_patches import link_or_copy
+
+# body dimensions which change with slant angle, excluded from the keys of angle-independent components
+SLANT_DIMS = ['slant_angle_deg', 'slang_angle_rad', 'dx_cut', 'dz_cut', 'p0_z']
+
+# files written by a component besides its <patch>.stl files
+COMPONENT_EXTRA_FILES = {'body' : ['body_full.msh', 'body_full.vtk']}
+
+# modules besides the generator's own that shape the cached files (stl format, file layout)
+SOURCE_MODULES = [stl_writer, output_sink]
+
+class geometry_cache():
+    def __init__(self,  cache_path  = None,
+                        max_gb      = 20 ):
+        '''Content-addressed store of generated geometry files, one entry per component
+        (body, domain, legs) and parameter set, evicted least-recently-used first once the
+        total size exceeds max_gb.
+
+        Entries are written to a temporary folder and renamed into place, so several
+        processes of a sweep can share one cache.
+
+        ARGS:
+            cache_path  : cache folder, defaults to $AHMED_SLANT_PATH/geometry_cache
+            max_gb      : size bound of the cache in GB
+        '''
+        if cache_path is None:
+            cache_path = os.path.join(os.environ['AHMED_SLANT_PATH'], 'geometry_cache')
+        os.makedirs(cache_path, exist_ok=True)
+        self.cache_path = cache_path
+        self.max_bytes  = int(max_gb * 2**30)
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_path, key)
+
+    def restore(self, key, save_path):
+        '''Copy the files of entry key into save_path
+
+        Returns
+            file_names (list of str) : restored files, None if the key is not cached
+        '''
+        fn_meta = os.path.join(self.entry_path(key), 'entry.json')
+        try:
+            with open(fn_meta, 'r') as f:
+                meta = json.load(f)
+            for fn_local in meta['files']:
+                link_or_copy(os.path.join(self.entry_path(key), fn_local),
+                             os.path.join(save_path, fn_local),
+                             is_hardlink = False)
+            # mark as most recently used
+            os.utime(fn_meta)
+        except (OSError, ValueError, KeyError):
+            return None
+        return meta['files']
+
+    def store(self, key, save_path, file_names, params = None):
+        '''Copy file_names from save_path into a new entry key, then evict old entries'''
+
+        if os.path.exists(self.entry_path(key)):
+            return
+        path_tmp = os.path.join(self.cache_path, '.tmp_{}_{:d}'.format(key, os.getpid()))
+        os.makedirs(path_tmp, exist_ok=True)
+        n_bytes = 0
+        for fn_local in file_names:
+            link_or_copy(os.path.join(save_path, fn_local), os.path.join(path_tmp, fn_local), is_hardlink = False)
+            n_bytes += os.path.getsize(os.path.join(path_tmp, fn_local))
+        with open(os.path.join(path_tmp, 'entry.json'), 'w') as f:
+            json.dump({'files' : list(file_names), 'bytes' : n_bytes, 'params' : params}, f, indent=1)
+
+        try:
+            os.rename(path_tmp, self.entry_path(key))
+        except OSError:
+            # stored concurrently by another process
+            shutil.rmtree(path_tmp, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        '''Returns list of (last used time, bytes, key) for all complete entries'''
+
+        entries = []
+        for key in os.listdir(self.cache_path):
+            fn_meta = os.path.join(self.entry_path(key), 'entry.json')
+            try:
+                with open(fn_meta, 'r') as f:
+                    n_bytes = json.load(f)['bytes']
+                entries.append((os.path.getmtime(fn_meta), n_bytes, key))
+            except (OSError, ValueError, KeyError):
+                continue
+        return entries
+
+    def evict(self):
+        '''Remove least recently used entries until the cache fits in max_bytes'''
+
+        entries = sorted(self.entries())
+        total   = sum(entry[1] for entry in entries)
+        for _, n_bytes, key in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self.entry_path(key), ignore_errors=True)
+            total -= n_bytes
+
+def geometry_cache_params(generator, component, build_options = None):
+    '''Parameters that fully determine the files of one generator component.
+
+    The body depends on the slant angle, the domain planes and legs do not, so their key
+    is shared by every angle of a sweep. build_options are any keyword arguments given to
+    the build methods.
+    '''
+    body_dims = dict(generator.body_dims)
+    if component != 'body':
+        for name in SLANT_DIMS:
+            body_dims.pop(name, None)
+
+    params = {  'generator'     : type(generator).__name__,
+                'component'     : component,
+                'is_freestream' : generator.is_freestream,
+                'body_dims'     : body_dims,
+                'build_options' : build_options, }
+    if component == 'body':
+        params['mesh_size'] = generator.gmsh_body_mesh_size
+    elif component == 'legs':
+        params['mesh_size'] = generator.gmsh_legs_mesh_size
+        # the legs stand on the domain bottom, which moves with domain_multiplier_height
+        params['bottom_z'] = generator.bottom_z
+    elif component == 'domain':
+        params['mesh_size'] = generator.gmsh_domain_mesh_size
+        params['domain_multipliers'] = [generator.domain_multiplier_before_body,
+                                        generator.domain_multiplier_after_body,
+                                        generator.domain_multiplier_height,
+                                        generator.domain_multiplier_width]
+    return _json_safe(params)
+
+def geometry_cache_key(generator, component, build_options = None):
+    '''sha256 of the component parameters and the source of the generator and of
+    SOURCE_MODULES, so a code change invalidates old entries'''
+
+    params = json.dumps(geometry_cache_params(generator, component, build_options), sort_keys=True)
+    digest = hashlib.sha256()
+    for module in [inspect.getmodule(type(generator))] + SOURCE_MODULES:
+        digest.update(inspect.getsource(module).encode('utf-8'))
+    digest.update(params.encode('utf-8'))
+    return '{}_{}'.format(component, digest.hexdigest()[:32])
+
+def run_cached(cache, generator, component, build_methods, build_options = None):
+    '''Restore a component from the cache, or run build_methods and store what they wrote
+
+    Args
+        cache (geometry_cache)      : None to always build
+        generator                   : stl generator instance
+        component (str)             : 'body', 'domain' or 'legs'
+        build_methods (list)        : generator methods building the component, called in order
+        build_options (dict)        : keyword arguments passed to every build method
+    Returns
+        is_hit (bool)               : True if the files were restored from the cache
+        patch_names (list of str)   : patches of the component, restored or built
+    '''
+    if build_options is None:
+        build_options = {}
+
+    if cache is not None:
+        key = geometry_cache_key(generator, component, build_options)
+        file_names = cache.restore(key, generator.save_path)
+        if file_names is not None:
+            return True, [os.path.splitext(fn_local)[0] for fn_local in file_names if fn_local.endswith('.stl')]
+
+    patches_before = set(generator.patches.keys())
+    t0 = time.time()
+    for method in build_methods:
+        method(**build_options)
+    patch_names = [name for name in generator.patches.keys() if name not in patches_before]
+    if cache is None:
+        return False, patch_names
+
+    file_names = ['{}.stl'.format(name) for name in patch_names]
+    for fn_local in COMPONENT_EXTRA_FILES.get(component, []):
+        fn = os.path.join(generator.save_path, fn_local)
+        if os.path.exists(fn) and os.path.getmtime(fn) >= t0 - 1:
+            file_names.append(fn_local)
+    cache.store(key, generator.save_path, file_names, params = geometry_cache_params(generator, component, build_options))
+    return False, patch_names
+
+def _json_safe(value):
+    '''Convert numpy scalars and ints to float so equal parameters always serialize the same'''
+
+    if isinstance(value, dict):
+        return {key : _json_safe(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(val) for val in value]
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    return float(value)
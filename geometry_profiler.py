@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+import time
+import resource
+import contextlib
+import numpy as np
+
+def current_rss_mb():
+    '''Resident set size of this process in MB, nan where /proc is not available'''
+
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        return np.nan
+
+def peak_rss_mb():
+    '''Peak resident set size of this process so far in MB'''
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kB elsewhere
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+class stage_profiler():
+    def __init__(self, fn_jsonl = None, meta = None):
+        '''Records the wall time, memory and output of each gmsh phase of a generator, see
+        the profiler argument of the stl generators.
+
+        One record (dict) is made per phase call: meta, component, phase, wall_s, rss_mb,
+        peak_rss_mb, plus whatever the phase adds (n_nodes and n_triangles after meshing,
+        bytes for written files). Records are kept in self.records and, if fn_jsonl is
+        given, appended to it as json lines as they are made, so a crashed run keeps the
+        records up to the crash. The peak RSS is that of the whole process so far, phases
+        can only raise it.
+
+        ARGS:
+            fn_jsonl    : json lines file records are appended to, None to keep them in memory only
+            meta        : dict added to every record, e.g. slant angle and mesh sizes
+        '''
+        self.fn_jsonl   = fn_jsonl
+        self.meta       = dict(meta) if meta is not None else {}
+        self.meta.setdefault('run_start', time.time())
+        self.records    = []
+
+    @contextlib.contextmanager
+    def stage(self, component, phase, counts = None):
+        '''Time the enclosed block as phase of component. Yields the record, the block can
+        add to it. counts, if given, is called once the timing stopped and returns a dict
+        added to the record, so counting nodes or file sizes is not timed.'''
+
+        record = dict(self.meta, component = component, phase = phase)
+        t0 = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['wall_s']        = time.perf_counter() - t0
+            record['rss_mb']        = current_rss_mb()
+            record['peak_rss_mb']   = peak_rss_mb()
+            if counts is not None:
+                record.update(counts())
+            self.add(record)
+
+    def add(self, record):
+        self.records.append(record)
+        if self.fn_jsonl is not None:
+            with open(self.fn_jsonl, 'a') as f:
+                f.write(json.dumps(record, default=float) + '\n')
+
+    def summary(self):
+        '''Total wall time per (component, phase), largest first
+
+        Returns
+            totals (list) : (component, phase, total wall_s, number of calls)
+        '''
+        totals = {}
+        for record in self.records:
+            key = (record['component'], record['phase'])
+            wall_s, n_calls = totals.get(key, (0, 0))
+            totals[key] = (wall_s + record['wall_s'], n_calls + 1)
+        return sorted([key + value for key, value in totals.items()], key=lambda total: -total[2])
+
+def read_profiles(fn_jsonls):
+    '''Load the records of one or more geometry_profile.jsonl files, skipping a partially
+    written last line
+
+    Returns
+        records (list of dict)
+    '''
+    if isinstance(fn_jsonls, str):
+        fn_jsonls = [fn_jsonls]
+    records = []
+    for fn_jsonl in fn_jsonls:
+        with open(fn_jsonl, 'r') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
+
+if __name__ == '__main__':
+    # summarize the profiles of all given cases, e.g. $AHMED_SLANT_PATH/slant_angle_*/geometry/geometry_profile.jsonl
+    records = read_profiles(sys.argv[1:])
+    profiler = stage_profiler()
+    profiler.records = records
+    print('{:>16s} {:>12s} {:>10s} {:>8s}'.format('component', 'phase', 'wall_s', 'calls'))
+    for component, phase, wall_s, n_calls in profiler.summary():
+        print('{:>16s} {:>12s} {:10.3f} {:8d}'.format(component, phase, wall_s, n_calls))
+    if len(records) > 0:
+        print('peak RSS {:.1f} MB'.format(max(record['peak_rss_mb'] for record in records)))
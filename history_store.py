@@ -0,0 +1,73 @@
+import os
+import numpy as np
+
+MAGIC           = b'\x93NUMPY\x01\x00'
+HEADER_BYTES    = 4096      # reserved .npy header size, room for any row count without moving the data
+
+def _header_bytes(dtype, n_rows, header_bytes = HEADER_BYTES):
+    '''.npy version 1.0 header of a (n_rows,) array, padded with spaces to header_bytes'''
+
+    header = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({:d},), }}".format(
+                np.lib.format.dtype_to_descr(np.dtype(dtype)), n_rows)
+    n_pad = header_bytes - len(MAGIC) - 2 - len(header) - 1
+    if n_pad < 0:
+        raise ValueError('dtype too large for a {:d} byte header'.format(header_bytes))
+    return MAGIC + (header_bytes - len(MAGIC) - 2).to_bytes(2, 'little') + header.encode('latin1') + b' ' * n_pad + b'\n'
+
+def _read_header(f):
+    '''Returns dtype, number of rows and data offset of an open .npy file'''
+
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+    if fortran_order or len(shape) != 1:
+        raise ValueError('{} is not a one dimensional history'.format(f.name))
+    return dtype, shape[0], f.tell()
+
+def write_history(fn_history, history):
+    '''Save a structured history array as a .npy file with a reserved header, so rows can be
+    appended in place with append_history. The file is readable by np.load as usual.'''
+
+    history = np.ascontiguousarray(history)
+    fn_tmp = fn_history + '.tmp'
+    with open(fn_tmp, 'wb') as f:
+        f.write(_header_bytes(history.dtype, len(history)))
+        f.write(history.tobytes())
+    os.replace(fn_tmp, fn_history)
+
+def append_history(fn_history, rows):
+    '''Append rows (structured array, same dtype) to a history written by write_history, creating
+    the file if needed. Data is written first and the row count in the header last, so an
+    interrupted append leaves the previous history intact.
+
+    Returns
+        n_rows (int) : number of rows in the history after appending
+    '''
+    rows = np.ascontiguousarray(rows)
+    if not os.path.exists(fn_history):
+        write_history(fn_history, rows)
+        return len(rows)
+
+    with open(fn_history, 'r+b') as f:
+        dtype, n_rows, offset = _read_header(f)
+        if dtype != rows.dtype:
+            raise ValueError('dtype of the rows differs from {}'.format(fn_history))
+        if offset != HEADER_BYTES:
+            raise ValueError('{} has no reserved header, rewrite it with write_history'.format(fn_history))
+
+        # drop anything past the last complete append
+        f.truncate(offset + n_rows * dtype.itemsize)
+        f.seek(0, os.SEEK_END)
+        f.write(rows.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+        f.seek(0)
+        f.write(_header_bytes(dtype, n_rows + len(rows)))
+    return n_rows + len(rows)
+
+def load_history(fn_history, mmap_mode = 'r'):
+    '''Memory-map a history, no parsing or copying of the rows'''
+
+    return np.load(fn_history, mmap_mode=mmap_mode)
@@ -0,0 +1,125 @@
+import os
+import re
+import sys
+import glob
+import fcntl
+import shutil
+
+# start of a solid/endsolid line, the rest of the line (old name) is replaced
+SOLID_LINE  = re.compile(rb'^([ \t]*)(endsolid|solid)\b[^\r\n]*', re.M)
+FICLONE     = 0x40049409    # linux ioctl, share data blocks between two files (btrfs, xfs, ...)
+
+def merge_stl_patches(  read_path,
+                        fn_merged       = None,
+                        fn_merged_copy  = None,
+                        patch_names     = None,
+                        chunk_size      = 1 << 20, ):
+    '''Merge the ascii .stl files in read_path into a single file, naming each solid after
+    its file name without extension, e.g. wallAhmed_3.stl -> solid wallAhmed_3.
+
+    Each file is streamed in chunks of chunk_size bytes with the solid/endsolid names
+    rewritten on the fly, so memory use does not depend on the .stl size, and the input
+    files are left untouched.
+
+    Args
+        read_path (str)         : folder containing the component .stl files
+        fn_merged (str)         : merged output, defaults to read_path/domain_merged.stl
+        fn_merged_copy (str)    : optional second location for the merged file, hard linked
+                                  (or reflinked/copied if linking fails)
+        patch_names (list)      : merge only read_path/<patch_name>.stl of these, by default
+                                  every .stl in read_path
+        chunk_size (int)        : read size in bytes
+    Returns
+        patch_names (list of str) : merged patches, in file order
+    '''
+
+    if fn_merged is None:
+        fn_merged = os.path.join(read_path, 'domain_merged.stl')
+    if patch_names is None:
+        fn_stls = sorted(fn for fn in glob.glob(os.path.join(read_path, '*.stl'))
+                         if os.path.abspath(fn) != os.path.abspath(fn_merged))
+    else:
+        fn_stls = [os.path.join(read_path, '{}.stl'.format(name)) for name in sorted(patch_names)]
+
+    # write to a temporary file, so a hard-linked previous merge is not modified in place
+    fn_tmp = fn_merged + '.tmp'
+    patch_names = []
+    with open(fn_tmp, 'wb') as f_out:
+        for fn_stl in fn_stls:
+            patch_name = os.path.splitext(os.path.basename(fn_stl))[0]
+            with open(fn_stl, 'rb') as f_in:
+                if is_binary_stl(f_in):
+                    raise ValueError('{} is a binary .stl, only ascii files can be merged'.format(fn_stl))
+                rename_solid_stream(f_in, f_out, patch_name, chunk_size = chunk_size)
+            patch_names.append(patch_name)
+            print(patch_name)
+    os.replace(fn_tmp, fn_merged)
+
+    if fn_merged_copy is not None:
+        link_or_copy(fn_merged, fn_merged_copy)
+    return patch_names
+
+def rename_solid_stream(f_in, f_out, solid_name, chunk_size = 1 << 20):
+    '''Copy an ascii stl from f_in to f_out, replacing every solid/endsolid name with solid_name.
+
+    Only whole lines are substituted; the partial line at the end of each chunk is carried
+    over to the next one.
+    '''
+    name = solid_name.encode('ascii')
+    repl = lambda match: match.group(1) + match.group(2) + b' ' + name
+
+    carry = b''
+    while True:
+        chunk = f_in.read(chunk_size)
+        if not chunk:
+            break
+        buf = carry + chunk
+        i_newline = buf.rfind(b'\n')
+        if i_newline < 0:
+            carry = buf
+            continue
+        f_out.write(SOLID_LINE.sub(repl, buf[:i_newline+1]))
+        carry = buf[i_newline+1:]
+
+    if carry.strip():
+        f_out.write(SOLID_LINE.sub(repl, carry) + b'\n')
+
+def is_binary_stl(f):
+    '''True if the size of open file f matches the binary stl layout given its facet count'''
+
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(80)
+    count = f.read(4)
+    f.seek(0)
+    return len(count) == 4 and size == 84 + 50 * int.from_bytes(count, 'little')
+
+def link_or_copy(src, dst, is_hardlink = True):
+    '''Make dst the same content as src without duplicating data where possible:
+    hard link, else reflink (copy-on-write clone), else a plain copy.
+
+    Use is_hardlink = False when either file may later be modified in place, reflinks
+    and copies are independent files.'''
+
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if is_hardlink:
+        try:
+            os.link(src, dst)
+            return 'link'
+        except OSError:
+            pass
+
+    try:
+        with open(src, 'rb') as f_src, open(dst, 'wb') as f_dst:
+            fcntl.ioctl(f_dst.fileno(), FICLONE, f_src.fileno())
+        return 'reflink'
+    except OSError:
+        shutil.copyfile(src, dst)
+        return 'copy'
+
+if __name__ == '__main__':
+    angle = sys.argv[1]
+    case_path = os.path.join(os.environ['AHMED_SLANT_PATH'], 'slant_angle_{}'.format(angle))
+    merge_stl_patches(  read_path       = os.path.join(case_path, 'geometry'),
+                        fn_merged_copy  = os.path.join(case_path, 'domain_merged.stl'))
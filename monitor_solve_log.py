@@ -0,0 +1,224 @@
+import os
+import re
+import sys
+import glob
+import time
+import argparse
+import numpy as np
+from collections import deque
+
+from parse_solve_log import solve_log_parser, LOG_FIELDS
+from history_store import write_history, append_history
+
+STOP_AT_LINE    = re.compile(r'^(\s*stopAt\s+)\w+(\s*;)', re.M)
+END_LINE        = re.compile(rb'^End\s*$', re.M)
+
+class solve_log_monitor():
+    def __init__(self,  fn_log,
+                        window          = 100,
+                        cd_std_tol      = 1e-4,
+                        stall_decades   = 0.1,
+                        fields          = LOG_FIELDS,
+                        fn_history      = None ):
+        '''Follow a growing simpleFoam log, keeping rolling statistics of the last window
+        iterations.
+
+        Every update() reads only the bytes appended since the previous one (from a stored
+        file offset) and feeds them to solve_log_parser, so the cost per update does not
+        depend on the length of the log.
+
+        The run is flagged as converged once the standard deviation of Cd over the window
+        drops below cd_std_tol, and as stalled if, without converging, the largest initial
+        residual did not drop by stall_decades orders of magnitude between the previous and
+        the current window (compared by window median).
+
+        ARGS:
+            fn_log          : log file to follow
+            window          : number of iterations in the rolling window
+            cd_std_tol      : Cd standard deviation for convergence
+            stall_decades   : minimum residual reduction per window, log10
+            fields          : solved fields included in the residual statistics
+            fn_history      : optional .npy history (see history_store.py), completed iterations
+                              are appended to it in place on every update
+        '''
+        self.fn_log         = fn_log
+        self.window         = window
+        self.cd_std_tol     = cd_std_tol
+        self.stall_decades  = stall_decades
+        self.fields         = list(fields)
+        self.fn_history     = fn_history
+
+        self._reset()
+
+    def _reset(self):
+        self.parser     = solve_log_parser(fields = self.fields)
+        self.offset     = 0
+        self.n_seen     = 0
+        self.is_end     = False
+        # unterminated last line of the log so far, End is only matched on complete lines
+        self.tail       = b''
+        # two windows of log10(max initial residual), the previous one is needed for the stall check
+        self.cd         = deque(maxlen=self.window)
+        self.residual   = deque(maxlen=2*self.window)
+        self.time       = np.nan
+        # the first save rewrites the history, later ones append
+        self.is_history_saved = False
+
+    def update(self):
+        '''Parse whatever was appended to the log, returns the number of new complete iterations'''
+
+        try:
+            size = os.path.getsize(self.fn_log)
+        except OSError:
+            return 0
+        if size < self.offset:
+            # log replaced (e.g. a restarted run), start over
+            self._reset()
+        if size == self.offset:
+            return 0
+
+        with open(self.fn_log, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        self.offset += len(data)
+        self.parser.feed(data)
+        lines = self.tail + data
+        i_line_end = lines.rfind(b'\n') + 1
+        self.tail = lines[i_line_end:]
+        if END_LINE.search(lines, 0, i_line_end):
+            # the last iteration is only complete at the end of the run
+            self.is_end = True
+            self.parser.close()
+
+        # rows of the parser are only complete once the next iteration has started
+        rows = self.parser.rows[self.n_seen:]
+        self.n_seen = len(self.parser.rows)
+        names   = self.parser.dtype.names
+        i_cd    = names.index('Cd')
+        i_res   = [names.index('{}_initial'.format(field)) for field in self.fields]
+        for row in rows:
+            self.time = row[0]
+            if not np.isnan(row[i_cd]):
+                self.cd.append(row[i_cd])
+            residuals = [row[i] for i in i_res if not np.isnan(row[i])]
+            if len(residuals) > 0:
+                self.residual.append(np.log10(max(residuals)))
+
+        if self.fn_history is not None and len(rows) > 0:
+            rows = np.array(rows, dtype=self.parser.dtype)
+            if self.is_history_saved:
+                append_history(self.fn_history, rows)
+            else:
+                write_history(self.fn_history, rows)
+                self.is_history_saved = True
+        return len(rows)
+
+    def statistics(self):
+        '''Rolling statistics over the last window of iterations
+
+        Returns
+            stats (dict) : time, n_iterations, cd_mean, cd_std, residual_log10 (window median of
+                           the largest initial residual), residual_drop (decades since the
+                           previous window), status ('running', 'converged', 'stalled' or 'ended')
+        '''
+        stats = {'time' : self.time, 'n_iterations' : self.n_seen,
+                 'cd_mean' : np.nan, 'cd_std' : np.nan, 'residual_log10' : np.nan, 'residual_drop' : np.nan}
+        status = 'running'
+
+        if len(self.cd) == self.window:
+            cd = np.array(self.cd)
+            stats['cd_mean'], stats['cd_std'] = float(cd.mean()), float(cd.std())
+            if stats['cd_std'] < self.cd_std_tol:
+                status = 'converged'
+
+        residual = np.array(self.residual)
+        if len(residual) > 0:
+            stats['residual_log10'] = float(np.median(residual[-self.window:]))
+        if len(residual) == 2*self.window:
+            stats['residual_drop'] = float(np.median(residual[:self.window])) - stats['residual_log10']
+            if status == 'running' and stats['residual_drop'] < self.stall_decades:
+                status = 'stalled'
+
+        if self.is_end and status == 'running':
+            status = 'ended'
+        stats['status'] = status
+        return stats
+
+def stop_run(case_path):
+    '''Set stopAt writeNow in case_path/system/controlDict, simpleFoam re-reads it
+    (runTimeModifiable yes), writes the current time and stops'''
+
+    fn_control = os.path.join(case_path, 'system', 'controlDict')
+    with open(fn_control, 'r') as f:
+        text = f.read()
+    text, n_sub = STOP_AT_LINE.subn(r'\1writeNow\2', text, count=1)
+    if n_sub == 0:
+        raise ValueError('no stopAt entry in {}'.format(fn_control))
+    with open(fn_control + '.tmp', 'w') as f:
+        f.write(text)
+    os.replace(fn_control + '.tmp', fn_control)
+
+def monitor_case(   slant_angle,
+                    interval        = 60,
+                    is_stop         = False,
+                    is_stop_stalled = False,
+                    is_save_history = True,
+                    **monitor_kwargs ):
+    '''Follow the newest $AHMED_SLANT_PATH/slant_angle_<angle>/*solve.log until the run ends
+    or converges, printing the rolling statistics every interval seconds.
+
+    Args
+        slant_angle (str)       : angle as in the case folder name
+        interval (float)        : seconds between updates
+        is_stop (bool)          : stop the run (stop_run) once converged
+        is_stop_stalled (bool)  : also stop the run if it stalls
+        is_save_history (bool)  : keep case_path/residuals/history.npy up to date while following
+        monitor_kwargs          : passed to solve_log_monitor
+    Returns
+        stats (dict) : final statistics, see solve_log_monitor.statistics
+    '''
+    case_path = os.path.join(os.environ['AHMED_SLANT_PATH'], 'slant_angle_{}'.format(slant_angle))
+
+    monitor = None
+    while True:
+        if monitor is None:
+            fn_logs = glob.glob(os.path.join(case_path, '*solve.log'))
+            if len(fn_logs) > 0:
+                fn_history = None
+                if is_save_history:
+                    os.makedirs(os.path.join(case_path, 'residuals'), exist_ok=True)
+                    fn_history = os.path.join(case_path, 'residuals', 'history.npy')
+                monitor = solve_log_monitor(max(fn_logs, key=os.path.getmtime), fn_history = fn_history, **monitor_kwargs)
+
+        if monitor is not None and (monitor.update() > 0 or monitor.is_end):
+            stats = monitor.statistics()
+            print('time {:8.0f}  Cd {:.5f} +- {:.2e}  residual 1e{:.2f} (drop {:.2f})  {}'.format(
+                    stats['time'], stats['cd_mean'], stats['cd_std'], stats['residual_log10'],
+                    stats['residual_drop'], stats['status']), flush=True)
+            if monitor.is_end:
+                return stats
+            if is_stop and (stats['status'] == 'converged' or (is_stop_stalled and stats['status'] == 'stalled')):
+                stop_run(case_path)
+                print('set stopAt writeNow in {}'.format(os.path.join(case_path, 'system', 'controlDict')))
+                return stats
+        time.sleep(interval)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Follow a running case log and report convergence')
+    parser.add_argument('angle', help='slant angle, as in the case folder name')
+    parser.add_argument('--interval', type=float, default=60, help='seconds between updates')
+    parser.add_argument('--window', type=int, default=100, help='iterations in the rolling window')
+    parser.add_argument('--cd-std', type=float, default=1e-4, help='Cd standard deviation for convergence')
+    parser.add_argument('--stall-decades', type=float, default=0.1, help='minimum residual drop per window')
+    parser.add_argument('--stop', action='store_true', help='stop the run once converged (stopAt writeNow)')
+    parser.add_argument('--stop-stalled', action='store_true', help='with --stop, also stop a stalled run')
+    args = parser.parse_args()
+
+    stats = monitor_case(   args.angle,
+                            interval        = args.interval,
+                            is_stop         = args.stop,
+                            is_stop_stalled = args.stop_stalled,
+                            window          = args.window,
+                            cd_std_tol      = args.cd_std,
+                            stall_decades   = args.stall_decades )
+    sys.exit(0 if stats['status'] in ['converged', 'ended'] else 1)
@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+
+from stl_writer import write_stl
+from merge_stl_patches import link_or_copy
+
+class directory_sink():
+    def __init__(self, save_path_base = None):
+        '''Where a generator writes its files: save_path_base/slant_angle_<angle>/geometry.
+
+        Nothing is read or created on construction. $AHMED_SLANT_PATH is only looked up
+        when a path is first needed, and folders are only created when written to, so
+        generators can be built for planning or validation without touching the disk.
+
+        ARGS:
+            save_path_base  : folder holding the case folders, defaults to $AHMED_SLANT_PATH
+        '''
+        self._save_path_base = save_path_base
+
+    @property
+    def save_path_base(self):
+        if self._save_path_base is None:
+            self._save_path_base = os.environ['AHMED_SLANT_PATH']
+        return self._save_path_base
+
+    def case_name(self, slant_angle_deg):
+        return 'slant_angle_{:1.2f}'.format(slant_angle_deg)
+
+    def case_path(self, slant_angle_deg):
+        return os.path.join(self.save_path_base, self.case_name(slant_angle_deg))
+
+    def geometry_path(self, slant_angle_deg, is_create = True):
+        '''Geometry folder of the case, created (with the case folder) if is_create'''
+
+        save_path = os.path.join(self.case_path(slant_angle_deg), 'geometry')
+        if is_create:
+            os.makedirs(save_path, exist_ok=True)
+        return save_path
+
+    def write_stl(self, slant_angle_deg, fn_local, solids, is_binary = False, is_case_copy = False):
+        '''Write solids (see stl_writer.write_stl) to fn_local in the geometry folder
+
+        Args
+            slant_angle_deg (float) : case slant angle
+            fn_local (str)          : file name
+            solids (list)           : (name, points, triangles) per solid
+            is_binary (bool)        : binary instead of ascii stl
+            is_case_copy (bool)     : also hard link (or copy) the file to the case folder
+        Returns
+            fn_save (str) : written file
+        '''
+        fn_save = os.path.join(self.geometry_path(slant_angle_deg), fn_local)
+        write_stl(fn_save + '.tmp', solids, is_binary = is_binary)
+        os.replace(fn_save + '.tmp', fn_save)
+        if is_case_copy:
+            link_or_copy(fn_save, os.path.join(self.case_path(slant_angle_deg), fn_local))
+        return fn_save
+
+class memory_sink(directory_sink):
+    def __init__(self):
+        '''Keeps written .stl solids in memory, in self.stl, instead of writing them.
+
+        Files only gmsh can write (body_full.msh, .vtk) go to a temporary folder, made
+        on first use and removed by cleanup(). Intended for tests and dry runs of the
+        geometry stage.
+
+        ARGS:
+            none
+        '''
+        super().__init__()
+        self.stl = {}
+
+    @property
+    def save_path_base(self):
+        if self._save_path_base is None:
+            self._save_path_base = tempfile.mkdtemp(prefix='ahmed_geometry_')
+        return self._save_path_base
+
+    def write_stl(self, slant_angle_deg, fn_local, solids, is_binary = False, is_case_copy = False):
+        '''Store solids under (case folder name, fn_local), returns None'''
+
+        self.stl[(self.case_name(slant_angle_deg), fn_local)] = list(solids)
+        return None
+
+    def cleanup(self):
+        '''Remove the temporary folder, if one was made'''
+
+        if self._save_path_base is not None:
+            shutil.rmtree(self._save_path_base, ignore_errors=True)
+            self._save_path_base = None
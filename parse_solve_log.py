@@ -0,0 +1,216 @@
+import os
+import re
+import sys
+import glob
+import numpy as np
+
+from history_store import write_history
+
+# fields solved by simpleFoam with kOmegaSST, in log order
+LOG_FIELDS = ['Ux', 'Uy', 'Uz', 'p', 'omega', 'k']
+
+# an iteration starts at a Time = line, the other patterns are searched within it
+TIME_LINE           = b'\nTime = '
+SOLVE_PATTERN       = re.compile(rb'Solving for (\w+), Initial residual = ([^,\s]+), Final residual = ([^,\s]+)')
+CONTINUITY_PATTERN  = re.compile(rb'continuity errors : sum local = ([^,\s]+), global = ([^,\s]+), cumulative = ([^,\s]+)')
+COEFF_PATTERN       = re.compile(rb'\n[ \t]*(Cd|Cl)[ \t]*[:=][ \t]*([^\s]+)')
+
+def solve_log_dtype(fields = LOG_FIELDS):
+    '''Structured dtype of one row (iteration) of the solver history.
+
+    <field>_initial is the initial residual of the first solve of the field in the iteration,
+    <field>_final the final residual of the last one, so with non-orthogonal correctors (p
+    solved nNonOrthogonalCorrectors + 1 times) they come from different solves.'''
+
+    columns = [('time', 'f8')]
+    for field in fields:
+        columns += [('{}_initial'.format(field), 'f8'),
+                    ('{}_final'.format(field), 'f8'),
+                    ('{}_n_solves'.format(field), 'i4')]
+    columns += [('continuity_local', 'f8'), ('continuity_global', 'f8'), ('continuity_cumulative', 'f8'),
+                ('Cd', 'f8'), ('Cl', 'f8')]
+    return np.dtype(columns)
+
+class solve_log_parser():
+    def __init__(self, fields = LOG_FIELDS):
+        '''Incremental parser of a simpleFoam log, one row per iteration (Time = ...).
+
+        Text is given in any number of pieces with feed(); only whole lines are parsed and
+        the partial line at the end of a piece is kept for the next one, so a growing log
+        can be followed by feeding only the new bytes.
+
+        Per field and iteration, the initial residual of the first solve (the value of a
+        non-orthogonal corrector loop that is plotted) and the final residual of the last
+        solve are kept, with the number of solves. Output before the first Time = line is
+        ignored. Missing values are nan, a value that is not a number raises ValueError.
+
+        ARGS:
+            fields  : solved fields to keep, others are ignored
+        '''
+        self.fields = list(fields)
+        self.dtype  = solve_log_dtype(self.fields)
+        self.rows   = []
+        self.carry  = b''
+        self.row    = None
+        self.n_bytes = 0
+
+        # column index of every value, rows are kept as lists until to_array
+        names = self.dtype.names
+        self.field_columns  = {field.encode('ascii') : (names.index('{}_initial'.format(field)),
+                                                        names.index('{}_final'.format(field)),
+                                                        names.index('{}_n_solves'.format(field)))
+                               for field in self.fields}
+        self.coeff_columns  = {coeff.encode('ascii') : names.index(coeff) for coeff in ['Cd', 'Cl']}
+        self.i_continuity   = names.index('continuity_local')
+        self.empty_row      = [0 if self.dtype[name].kind == 'i' else np.nan for name in names]
+
+    def feed(self, data):
+        '''Parse the complete lines of data (bytes), returns the number of rows completed by it'''
+
+        self.n_bytes += len(data)
+        buf = self.carry + data
+        i_newline = buf.rfind(b'\n')
+        if i_newline < 0:
+            self.carry = buf
+            return 0
+        self.carry = buf[i_newline+1:]
+        return self._parse(buf[:i_newline+1])
+
+    def close(self):
+        '''Parse a trailing line without newline and complete the last iteration, returns the
+        number of rows completed'''
+
+        n_rows = len(self.rows)
+        if self.carry.strip():
+            self._parse(self.carry)
+        self.carry = b''
+        if self.row is not None:
+            self.rows.append(tuple(self.row))
+            self.row = None
+        return len(self.rows) - n_rows
+
+    def _parse(self, text):
+        '''Split whole lines into iterations at the Time = lines, each searched with one
+        compiled pattern per kind of line'''
+
+        n_rows = len(self.rows)
+        blocks = (b'\n' + text).split(TIME_LINE)
+        self._update_row(blocks[0], 0)
+        for block in blocks[1:]:
+            # a last Time = line without newline (close) ends at the end of text
+            i_newline = block.find(b'\n')
+            if i_newline < 0:
+                i_newline = len(block)
+            self._new_row(float(block[:i_newline]))
+            self._update_row(block, i_newline)
+        return len(self.rows) - n_rows
+
+    def _update_row(self, block, pos):
+        '''Store the values of block[pos:] in the iteration in progress'''
+
+        row = self.row
+        if row is None:
+            return
+        for field, initial, final in SOLVE_PATTERN.findall(block, pos):
+            columns = self.field_columns.get(field)
+            if columns is None:
+                continue
+            i_initial, i_final, i_n_solves = columns
+            if row[i_n_solves] == 0:
+                row[i_initial] = float(initial)
+            row[i_final] = float(final)
+            row[i_n_solves] += 1
+        for errors in CONTINUITY_PATTERN.findall(block, pos):
+            row[self.i_continuity:self.i_continuity+3] = [float(error) for error in errors]
+        for coeff, value in COEFF_PATTERN.findall(block, pos):
+            row[self.coeff_columns[coeff]] = float(value)
+
+    def _new_row(self, time):
+        if self.row is not None:
+            self.rows.append(tuple(self.row))
+        self.row = list(self.empty_row)
+        self.row[0] = time
+
+    def to_array(self, is_include_last = True):
+        '''Structured array of the parsed rows, with the iteration in progress if is_include_last'''
+
+        rows = list(self.rows)
+        if is_include_last and self.row is not None:
+            rows.append(tuple(self.row))
+        return np.array(rows, dtype=self.dtype)
+
+def parse_solve_log(fn_logs, fields = LOG_FIELDS, chunk_size = 1 << 22):
+    '''Parse one or more log files (concatenated in the given order) in a single streaming pass
+
+    Args
+        fn_logs (str or list of str)    : log file(s)
+        fields (list of str)            : solved fields to keep
+        chunk_size (int)                : read size in bytes
+    Returns
+        history (np.ndarray) : structured array, one row per iteration, see solve_log_dtype
+    '''
+    if isinstance(fn_logs, str):
+        fn_logs = [fn_logs]
+
+    parser = solve_log_parser(fields = fields)
+    for fn_log in fn_logs:
+        with open(fn_log, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                parser.feed(chunk)
+        parser.close()
+    return parser.to_array()
+
+def read_n_non_orth_correctors(case_path):
+    '''nNonOrthogonalCorrectors of the SIMPLE dictionary in case_path/system/fvSolution, None if
+    the file or entry is missing (OpenFOAM then uses 0)'''
+
+    try:
+        with open(os.path.join(case_path, 'system', 'fvSolution'), 'r') as f:
+            text = f.read()
+    except OSError:
+        return None
+    # drop comments, then look inside SIMPLE { ... }
+    text  = re.sub(r'//[^\n]*|/\*.*?\*/', '', text, flags=re.S)
+    match = re.search(r'\bSIMPLE\s*\{[^{}]*?\bnNonOrthogonalCorrectors\s+(\d+)\s*;', text)
+    return int(match.group(1)) if match is not None else None
+
+def infer_n_non_orth_correctors(fn_logs, field = 'p', n_bytes = 1 << 22):
+    '''Number of non-orthogonal correctors from the number of solves of field per iteration in
+    the first n_bytes of the log(s), the most common count minus one. None if no complete
+    iteration is found.'''
+
+    if isinstance(fn_logs, str):
+        fn_logs = [fn_logs]
+    parser = solve_log_parser(fields = [field])
+    for fn_log in fn_logs:
+        with open(fn_log, 'rb') as f:
+            parser.feed(f.read(n_bytes))
+        if len(parser.rows) > 0:
+            break
+    n_solves = parser.to_array(is_include_last = False)['{}_n_solves'.format(field)]
+    n_solves = n_solves[n_solves > 0]
+    if len(n_solves) == 0:
+        return None
+    return int(np.bincount(n_solves).argmax()) - 1
+
+def gather_log(slant_angle, fields = LOG_FIELDS, save_path_base = None):
+    '''Parse <save_path_base>/slant_angle_<angle>/*solve.log and save the history to
+    residuals/history.npy, replacing gather_residuals.sh and gather_cd.sh. save_path_base
+    defaults to $AHMED_SLANT_PATH'''
+
+    if save_path_base is None:
+        save_path_base = os.environ['AHMED_SLANT_PATH']
+    case_path   = os.path.join(save_path_base, 'slant_angle_{}'.format(slant_angle))
+    res_path    = os.path.join(case_path, 'residuals')
+    fn_logs     = sorted(glob.glob(os.path.join(case_path, '*solve.log')))
+    if len(fn_logs) == 0:
+        raise FileNotFoundError('no *solve.log in {}'.format(case_path))
+
+    history = parse_solve_log(fn_logs, fields = fields)
+    os.makedirs(res_path, exist_ok=True)
+    write_history(os.path.join(res_path, 'history.npy'), history)
+    return history
+
+if __name__ == '__main__':
+    slant_angle = sys.argv[1]
+    gather_log(slant_angle=slant_angle)
@@ -32,8 +32,10 @@ def plot_cd(slant_angle,
     #     plot_dict[var] = plot_dict[var][idx_keep]
 
 
+    # one figure, cleared and saved once per quantity
     fig = plt.figure()
     for var, res in plot_dict.items():
+        fig.clf()
         if is_logy:
             plt.semilogy(res, label=var)
             fn_save = os.path.join(res_path, '{}_vs_iteration_logy.jpg'.format(var))
@@ -41,9 +43,8 @@ def plot_cd(slant_angle,
             plt.plot(res, label=var)
             fn_save = os.path.join(res_path, '{}_vs_iteration.jpg'.format(var))
         plt.legend()
-        
         plt.savefig(fn_save, dpi=150, bbox_inches='tight')
-        plt.close()
+    plt.close(fig)
 
 if __name__ == '__main__':
     slant_angle = sys.argv[1]
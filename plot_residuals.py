@@ -1,11 +1,122 @@
 import sys
 import os
+import glob
 import matplotlib.pyplot as plt
 import numpy as np
 
+from parse_solve_log import read_n_non_orth_correctors, infer_n_non_orth_correctors, solve_log_dtype
+from history_store import write_history
+
+# columns of residuals/history.npy (parse_solve_log.py) for the residual variables of gather_residuals.sh.
+# <field>_initial is the initial residual of the first solve of the iteration, as plotted from
+# the gather_residuals.sh files (one point per iteration for p, see NON_ORTH_VARS); <field>_final
+# is the final residual of the last solve, so for p they belong to different corrector solves.
+HISTORY_COLUMNS = { 'ux'            : 'Ux_initial',
+                    'uy'            : 'Uy_initial',
+                    'uz'            : 'Uz_initial',
+                    'p'             : 'p_initial',
+                    'omega'         : 'omega_initial',
+                    'k'             : 'k_initial',
+                    'continuity'    : 'continuity_local', }
+
+# variables solved inside the non-orthogonal corrector loop of simpleFoam
+NON_ORTH_VARS = ['p']
+
+def detect_n_ortho_corrector(case_path, res_vars):
+    '''Number of non-orthogonal correctors per residual variable, inferred from the solves of p
+    per iteration in case_path/*solve.log (what was actually run), else read from
+    system/fvSolution, else 0'''
+
+    fn_logs = sorted(glob.glob(os.path.join(case_path, '*solve.log')))
+    n_corr  = infer_n_non_orth_correctors(fn_logs) if len(fn_logs) > 0 else None
+    if n_corr is None:
+        n_corr = read_n_non_orth_correctors(case_path)
+    if n_corr is None:
+        n_corr = 0
+    return [n_corr if var in NON_ORTH_VARS else 0 for var in res_vars]
+
+def read_residuals( res_path,
+                    res_vars            = ['ux', 'uy', 'uz', 'p', 'omega', 'k', 'continuity'],
+                    n_ortho_corrector   = None ):
+    '''Read one residual per iteration for each variable, from residuals/history.npy if present
+    (first solve of each iteration), else from the .txt files of gather_residuals.sh (see
+    read_residual_txt)
+
+    Returns
+        plot_dict (dict) : variable -> residual per iteration (np.ndarray)
+    '''
+    fn_history = os.path.join(res_path, 'history.npy')
+    if os.path.exists(fn_history):
+        history = np.load(fn_history)
+        return {var : history[HISTORY_COLUMNS[var]] for var in res_vars}
+    return read_residual_txt(res_path, res_vars, n_ortho_corrector)
+
+def read_residual_txt(  res_path,
+                        res_vars            = ['ux', 'uy', 'uz', 'p', 'omega', 'k', 'continuity'],
+                        n_ortho_corrector   = None ):
+    '''Read one residual per iteration for each variable from the .txt files of gather_residuals.sh
+
+    The .txt files hold one line per solve, n_ortho_corrector + 1 per iteration, of which the
+    first is kept. If n_ortho_corrector is None it is detected for the case (see
+    detect_n_ortho_corrector). An incomplete last iteration is dropped.
+
+    Returns
+        plot_dict (dict) : variable -> residual per iteration (np.ndarray)
+    '''
+    if n_ortho_corrector is None:
+        n_ortho_corrector = detect_n_ortho_corrector(os.path.dirname(res_path), res_vars)
+
+    #read the residuals, keep the first solve of each iteration
+    plot_dict = {}
+    for ii, var in enumerate(res_vars):
+        fn_read = os.path.join(res_path, '{}.txt'.format(var))
+        curdata = np.atleast_1d(np.loadtxt(fn_read))
+        step    = n_ortho_corrector[ii] + 1
+        n_iter  = curdata.shape[0] // step
+        plot_dict[var] = curdata[:n_iter * step].reshape(n_iter, step)[:, 0]
+
+    # every variable is solved once per iteration, so the counts must agree
+    n_iters = set(len(res) for res in plot_dict.values())
+    if len(n_iters) > 1:
+        print('warning: iteration counts {} differ between residual variables, '
+              'check n_ortho_corrector {}'.format(sorted(n_iters), n_ortho_corrector))
+    return plot_dict
+
+def convert_residual_txt(res_path, n_ortho_corrector = None, is_overwrite = False):
+    '''Build res_path/history.npy from the .txt files of gather_residuals.sh and gather_cd.sh, one
+    row per iteration with the columns of parse_solve_log.py (values not in the .txt files are
+    nan, time is the iteration number). The .txt files are kept.
+
+    An existing history.npy (e.g. from parse_solve_log.py, which has every column) is not
+    replaced unless is_overwrite.
+
+    Returns
+        history (np.ndarray) : structured array, see solve_log_dtype
+    '''
+    fn_history = os.path.join(res_path, 'history.npy')
+    if os.path.exists(fn_history) and not is_overwrite:
+        raise FileExistsError('{} exists, pass is_overwrite=True to rebuild it from the .txt files'.format(fn_history))
+
+    residuals = read_residual_txt(res_path, list(HISTORY_COLUMNS.keys()), n_ortho_corrector)
+    fn_cd = os.path.join(res_path, 'cd.txt')
+    if os.path.exists(fn_cd):
+        residuals['Cd'] = np.atleast_1d(np.loadtxt(fn_cd))
+
+    n_iter  = max(len(values) for values in residuals.values())
+    history = np.zeros(n_iter, dtype=solve_log_dtype())
+    for name in history.dtype.names:
+        if history.dtype[name].kind == 'f':
+            history[name] = np.nan
+    history['time'] = np.arange(1, n_iter + 1)
+    for var, values in residuals.items():
+        history[HISTORY_COLUMNS.get(var, var)][:len(values)] = values
+
+    write_history(fn_history, history)
+    return history
+
 def plot_residuals( slant_angle, 
                     res_vars            = ['ux', 'uy', 'uz', 'p', 'omega', 'k', 'continuity'],
-                    n_ortho_corrector   = [0, 0, 0, 1, 0, 0, 0],
+                    n_ortho_corrector   = None,
                     is_limit_yaxis_max     = True,
                     yaxis_max_value     = 1 ):
     '''Plot the residuals from an OpenFoam simulation which have been preprocessed
@@ -14,28 +125,11 @@ def plot_residuals( slant_angle,
     Args
         case_name (str) : simulation folder
         res_vars (list of str) : residual variables
-        n_ortho_corrector (list of int) : number of orthogonal correctors per residual variables
+        n_ortho_corrector (list of int) : number of orthogonal correctors per residual variables,
+                                          None to read it from the case (see detect_n_ortho_corrector)
         '''
     res_path = os.path.join(os.environ['AHMED_SLANT_PATH'], 'slant_angle_{}'.format(slant_angle), 'residuals')
-
-    #TODO: add check to read the number of non-orthogonal correctors
-
-    #read the residuals
-    plot_dict = {}
-    for ii, var in enumerate(res_vars):
-        fn_read = os.path.join(res_path, '{}.txt'.format(var))
-        curdata = np.loadtxt(fn_read)
-        plot_dict[var] = curdata
-
-    #get the final residuals per iteratin given the number of orthogonal correctors
-    for ii, var in enumerate(res_vars):
-        ncorr       = n_ortho_corrector[ii]
-        idx_start   = 0
-        step        = ncorr + 1
-        idx_end     = plot_dict[var].shape[0]
-        idx_keep    = np.arange(start = idx_start, stop = idx_end, step = step)
-        plot_dict[var] = plot_dict[var][idx_keep]
-
+    plot_dict = read_residuals(res_path, res_vars, n_ortho_corrector)
 
     fig = plt.figure()
     for var, res in plot_dict.items():
@@ -0,0 +1,109 @@
+import os
+import argparse
+import traceback
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+
+from plot_residuals import read_residuals
+from aggregate_cd_sweep import find_cases, case_sources, load_case_coeffs
+
+RES_VARS = ['ux', 'uy', 'uz', 'p', 'omega', 'k', 'continuity']
+
+class history_figure():
+    def __init__(self, line_names, is_logy = True, y_max = None):
+        '''A figure with one line per name, created once and reused: plot() only replaces the
+        line data, rescales the axes and saves, so no artists are built per case.
+
+        ARGS:
+            line_names  : one line (and legend entry) per name
+            is_logy     : log scale y axis
+            y_max       : fixed upper y limit, None to autoscale
+        '''
+        self.fig, self.ax = plt.subplots()
+        self.lines = {name : self.ax.plot([], [], label=name)[0] for name in line_names}
+        if is_logy:
+            self.ax.set_yscale('log')
+        self.ax.set_xlabel('iteration')
+        self.ax.legend()
+        self.y_max = y_max
+
+    def plot(self, data, fn_save, dpi = 150):
+        '''Set line name to data[name] (lines missing from data are emptied) and save to fn_save'''
+
+        for name, line in self.lines.items():
+            values = np.asarray(data.get(name, []))
+            line.set_data(np.arange(len(values)), values)
+        self.ax.relim()
+        self.ax.autoscale_view()
+        if self.y_max is not None:
+            self.ax.set_ylim(top=self.y_max)
+        self.fig.savefig(fn_save, dpi=dpi)
+
+# figures of each worker process, made once by _init_worker
+_figures = {}
+
+def _init_worker(res_vars, is_cd_logy, yaxis_max_value):
+    _figures['residuals']   = history_figure(res_vars, is_logy = True, y_max = yaxis_max_value)
+    _figures['cd']          = history_figure(['cd'], is_logy = is_cd_logy)
+
+def _plot_case(case_path, res_vars, n_ortho_corrector, is_cd_logy):
+    '''Worker: residual and Cd plots of one case, returns the error traceback or None'''
+
+    try:
+        res_path = os.path.join(case_path, 'residuals')
+        os.makedirs(res_path, exist_ok=True)
+        # cases not run yet have neither parse_solve_log.py nor gather_residuals.sh output
+        if any(os.path.exists(os.path.join(res_path, fn)) for fn in ['history.npy', '{}.txt'.format(res_vars[0])]):
+            residuals = read_residuals(res_path, res_vars, n_ortho_corrector)
+            _figures['residuals'].plot(residuals, os.path.join(res_path, 'residuals_vs_iteration.jpg'))
+
+        kind, _ = case_sources(case_path)
+        if kind is not None:
+            fn_cd = 'cd_vs_iteration_logy.jpg' if is_cd_logy else 'cd_vs_iteration.jpg'
+            _figures['cd'].plot({'cd' : load_case_coeffs(case_path, kind)['Cd']}, os.path.join(res_path, fn_cd))
+    except Exception:
+        return traceback.format_exc()
+    return None
+
+def plot_sweep( save_path_base      = None,
+                n_workers           = None,
+                res_vars            = RES_VARS,
+                n_ortho_corrector   = None,
+                is_cd_logy          = True,
+                yaxis_max_value     = 1 ):
+    '''Residual and Cd vs. iteration plots of every slant_angle_* case, as plot_residuals and
+    plot_cd would make them, rendered with the Agg backend in a process pool. Each worker
+    builds its two figures once and reuses them for all of its cases.
+
+    Args
+        save_path_base (str)    : defaults to $AHMED_SLANT_PATH
+        n_workers (int)         : number of worker processes, defaults to os.cpu_count()
+        res_vars, n_ortho_corrector, yaxis_max_value : as in plot_residuals
+        is_cd_logy (bool)       : log scale Cd plot, as plot_cd
+    Returns
+        failed (dict) : case path -> traceback of cases that could not be plotted
+    '''
+    cases = [case_path for _, case_path in find_cases(save_path_base)]
+    failed = {}
+    with ProcessPoolExecutor(   max_workers = n_workers,
+                                initializer = _init_worker,
+                                initargs    = (res_vars, is_cd_logy, yaxis_max_value)) as executor:
+        errors = executor.map(_plot_case, cases, [res_vars]*len(cases), [n_ortho_corrector]*len(cases),
+                              [is_cd_logy]*len(cases), chunksize = 4)
+        for case_path, error in zip(cases, errors):
+            if error is not None:
+                failed[case_path] = error
+                print('{}: {}'.format(os.path.basename(case_path), error.rstrip().splitlines()[-1]))
+    print('{:d} cases plotted, {:d} failed'.format(len(cases) - len(failed), len(failed)))
+    return failed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plot residuals and Cd vs. iteration for all cases')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--linear-cd', action='store_true', help='linear instead of log scale Cd plots')
+    args = parser.parse_args()
+
+    plot_sweep(n_workers = args.workers, is_cd_logy = not args.linear_cd)
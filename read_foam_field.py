@@ -0,0 +1,331 @@
+import os
+import re
+import sys
+import gzip
+import json
+import numpy as np
+
+# number of components per value of each field class
+FIELD_COMPONENTS = {'Scalar' : 1, 'Vector' : 3, 'SphericalTensor' : 1, 'SymmTensor' : 6, 'Tensor' : 9}
+LIST_COMPONENTS  = {'scalar' : 1, 'vector' : 3, 'sphericalTensor' : 1, 'symmTensor' : 6, 'tensor' : 9}
+
+HEADER_PATTERN  = re.compile(rb'FoamFile\s*\{(.*?)\}', re.S)
+HEADER_ENTRY    = re.compile(rb'(\w+)\s+([^;]*);')
+# uniform or nonuniform field entry after a keyword
+FIELD_ENTRY     = re.compile(rb'\s*(uniform|nonuniform)\s*(?:List<(\w+)>)?\s*')
+LIST_START      = re.compile(rb'\s*(\d+)\s*([({])')
+# size and opening bracket of the list making up a whole file, e.g. a labelList
+LIST_SIZE       = re.compile(rb'(\d+)\s*([({])')
+LIST_END        = re.compile(rb'\)\s*;')
+BLOCK_START     = re.compile(rb'\s*([^\s{};]+)\s*\{')
+BLOCK_END       = re.compile(rb'\s*\}')
+KEYWORD         = re.compile(rb'\s*([^\s{};]+)')
+DIMENSIONS      = re.compile(rb'dimensions\s*\[([^\]]*)\]')
+INTERNAL_FIELD  = re.compile(rb'\binternalField\b')
+BOUNDARY_FIELD  = re.compile(rb'\bboundaryField\s*\{')
+
+def read_foam_bytes(fn_field):
+    '''Contents of an OpenFOAM file, decompressed if it is gzipped. fn_field may be given
+    without the .gz extension written with writeCompression on.'''
+
+    if not os.path.exists(fn_field) and os.path.exists(fn_field + '.gz'):
+        fn_field += '.gz'
+    with open(fn_field, 'rb') as f:
+        data = f.read()
+    if data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+    return data
+
+def read_header(data):
+    '''FoamFile header entries as a dict of str, e.g. format, class, object, arch'''
+
+    match = HEADER_PATTERN.search(data)
+    if match is None:
+        raise ValueError('no FoamFile header')
+    header = {key.decode() : value.strip().strip(b'"').decode() for key, value in HEADER_ENTRY.findall(match.group(1))}
+    header['_end'] = match.end()
+    return header
+
+def read_file_header(fn_field, n_bytes = 4096):
+    '''FoamFile header of a file (see read_header), only decompressing its first n_bytes'''
+
+    if not os.path.exists(fn_field) and os.path.exists(fn_field + '.gz'):
+        fn_field += '.gz'
+    with open(fn_field, 'rb') as f:
+        is_gzip = f.read(2) == b'\x1f\x8b'
+    with (gzip.open if is_gzip else open)(fn_field, 'rb') as f:
+        return read_header(f.read(n_bytes))
+
+def _n_components(field_class):
+    for name, n_components in sorted(FIELD_COMPONENTS.items(), key=lambda item: -len(item[0])):
+        if field_class.endswith(name + 'Field'):
+            return n_components
+    raise ValueError('unknown field class {}'.format(field_class))
+
+def _scalar_dtype(header):
+    '''Binary scalar type from the arch entry, e.g. "LSB;label=32;scalar=64"'''
+
+    arch = header.get('arch', '')
+    bits = re.search(r'scalar=(\d+)', arch)
+    byte_order = '>' if 'MSB' in arch else '<'
+    return np.dtype('{}f{:d}'.format(byte_order, int(bits.group(1)) // 8 if bits else 8))
+
+def _label_dtype(header):
+    '''Binary label type from the arch entry'''
+
+    arch = header.get('arch', '')
+    bits = re.search(r'label=(\d+)', arch)
+    byte_order = '>' if 'MSB' in arch else '<'
+    return np.dtype('{}i{:d}'.format(byte_order, int(bits.group(1)) // 8 if bits else 4))
+
+def parse_label_list(data, pos, header):
+    '''Parse the label list whose size is at pos, e.g. a labelList file or one of the two
+    lists of a faceCompactList
+
+    Returns
+        labels (np.ndarray)     : (n,) int64
+        pos (int)               : position after the closing bracket
+    '''
+    list_start = LIST_START.match(data, pos)
+    if list_start is None:
+        raise ValueError('no list size at byte {:d}'.format(pos))
+    n_values    = int(list_start.group(1))
+    pos         = list_start.end()
+
+    if list_start.group(2) == b'{':
+        end = data.index(b'}', pos)
+        return np.full(n_values, int(data[pos:end]), dtype=np.int64), end + 1
+    if n_values == 0:
+        return np.zeros(0, dtype=np.int64), data.index(b')', pos) + 1
+    if header.get('format', 'ascii') == 'binary':
+        dtype   = _label_dtype(header)
+        labels  = np.frombuffer(data, dtype=dtype, count=n_values, offset=pos)
+        end     = data.index(b')', pos + n_values * dtype.itemsize) + 1
+    else:
+        end     = data.index(b')', pos) + 1
+        labels  = np.fromstring(data[pos:end - 1].decode('ascii'), dtype=np.int64, sep=' ')
+        if len(labels) != n_values:
+            raise ValueError('expected {:d} labels, read {:d}'.format(n_values, len(labels)))
+    return labels.astype(np.int64), end
+
+def read_label_list(fn_list):
+    '''Read a labelList file, e.g. constant/polyMesh/owner or cellProcAddressing
+
+    Returns
+        labels (np.ndarray) : (n,) int64
+    '''
+    data        = read_foam_bytes(fn_list)
+    header      = read_header(data)
+    list_start  = LIST_SIZE.search(data, header['_end'])
+    if list_start is None:
+        raise ValueError('no list in {}'.format(fn_list))
+    return parse_label_list(data, list_start.start(), header)[0]
+
+def parse_list(data, pos, n_components, is_binary, dtype = np.dtype('<f8'), is_entry = True):
+    '''Parse the scalar or vector list whose size is at pos.
+
+    ascii lists are converted in one np.fromstring call after stripping the vector
+    parentheses, binary lists are a single np.frombuffer view, no per-value Python work.
+
+    Args
+        is_entry (bool) : the list is a dictionary entry ending with ;, otherwise it is the
+                          whole content of a file (e.g. polyMesh/points) ending with the
+                          last ) of the data
+    Returns
+        values (np.ndarray)     : (n,) or (n, n_components)
+        pos (int)               : position after the closing ; (or ) if not is_entry)
+    '''
+    list_start = LIST_START.match(data, pos)
+    if list_start is None:
+        raise ValueError('no list size at byte {:d}'.format(pos))
+    n_values = int(list_start.group(1))
+    pos = list_start.end()
+    shape = (n_values,) if n_components == 1 else (n_values, n_components)
+
+    if list_start.group(2) == b'{':
+        # n{value}, all values equal
+        end = data.index(b'}', pos)
+        value = np.fromstring(data[pos:end].translate(None, b'()').decode('ascii'), sep=' ')
+        values = np.broadcast_to(value, shape).copy()
+        end += 1
+    elif n_values == 0:
+        values = np.zeros(shape)
+        end = data.index(b')', pos) + 1
+    elif is_binary:
+        n_bytes = n_values * n_components * dtype.itemsize
+        values = np.frombuffer(data, dtype=dtype, count=n_values * n_components, offset=pos).reshape(shape)
+        values = values.astype(np.float64)
+        end = data.index(b')', pos + n_bytes) + 1
+    else:
+        if is_entry:
+            list_end = LIST_END.search(data, pos).start()
+        else:
+            list_end = data.rindex(b')')
+        values = np.fromstring(data[pos:list_end].translate(None, b'()').decode('ascii'), sep=' ')
+        if len(values) != n_values * n_components:
+            raise ValueError('expected {:d} values, read {:d}'.format(n_values * n_components, len(values)))
+        values = values.reshape(shape)
+        end = list_end + 1
+    if is_entry:
+        end = data.index(b';', end) + 1
+    return values, end
+
+def parse_field_entry(data, pos, n_components, is_binary, dtype = np.dtype('<f8')):
+    '''Parse a uniform/nonuniform value starting at pos (just after its keyword), see
+    parse_list
+
+    Returns
+        values (np.ndarray)     : (n,) or (n, n_components) for nonuniform, (n_components,) or
+                                  scalar for uniform
+        is_uniform (bool)
+        pos (int)               : position after the closing ;
+    '''
+    match = FIELD_ENTRY.match(data, pos)
+    if match is None:
+        raise ValueError('no uniform/nonuniform value at byte {:d}'.format(pos))
+    pos = match.end()
+    if match.group(2) is not None:
+        n_components = LIST_COMPONENTS.get(match.group(2).decode(), n_components)
+
+    if match.group(1) == b'uniform':
+        end = data.index(b';', pos)
+        values = np.fromstring(data[pos:end].translate(None, b'()').decode('ascii'), sep=' ')
+        return (values[0] if n_components == 1 else values), True, end + 1
+
+    values, end = parse_list(data, pos, n_components, is_binary, dtype)
+    return values, False, end
+
+def _parse_dict(data, pos, n_components, is_binary, dtype):
+    '''Entries of the dictionary starting at pos up to its closing }. Field valued entries
+    (uniform/nonuniform) are parsed to arrays, other entries kept as str, sub-dictionaries
+    parsed recursively.
+
+    Returns
+        entries (dict), pos after the closing }
+    '''
+    entries = {}
+    while True:
+        match = BLOCK_END.match(data, pos)
+        if match is not None:
+            return entries, match.end()
+        match = KEYWORD.match(data, pos)
+        if match is None:
+            raise ValueError('unterminated dictionary at byte {:d}'.format(pos))
+        block = BLOCK_START.match(data, pos)
+        if block is not None:
+            entries[block.group(1).decode()], pos = _parse_dict(data, block.end(), n_components, is_binary, dtype)
+            continue
+
+        keyword = match.group(1).decode()
+        pos = match.end()
+        if FIELD_ENTRY.match(data, pos):
+            entries[keyword], _, pos = parse_field_entry(data, pos, n_components, is_binary, dtype)
+        else:
+            end = data.index(b';', pos)
+            entries[keyword] = data[pos:end].strip().decode('utf-8', 'replace')
+            pos = end + 1
+
+def read_field(fn_field, is_boundary = True):
+    '''Read an OpenFOAM volume field file (ascii or binary, plain or gzipped)
+
+    Args
+        fn_field (str)      : field file, e.g. case_path/1500/U (or U.gz)
+        is_boundary (bool)  : also parse boundaryField
+    Returns
+        field (dict) :  internalField (np.ndarray, (n_cells,) or (n_cells, n_components), a single
+                        value for uniform fields), is_uniform (bool), class, dimensions,
+                        boundaryField (dict, patch -> dict of entries, e.g. type and value)
+    '''
+    data        = read_foam_bytes(fn_field)
+    header      = read_header(data)
+    is_binary   = header.get('format', 'ascii') == 'binary'
+    dtype       = _scalar_dtype(header)
+    n_comp      = _n_components(header['class'])
+
+    field = {'class' : header['class'], 'format' : header.get('format', 'ascii')}
+    dimensions = DIMENSIONS.search(data, header['_end'])
+    if dimensions is not None:
+        field['dimensions'] = [float(value) for value in dimensions.group(1).split()]
+
+    match = INTERNAL_FIELD.search(data, header['_end'])
+    if match is None:
+        raise ValueError('no internalField in {}'.format(fn_field))
+    field['internalField'], field['is_uniform'], pos = parse_field_entry(data, match.end(), n_comp, is_binary, dtype)
+
+    if is_boundary:
+        match = BOUNDARY_FIELD.search(data, pos)
+        if match is not None:
+            field['boundaryField'], _ = _parse_dict(data, match.end(), n_comp, is_binary, dtype)
+    return field
+
+def find_field_file(case_path, time_name, field_name):
+    fn_field = os.path.join(case_path, time_name, field_name)
+    for fn in [fn_field, fn_field + '.gz']:
+        if os.path.exists(fn):
+            return fn
+    raise FileNotFoundError('no field {} in {}'.format(field_name, os.path.join(case_path, time_name)))
+
+def read_internal_field(case_path,
+                        time_name,
+                        field_name,
+                        is_cache    = True,
+                        mmap_mode   = 'r' ):
+    '''internalField of one field of a case, with an optional .npy side cache in
+    case_path/field_cache/<time_name>/<field_name>.npy, kept next to a .json of the size
+    and mtime of the source file and used as long as the source is unchanged. The cache
+    lives outside the time folders, so OpenFOAM and ParaView do not see it.
+
+    Args
+        case_path (str)     : case folder
+        time_name (str)     : time folder name, e.g. '1500'
+        field_name (str)    : e.g. 'U', 'p', 'k', 'omega', 'nut'
+        is_cache (bool)     : use and update the side cache
+        mmap_mode (str)     : np.load mmap_mode of a cached array, None to load into memory
+    Returns
+        values (np.ndarray) : (n_cells,) or (n_cells, n_components)
+    '''
+    fn_field = find_field_file(case_path, time_name, field_name)
+    if not is_cache:
+        return read_field(fn_field, is_boundary = False)['internalField']
+
+    cache_path  = os.path.join(case_path, 'field_cache', time_name)
+    fn_cache    = os.path.join(cache_path, '{}.npy'.format(field_name))
+    fn_meta     = fn_cache + '.json'
+    source      = [os.path.relpath(fn_field, case_path), os.path.getsize(fn_field), os.path.getmtime(fn_field)]
+    try:
+        with open(fn_meta, 'r') as f:
+            if json.load(f) == source:
+                return np.load(fn_cache, mmap_mode=mmap_mode)
+    except (OSError, ValueError):
+        pass
+
+    field = read_field(fn_field, is_boundary = False)
+    if field['is_uniform']:
+        # nothing to cache without the cell count
+        return field['internalField']
+    os.makedirs(cache_path, exist_ok=True)
+    np.save(fn_cache, field['internalField'])
+    with open(fn_meta, 'w') as f:
+        json.dump(source, f)
+    return field['internalField']
+
+def read_time_fields(   case_path,
+                        time_name,
+                        field_names = ['U', 'p', 'k', 'omega', 'nut'],
+                        **read_kwargs ):
+    '''read_internal_field of several fields of one time folder
+
+    Returns
+        fields (dict) : field name -> internalField
+    '''
+    return {field_name : read_internal_field(case_path, time_name, field_name, **read_kwargs)
+            for field_name in field_names}
+
+if __name__ == '__main__':
+    field = read_field(sys.argv[1])
+    values = np.asarray(field['internalField'])
+    print('{} {}, internalField {} {}'.format(field['class'], field['format'],
+                                              'uniform' if field['is_uniform'] else 'nonuniform', values.shape))
+    for patch, entries in field.get('boundaryField', {}).items():
+        value = entries.get('value')
+        print('{:>24s} {:>24s} {}'.format(patch, str(entries.get('type')), '' if value is None else np.shape(value)))
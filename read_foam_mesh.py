@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+
+from read_foam_field import read_foam_bytes, read_header, parse_list, parse_label_list, read_label_list, \
+                            _scalar_dtype, LIST_SIZE
+
+MESH_FILES = ['points', 'faces', 'owner', 'neighbour']
+
+def _mesh_file(mesh_path, name):
+    fn = os.path.join(mesh_path, name)
+    if not os.path.exists(fn) and os.path.exists(fn + '.gz'):
+        fn += '.gz'
+    return fn
+
+def read_points(fn_points):
+    '''Read a polyMesh points file (vectorField)
+
+    Returns
+        points (np.ndarray) : (n_points, 3)
+    '''
+    data        = read_foam_bytes(fn_points)
+    header      = read_header(data)
+    list_start  = LIST_SIZE.search(data, header['_end'])
+    if list_start is None:
+        raise ValueError('no list in {}'.format(fn_points))
+    return parse_list(data, list_start.start(), 3, header.get('format', 'ascii') == 'binary',
+                      _scalar_dtype(header), is_entry = False)[0]
+
+def read_faces(fn_faces):
+    '''Read a polyMesh faces file, faceList (ascii) or faceCompactList (binary)
+
+    Faces are returned in compact form, the points of face i are
+    vertices[offsets[i]:offsets[i + 1]]. An ascii faceList, N(n0(a b c) n1(d e f g) ...),
+    is read in one np.fromstring call: each closing ) is replaced by -1, which marks where
+    each face ends, the token after it is the size of the next face.
+
+    Returns
+        offsets (np.ndarray)    : (n_faces + 1,) int64
+        vertices (np.ndarray)   : (offsets[-1],) int64 point labels
+    '''
+    data        = read_foam_bytes(fn_faces)
+    header      = read_header(data)
+    list_start  = LIST_SIZE.search(data, header['_end'])
+    if list_start is None:
+        raise ValueError('no list in {}'.format(fn_faces))
+
+    if header['class'] == 'faceCompactList':
+        offsets, pos    = parse_label_list(data, list_start.start(), header)
+        vertices, _     = parse_label_list(data, pos, header)
+        return offsets, vertices
+
+    n_faces = int(list_start.group(1))
+    if n_faces == 0:
+        return np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    tokens  = np.fromstring(data[list_start.end():data.rindex(b')')].replace(b'(', b' ').replace(b')', b' -1 ').decode('ascii'),
+                            dtype=np.int64, sep=' ')
+    ends    = np.flatnonzero(tokens == -1)
+    starts  = np.concatenate([[0], ends[:-1] + 1])
+    sizes   = tokens[starts]
+    if len(ends) != n_faces or np.any(sizes != ends - starts - 1):
+        raise ValueError('malformed face list in {}'.format(fn_faces))
+    is_vertex = np.ones(len(tokens), dtype=bool)
+    is_vertex[starts] = False
+    is_vertex[ends] = False
+    return np.concatenate([[0], np.cumsum(sizes)]), tokens[is_vertex]
+
+def read_poly_mesh(case_path):
+    '''Read constant/polyMesh/{points,faces,owner,neighbour} of a case (ascii or binary,
+    plain or gzipped)
+
+    Returns
+        mesh (dict) : points (n_points, 3), face_offsets, face_vertices (see read_faces),
+                      owner (n_faces,), neighbour (n_internal_faces,)
+    '''
+    mesh_path = os.path.join(case_path, 'constant', 'polyMesh')
+    offsets, vertices = read_faces(_mesh_file(mesh_path, 'faces'))
+    return {'points'        : read_points(_mesh_file(mesh_path, 'points')),
+            'face_offsets'  : offsets,
+            'face_vertices' : vertices,
+            'owner'         : read_label_list(_mesh_file(mesh_path, 'owner')),
+            'neighbour'     : read_label_list(_mesh_file(mesh_path, 'neighbour')), }
+
+def _bincount3(labels, values, n_bins):
+    '''Per-bin sums of (n, 3) values'''
+
+    return np.stack([np.bincount(labels, weights=values[:, i], minlength=n_bins) for i in range(3)], axis=1)
+
+def face_centres_areas(points, offsets, vertices):
+    '''Face centres and area vectors, as primitiveMesh::makeFaceCentresAndAreas: each face
+    is split into triangles from the mean of its points, the centre is the area weighted
+    mean of the triangle centres, the area vector the sum of the triangle area vectors.
+    All faces are handled at once, sums per face are np.bincount over the face of each
+    face point.
+
+    Returns
+        face_centres (np.ndarray)   : (n_faces, 3)
+        face_areas (np.ndarray)     : (n_faces, 3) area vectors, pointing out of the owner cell
+    '''
+    n_faces = len(offsets) - 1
+    sizes   = np.diff(offsets)
+    face    = np.repeat(np.arange(n_faces), sizes)
+    # next point of each face point, wrapping to the first point at the end of the face
+    i_next  = np.arange(1, len(vertices) + 1)
+    i_next[offsets[1:] - 1] = offsets[:-1]
+
+    p0      = points[vertices]
+    p1      = points[vertices[i_next]]
+    centre_estimate = _bincount3(face, p0, n_faces) / sizes[:, None]
+
+    c       = p0 + p1 + centre_estimate[face]
+    n       = np.cross(p1 - p0, centre_estimate[face] - p0)
+    a       = np.linalg.norm(n, axis=1)
+    sum_n   = _bincount3(face, n, n_faces)
+    sum_a   = np.bincount(face, weights=a, minlength=n_faces)
+    sum_ac  = _bincount3(face, a[:, None] * c, n_faces)
+
+    is_degenerate   = sum_a < 1e-300
+    face_centres    = np.where(is_degenerate[:, None], centre_estimate, sum_ac / (3 * np.where(is_degenerate, 1, sum_a))[:, None])
+    face_areas      = np.where(is_degenerate[:, None], 0, 0.5 * sum_n)
+    return face_centres, face_areas
+
+def cell_centres_volumes(face_centres, face_areas, owner, neighbour, n_cells = None):
+    '''Cell centres and volumes, as primitiveMesh::makeCellCentresAndVols: each cell is split
+    into pyramids from its faces to the mean of its face centres, the centre is the volume
+    weighted mean of the pyramid centres. Sums per cell are np.bincount over the owner and
+    neighbour of each face.
+
+    Returns
+        cell_centres (np.ndarray)   : (n_cells, 3)
+        cell_volumes (np.ndarray)   : (n_cells,)
+    '''
+    if n_cells is None:
+        n_cells = int(max(owner.max(), neighbour.max() if len(neighbour) > 0 else -1)) + 1
+    n_internal  = len(neighbour)
+    # every face counts for its owner, internal faces also for their neighbour
+    cells       = np.concatenate([owner, neighbour]).astype(np.int64)
+    centres     = np.concatenate([face_centres, face_centres[:n_internal]])
+    n_cell_faces    = np.bincount(cells, minlength=n_cells)
+    centre_estimate = _bincount3(cells, centres, n_cells) / n_cell_faces[:, None]
+
+    # volume of each face pyramid times 3, positive with the area vector pointing out of the cell
+    sign        = np.concatenate([np.ones(len(owner)), -np.ones(n_internal)])
+    areas       = np.concatenate([face_areas, face_areas[:n_internal]])
+    pyr3_vol    = sign * np.einsum('ij,ij->i', areas, centres - centre_estimate[cells])
+    pyr_centres = 0.75 * centres + 0.25 * centre_estimate[cells]
+
+    volumes     = np.bincount(cells, weights=pyr3_vol, minlength=n_cells)
+    sum_vc      = _bincount3(cells, pyr3_vol[:, None] * pyr_centres, n_cells)
+    is_small    = np.abs(volumes) <= 1e-300
+    cell_centres = np.where(is_small[:, None], centre_estimate, sum_vc / np.where(is_small, 1, volumes)[:, None])
+    return cell_centres, volumes / 3
+
+def mesh_geometry(mesh):
+    '''Face centres and areas, cell centres and volumes of a mesh read by read_poly_mesh
+
+    Returns
+        geometry (dict) : face_centres, face_areas, cell_centres, cell_volumes
+    '''
+    face_centres, face_areas = face_centres_areas(mesh['points'], mesh['face_offsets'], mesh['face_vertices'])
+    cell_centres, cell_volumes = cell_centres_volumes(face_centres, face_areas, mesh['owner'], mesh['neighbour'])
+    return {'face_centres'  : face_centres,
+            'face_areas'    : face_areas,
+            'cell_centres'  : cell_centres,
+            'cell_volumes'  : cell_volumes, }
+
+def read_cell_geometry(case_path, is_cache = True, mmap_mode = 'r'):
+    '''Cell centres and volumes of the case mesh, constant/polyMesh, with an optional .npy
+    side cache in case_path/field_cache/polyMesh. The mesh is shared by every time folder,
+    so it is read and computed once per case and reused as long as the size and mtime of
+    the polyMesh files are unchanged (see read_internal_field in read_foam_field.py).
+
+    Args
+        case_path (str)     : case folder
+        is_cache (bool)     : use and update the side cache
+        mmap_mode (str)     : np.load mmap_mode of cached arrays, None to load into memory
+    Returns
+        geometry (dict) : cell_centres (n_cells, 3), cell_volumes (n_cells,)
+    '''
+    mesh_path   = os.path.join(case_path, 'constant', 'polyMesh')
+    cache_path  = os.path.join(case_path, 'field_cache', 'polyMesh')
+    names       = ['cell_centres', 'cell_volumes']
+    fn_meta     = os.path.join(cache_path, 'geometry.json')
+    if is_cache:
+        source = []
+        for name in MESH_FILES:
+            fn = _mesh_file(mesh_path, name)
+            source.append([os.path.relpath(fn, case_path), os.path.getsize(fn), os.path.getmtime(fn)])
+        try:
+            with open(fn_meta, 'r') as f:
+                if json.load(f) == source:
+                    return {name : np.load(os.path.join(cache_path, name + '.npy'), mmap_mode=mmap_mode) for name in names}
+        except (OSError, ValueError):
+            pass
+
+    geometry = mesh_geometry(read_poly_mesh(case_path))
+    geometry = {name : geometry[name] for name in names}
+    if is_cache:
+        os.makedirs(cache_path, exist_ok=True)
+        for name in names:
+            np.save(os.path.join(cache_path, name + '.npy'), geometry[name])
+        with open(fn_meta, 'w') as f:
+            json.dump(source, f)
+    return geometry
+
+if __name__ == '__main__':
+    t0 = time.perf_counter()
+    geometry = read_cell_geometry(sys.argv[1])
+    print('{:d} cells, total volume {:.6g}, centres within {} - {}, {:.2f} s'.format(
+            len(geometry['cell_volumes']), np.sum(geometry['cell_volumes']),
+            np.min(geometry['cell_centres'], axis=0), np.max(geometry['cell_centres'], axis=0),
+            time.perf_counter() - t0))
@@ -0,0 +1,162 @@
+import os
+import re
+import sys
+import glob
+import json
+import numpy as np
+
+# file names written per function object, newest OpenFOAM versions first
+FUNCTION_OBJECT_FILES = {   'forceCoeffs'   : ['coefficient', 'forceCoeffs'],
+                            'forces'        : ['force', 'forces'], }
+
+# column names of the older forces.dat, written as ((pressure) (viscous) (porous)) per force and moment
+FORCES_DAT_COLUMNS = ['{}_{}_{}'.format(kind, part, axis) for kind in ['force', 'moment']
+                      for part in ['pressure', 'viscous', 'porous'] for axis in 'xyz']
+
+def read_dat(fn_dat):
+    '''Read a function object .dat file: a '#' commented header, the last header line holding
+    the column names, then whitespace separated rows. Parentheses of vector entries are
+    ignored and a partially written last line is dropped.
+
+    Returns
+        names (list of str)     : column names, the first is Time
+        values (np.ndarray)     : (n_rows, n_columns)
+    '''
+    with open(fn_dat, 'rb') as f:
+        data = f.read()
+
+    # header lines only at the top of the file
+    header = re.match(rb'(?:#[^\n]*\n)*', data).group(0)
+    body   = data[len(header):]
+    if not body.endswith(b'\n'):
+        body = body[:body.rfind(b'\n')+1]
+
+    header_lines = header.decode('utf-8', 'replace').splitlines()
+    names = header_lines[-1].lstrip('#').split() if len(header_lines) > 0 else []
+
+    # number of values per row from the first row
+    first_row = body[:body.find(b'\n')].translate(None, b'()')
+    n_columns = len(first_row.split())
+    if n_columns == 0:
+        return names, np.zeros((0, len(names)))
+    values = np.fromstring(body.translate(None, b'()').decode('ascii'), sep=' ')
+    values = values[:(len(values) // n_columns) * n_columns].reshape(-1, n_columns)
+
+    if len(names) != n_columns:
+        if n_columns == len(FORCES_DAT_COLUMNS) + 1:
+            names = ['Time'] + FORCES_DAT_COLUMNS
+        else:
+            names = ['Time'] + ['c{:d}'.format(ii) for ii in range(1, n_columns)]
+    return names, values
+
+def find_segments(case_path, object_name = 'forceCoeffs', file_name = None):
+    '''All .dat files of a function object, one per run segment, in restart order.
+
+    A run started at time t writes postProcessing/<object_name>/<t>/<file_name>.dat, or
+    <file_name>_<t>.dat if that file exists already (restart from the same time).
+
+    Returns
+        file_name (str)         : file name found, without extension
+        fn_dats (list of str)   : segment files
+    '''
+    object_path = os.path.join(case_path, 'postProcessing', object_name)
+    file_names  = FUNCTION_OBJECT_FILES.get(object_name, [object_name]) if file_name is None else [file_name]
+    for name in file_names:
+        fn_dats = glob.glob(os.path.join(object_path, '*', '{}.dat'.format(name)))
+        fn_dats += glob.glob(os.path.join(object_path, '*', '{}_*.dat'.format(name)))
+        if len(fn_dats) > 0:
+            break
+    file_name = name
+
+    def segment_order(fn_dat):
+        start_time = os.path.basename(os.path.dirname(fn_dat))
+        try:
+            start_time = float(start_time)
+        except ValueError:
+            start_time = np.inf
+        return (start_time, os.path.getmtime(fn_dat))
+    return file_name, sorted(fn_dats, key=segment_order)
+
+def stitch_segments(fn_dats):
+    '''Concatenate the rows of several segments into one structured array sorted by time.
+    Where segments overlap (a restart from an earlier written time) the rows of the earlier
+    segment from the restart time on are dropped.'''
+
+    names, segments = None, []
+    for fn_dat in fn_dats:
+        names_seg, values = read_dat(fn_dat)
+        if names is None:
+            names = names_seg
+        elif names_seg != names:
+            raise ValueError('columns of {} differ from the first segment'.format(fn_dat))
+        segments.append(values)
+    if names is None:
+        raise FileNotFoundError('no function object .dat files given')
+
+    # a segment replaces everything from its first time on
+    values = np.zeros((0, len(names)))
+    for segment in segments:
+        if len(segment) > 0:
+            values = np.concatenate([values[values[:,0] < segment[0,0]], segment], axis=0)
+    # duplicate times, keep the last occurrence, in time order
+    _, i_last = np.unique(values[::-1, 0], return_index=True)
+    values = values[len(values) - 1 - i_last]
+
+    dtype = np.dtype([(name, 'f8') for name in names])
+    return np.ascontiguousarray(values).view(dtype).reshape(-1)
+
+def read_function_object(   case_path,
+                            object_name = 'forceCoeffs',
+                            file_name   = None,
+                            is_cache    = True,
+                            mmap_mode   = 'r' ):
+    '''History of a forces/forceCoeffs function object of a case, stitched over restarts.
+
+    With is_cache the stitched array is saved as postProcessing/<object_name>/<file_name>.npy
+    and loaded (memory-mapped with mmap_mode) as long as the source files are unchanged.
+
+    Args
+        case_path (str)     : case folder
+        object_name (str)   : function object name in controlDict, e.g. 'forceCoeffs' or 'forces'
+        file_name (str)     : .dat file name without extension, defaults to the name written
+                              by the object type (see FUNCTION_OBJECT_FILES)
+        is_cache (bool)     : use and update the .npy cache
+        mmap_mode (str)     : np.load mmap_mode of a cached array, None to load into memory
+    Returns
+        history (np.ndarray) : structured array, one row per time, fields as in the .dat header
+                               e.g. Time, Cd, Cl, ...
+    '''
+    file_name, fn_dats = find_segments(case_path, object_name, file_name)
+    if len(fn_dats) == 0:
+        raise FileNotFoundError('no {} output in {}'.format(object_name, os.path.join(case_path, 'postProcessing')))
+    if not is_cache:
+        return stitch_segments(fn_dats)
+
+    fn_cache    = os.path.join(case_path, 'postProcessing', object_name, '{}.npy'.format(file_name))
+    fn_meta     = fn_cache + '.json'
+    sources     = [[os.path.relpath(fn, case_path), os.path.getsize(fn), os.path.getmtime(fn)] for fn in fn_dats]
+    try:
+        with open(fn_meta, 'r') as f:
+            if json.load(f) == sources:
+                return np.load(fn_cache, mmap_mode=mmap_mode)
+    except (OSError, ValueError):
+        pass
+
+    history = stitch_segments(fn_dats)
+    np.save(fn_cache, history)
+    with open(fn_meta, 'w') as f:
+        json.dump(sources, f)
+    return history
+
+def read_force_coeffs(slant_angle, object_name = 'forceCoeffs', **read_kwargs):
+    '''read_function_object for the case $AHMED_SLANT_PATH/slant_angle_<angle>'''
+
+    case_path = os.path.join(os.environ['AHMED_SLANT_PATH'], 'slant_angle_{}'.format(slant_angle))
+    return read_function_object(case_path, object_name = object_name, **read_kwargs)
+
+if __name__ == '__main__':
+    slant_angle = sys.argv[1]
+    history = read_force_coeffs(slant_angle=slant_angle)
+    print('{:d} time steps, last time {:g}'.format(len(history), history['Time'][-1]))
+    for name in history.dtype.names[1:]:
+        print('{:>10s} {: .6e}'.format(name, history[name][-1]))
@@ -0,0 +1,274 @@
+import os
+import sys
+import json
+import glob
+import time
+import fcntl
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Workflow stages in order, see the README. Each command is a bash command formatted with
+# {angle}, {case_path} and {repo}. Inputs are files or folders (relative to case_path
+# unless they start with {repo}) whose content is hashed, together with the command and
+# the hashes of the stages listed in depends. Outputs must exist for a stage to count as done.
+PIPELINE_STAGES = [
+    {   'name'      : 'copy',
+        'command'   : 'bash {repo}/copy_case_setup.sh {angle}',
+        'inputs'    : ['{repo}/copy_case_setup.sh', '{repo}/case_setup'],
+        'depends'   : [],
+        'outputs'   : ['system/controlDict'], },
+    {   'name'      : 'geometry',
+        'command'   : 'python {repo}/generate_case_geometry.py {angle}',
+        # every repo module generate_case_geometry.py imports, directly or not
+        'inputs'    : ['{repo}/generate_case_geometry.py', '{repo}/stl_generator_slant_angle.py',
+                       '{repo}/stl_writer.py', '{repo}/output_sink.py', '{repo}/geometry_cache.py',
+                       '{repo}/merge_stl_patches.py', '{repo}/geometry_profiler.py'],
+        'depends'   : [],
+        'outputs'   : ['geometry/domain_merged.stl'], },
+    {   'name'      : 'merge',
+        'command'   : 'bash {repo}/modify_stl_patch_merge.sh {angle}',
+        'inputs'    : ['{repo}/modify_stl_patch_merge.sh', '{repo}/merge_stl_patches.py'],
+        'depends'   : ['geometry'],
+        'outputs'   : ['domain_merged.stl'], },
+    {   'name'      : 'mesh',
+        'command'   : 'bash {repo}/generate_case_mesh.sh {angle}',
+        'inputs'    : ['{repo}/generate_case_mesh.sh', 'system/meshDict', 'system/createPatchDict'],
+        'depends'   : ['merge'],
+        'outputs'   : ['constant/polyMesh/faces'], },
+    {   'name'      : 'decompose',
+        'command'   : 'bash {case_path}/slurm/run_decomp.sh',
+        'inputs'    : ['slurm/run_decomp.sh', 'system/decomposeParDict', '0'],
+        'depends'   : ['mesh'],
+        'outputs'   : ['processor0'], },
+    {   'name'      : 'potentialFoam',
+        'command'   : 'bash {case_path}/slurm/run_potentialFoam_parallel.sh',
+        'inputs'    : ['slurm/run_potentialFoam_parallel.sh', 'system/fvSolution', 'system/fvSchemes'],
+        'depends'   : ['decompose'],
+        'outputs'   : [], },
+    {   'name'      : 'simpleFoam',
+        'command'   : 'bash {case_path}/slurm/run_simpleFoam_parallel.sh',
+        'inputs'    : ['slurm/run_simpleFoam_parallel.sh', 'system/controlDict', 'system/fvSolution',
+                       'system/fvSchemes', 'constant/transportProperties', 'constant/turbulenceProperties'],
+        'depends'   : ['potentialFoam'],
+        'outputs'   : [], },
+    {   'name'      : 'postProcess',
+        # swap in controlDict.postProcess for the run only, so the simpleFoam inputs are unchanged
+        'command'   : 'cd {case_path}/system && mv controlDict controlDict.solve && cp controlDict.postProcess controlDict'
+                      ' && bash {case_path}/slurm/run_postProcess_parallel.sh; status=$?;'
+                      ' cd {case_path}/system && mv controlDict.solve controlDict; exit $status',
+        'inputs'    : ['slurm/run_postProcess_parallel.sh', 'system/controlDict.postProcess'],
+        'depends'   : ['simpleFoam'],
+        'outputs'   : [], },
+]
+
+STAGE_NAMES = [stage['name'] for stage in PIPELINE_STAGES]
+
+# simpleFoam log must match *solve.log for gather_cd.sh and gather_residuals.sh
+STAGE_LOGS = {'simpleFoam' : 'simpleFoam_solve.log'}
+
+class case_manifest():
+    def __init__(self, fn_manifest = None):
+        '''Per-case, per-stage status of the pipeline, stored as json. Every update is a
+        locked read-modify-write, so cases may run in parallel processes.
+
+        ARGS:
+            fn_manifest : manifest file, defaults to $AHMED_SLANT_PATH/pipeline_manifest.json
+        '''
+        if fn_manifest is None:
+            fn_manifest = os.path.join(os.environ['AHMED_SLANT_PATH'], 'pipeline_manifest.json')
+        self.fn_manifest = fn_manifest
+        self.fn_lock     = fn_manifest + '.lock'
+
+    def load(self):
+        try:
+            with open(self.fn_manifest, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, case_name, stage_name):
+        return self.load().get(case_name, {}).get(stage_name)
+
+    def update(self, case_name, stage_name, record):
+        '''Replace the record of one stage, writing to a temporary file then renaming'''
+
+        with open(self.fn_lock, 'w') as f_lock:
+            fcntl.flock(f_lock, fcntl.LOCK_EX)
+            manifest = self.load()
+            manifest.setdefault(case_name, {})[stage_name] = record
+            fn_tmp = '{}.tmp_{:d}'.format(self.fn_manifest, os.getpid())
+            with open(fn_tmp, 'w') as f:
+                json.dump(manifest, f, indent=1, sort_keys=True)
+            os.replace(fn_tmp, self.fn_manifest)
+
+def run_case_pipeline(  slant_angle_deg,
+                        stages          = None,
+                        commands        = None,
+                        is_force        = False,
+                        is_dry_run      = False,
+                        save_path_base  = None,
+                        repo_path       = None,
+                        fn_manifest     = None ):
+    '''Run the workflow stages for one slant angle, skipping stages already done with
+    unchanged inputs. Stops at the first failed stage.
+
+    Args
+        slant_angle_deg (float) : slant angle in degrees
+        stages (list of str)    : stages to consider, in pipeline order, defaults to all
+        commands (dict)         : stage name -> command template, replaces the default command
+                                  (e.g. local stubs in place of OpenFOAM/slurm tools)
+        is_force (bool)         : run the stages even if they are up to date
+        is_dry_run (bool)       : only report which stages would run
+        save_path_base (str)    : defaults to $AHMED_SLANT_PATH
+        repo_path (str)         : defaults to $AHMED_REPO_PUB, else the folder of this file
+        fn_manifest (str)       : defaults to save_path_base/pipeline_manifest.json
+    Returns
+        status (dict) : stage name -> 'skipped', 'done', 'failed' or 'pending' (dry run)
+    '''
+    if save_path_base is None:
+        save_path_base = os.environ['AHMED_SLANT_PATH']
+    if repo_path is None:
+        repo_path = os.environ.get('AHMED_REPO_PUB', os.path.dirname(os.path.abspath(__file__)))
+    if fn_manifest is None:
+        fn_manifest = os.path.join(save_path_base, 'pipeline_manifest.json')
+    if stages is None:
+        stages = STAGE_NAMES
+    if commands is None:
+        commands = {}
+
+    angle       = '{:1.2f}'.format(slant_angle_deg)
+    case_name   = 'slant_angle_{}'.format(angle)
+    case_path   = os.path.join(save_path_base, case_name)
+    fmt         = {'angle' : angle, 'case_path' : case_path, 'repo' : repo_path}
+    manifest    = case_manifest(fn_manifest)
+
+    env = dict(os.environ, AHMED_SLANT_PATH = save_path_base, AHMED_REPO_PUB = repo_path)
+
+    status = {}
+    hashes = {}
+    for stage in PIPELINE_STAGES:
+        name    = stage['name']
+        command = commands.get(name, stage['command']).format(**fmt)
+        hashes[name] = stage_input_hash(stage, command, fmt, hashes)
+        if name not in stages:
+            continue
+
+        record = manifest.get(case_name, name)
+        if (not is_force and record is not None and record['status'] == 'done'
+                and record['input_hash'] == hashes[name]
+                and all(os.path.exists(os.path.join(case_path, fn)) for fn in stage['outputs'])):
+            status[name] = 'skipped'
+            continue
+        if is_dry_run:
+            status[name] = 'pending'
+            continue
+
+        fn_log = os.path.join(case_path, STAGE_LOGS.get(name, '{}.log'.format(name)))
+        record = {  'status'        : 'running',
+                    'input_hash'    : hashes[name],
+                    'command'       : command,
+                    'log'           : fn_log,
+                    'started'       : time.strftime('%Y-%m-%d %H:%M:%S'), }
+        manifest.update(case_name, name, record)
+
+        t0 = time.perf_counter()
+        returncode = run_stage_command(command, fn_log, env)
+        record['wall_time']     = time.perf_counter() - t0
+        record['returncode']    = returncode
+        record['status']        = 'done' if returncode == 0 else 'failed'
+        # inputs inside the case may be written by this stage (e.g. copy), hash once finished
+        hashes[name] = record['input_hash'] = stage_input_hash(stage, command, fmt, hashes)
+        manifest.update(case_name, name, record)
+
+        status[name] = record['status']
+        print('{} {:>14s}: {:8s} {:10.2f} s'.format(case_name, name, record['status'], record['wall_time']), flush=True)
+        if returncode != 0:
+            break
+    return status
+
+def run_stage_command(command, fn_log, env):
+    '''Run command with bash, stdout and stderr to fn_log, returns the exit code'''
+
+    os.makedirs(os.path.dirname(fn_log), exist_ok=True)
+    with open(fn_log, 'w') as f_log:
+        return subprocess.run(command, shell=True, executable='/bin/bash', env=env,
+                              stdout=f_log, stderr=subprocess.STDOUT).returncode
+
+def stage_input_hash(stage, command, fmt, hashes):
+    '''sha256 of the stage command, the content of its input files and the hashes of the
+    stages it depends on, so changing any upstream input invalidates the stage'''
+
+    digest = hashlib.sha256(command.encode('utf-8'))
+    for name in stage['depends']:
+        digest.update(hashes[name].encode('ascii'))
+    for path in stage['inputs']:
+        path = path.format(**fmt)
+        if not os.path.isabs(path):
+            path = os.path.join(fmt['case_path'], path)
+        update_hash_path(digest, path)
+    return digest.hexdigest()
+
+def update_hash_path(digest, path, chunk_size = 1 << 20):
+    '''Add the relative names and content of path (a file, or all files below a folder) to digest'''
+
+    if os.path.isdir(path):
+        fns = sorted(fn for fn in glob.glob(os.path.join(path, '**'), recursive=True) if os.path.isfile(fn))
+    else:
+        fns = [path]
+    for fn in fns:
+        digest.update(os.path.relpath(fn, os.path.dirname(path)).encode('utf-8'))
+        try:
+            with open(fn, 'rb') as f:
+                for chunk in iter(lambda: f.read(chunk_size), b''):
+                    digest.update(chunk)
+        except OSError:
+            digest.update(b'<missing>')
+
+def run_pipeline_sweep(slant_angles, n_workers = 1, **pipeline_kwargs):
+    '''Run run_case_pipeline for many angles, n_workers cases at a time. Returns
+    {angle : status}, a case that raised is reported as {'error' : traceback}'''
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = {executor.submit(run_case_pipeline, angle, **pipeline_kwargs) : angle for angle in slant_angles}
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                results[futures[future]] = {'error' : repr(e)}
+    return {angle : results[angle] for angle in slant_angles}
+
+if __name__ == '__main__':
+    from sweep_case_geometry import parse_angles
+
+    parser = argparse.ArgumentParser(description='Run the case workflow for slant angles, resuming from the manifest')
+    parser.add_argument('angles', nargs='*', type=float, help='slant angles in degrees')
+    parser.add_argument('--range', nargs=3, type=float, metavar=('START', 'STOP', 'STEP'), dest='angle_range',
+                        help='slant angle range, stop inclusive')
+    parser.add_argument('--stages', nargs='+', choices=STAGE_NAMES, default=None, help='only consider these stages')
+    parser.add_argument('--commands', default=None,
+                        help='json file of stage name -> command template, e.g. local stubs for testing')
+    parser.add_argument('--workers', type=int, default=1, help='number of cases run at a time')
+    parser.add_argument('--force', action='store_true', help='run the stages even if they are up to date')
+    parser.add_argument('--dry-run', action='store_true', help='only print which stages would run')
+    args = parser.parse_args()
+
+    slant_angles = parse_angles(args.angles, args.angle_range)
+    if len(slant_angles) == 0:
+        parser.error('no slant angles given')
+    commands = None
+    if args.commands is not None:
+        with open(args.commands, 'r') as f:
+            commands = json.load(f)
+
+    results = run_pipeline_sweep(   slant_angles,
+                                    n_workers   = args.workers,
+                                    stages      = args.stages,
+                                    commands    = commands,
+                                    is_force    = args.force,
+                                    is_dry_run  = args.dry_run )
+    for angle, status in results.items():
+        print('slant_angle {:6.2f}: {}'.format(angle, ' '.join('{}={}'.format(*item) for item in status.items())))
+    sys.exit(int(any('failed' in status.values() or 'error' in status for status in results.values())))
@@ -1,484 +1,271 @@
 import os
 import gmsh
+import functools
+import contextlib
 import numpy as np
 
-class ahmed_stl_generator_v3_sym():
-    def __init__(self,  is_freestream                   = False,
-                        slant_angle_deg                 = 5,
-                        gmsh_body_mesh_size             = 5,
-                        gmsh_legs_mesh_size             = 5,
-                        gmsh_domain_mesh_size           = None,
-                        domain_multiplier_width         = 20,
-                        domain_multiplier_height        = 20,
-                        domain_multiplier_after_body    = 25,
-                        domain_multiplier_before_body   = 25,
-                        save_path_base                  = None ):
-
-        '''Generator for freestream ahmed body, additional stl mesh-fineness 
-        controls added for body, front of body, and domain separately.
-
-        All dimensions in millimeters
-
-        ARGS:
-            is_freestream           : if True, move body away from ground plane using domain_multiplier_height
-            slant_angle_deg         : slant angle in degrees
-            gmsh_body_mesh_size     : mesh fineness on body
-            gmsh_legs_mesh_size     : mesh fineness on legs
-            gmsh_domain_mesh_size   : mesh fineness for domain
-            domain_multiplier_width : control domain extent on sides of body
-            domain_multiplier_height: control domain extent above, and below if is_freestream = True
-            domain_multiplier_after_body    : control domain extent in wake behind body
-            domain_multiplier_before_body   : control domain extent in front of body
-            save_path_base          : path to directory for saving individual component .stl files 
-        '''
-
-        #if freestream, set leg height to 0 so body bottom of body lies on z=0
-        if is_freestream:
-            self.body_dims          = get_body_dims_mm( slant_angle_deg = slant_angle_deg,
-                                                        h_legs      = 0)
-        else:
-            self.body_dims          = get_body_dims_mm( slant_angle_deg = slant_angle_deg,)
-        self.is_freestream          = is_freestream
-        self.slant_angle_deg        = slant_angle_deg
-
-        self.gmsh_mesh_size         = gmsh_body_mesh_size   #remove once depricated
-
-        self.gmsh_body_mesh_size    = gmsh_body_mesh_size
-        self.gmsh_legs_mesh_size    = gmsh_legs_mesh_size
-        self.gmsh_domain_mesh_size  = gmsh_domain_mesh_size
-        self.domain_multiplier_before_body = domain_multiplier_before_body
-        self.domain_multiplier_after_body  = domain_multiplier_after_body
-        self.domain_multiplier_height   = domain_multiplier_height
-        self.domain_multiplier_width    = domain_multiplier_width
-
-        self.inlet_x    = -1* (self.body_dims['l_overall'] * (1+domain_multiplier_before_body))
-        self.outlet_x   = self.body_dims['l_overall']* domain_multiplier_after_body
-        if self.is_freestream:
-            self.bottom_z   = -1 * self.body_dims['h_overall'] * domain_multiplier_height
-        else:
-            self.bottom_z   = 0
-        self.top_z      = self.body_dims['h_overall'] * domain_multiplier_height
-        self.symmetry_y = 0
-        self.side_y     = -0.5 * self.body_dims['w_overall'] * domain_multiplier_width
-
-        if save_path_base is None:
-            save_path_base = os.environ['AHMED_SLANT_PATH']
-
-        case_path = os.path.join(save_path_base, 'slant_angle_{:1.2f}'.format(slant_angle_deg))
-        save_path   = os.path.join(case_path, 'geometry')
-        if not os.path.exists(case_path):
-            os.mkdir(case_path)
-        if not os.path.exists(save_path):
-            os.mkdir(save_path)
-        self.save_path = save_path
-
-    def generate_domain(self):
-        '''Generate and save all domain .stl files'''
+from output_sink import directory_sink
 
-        self.generate_inlet()
-        self.generate_outlet()
-        self.generate_bottom()
-        self.generate_top()
-        self.generate_symmetry_plane()
-        self.generate_side()
+class gmsh_session_base():
+    '''Shared gmsh start-up/tear-down for the stl generators.
 
-    def generate_side(self,):
-        '''Generate side wall .stl with domain mesh size'''
-
-        gmsh.initialize()
-        gmsh.clear()
-        gmsh.option.setString("Geometry.OCCTargetUnit", "M")
-
-        ### make corner points
-        # inlet lower
-        p0      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.bottom_z )
-
-        # outlet lower
-        p1      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.bottom_z )
-
-        # outlet upper
-        p2      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.top_z )
-
-        # inlet upper
-        p3      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.top_z, )
-
-        ### make lines
-        line_p01 = gmsh.model.occ.add_line(p0, p1)
-        line_p12 = gmsh.model.occ.add_line(p1, p2)
-        line_p23 = gmsh.model.occ.add_line(p2, p3)
-        line_p30 = gmsh.model.occ.add_line(p3, p0)
-
-        ### make curve loop and plane
-        loop  = gmsh.model.occ.add_curve_loop([line_p01, line_p12, line_p23, line_p30])
-        plane = gmsh.model.occ.add_plane_surface([loop])
-
-        #get all points, set mesh size
-        if self.gmsh_domain_mesh_size is not None:
-            points = gmsh.model.occ.getEntities(0)
-            gmsh.model.occ.mesh.setSize(points, self.gmsh_domain_mesh_size)
-
-        gmsh.model.occ.synchronize()
-        gmsh.model.mesh.generate(2)
-
-        fn_mesh = os.path.join(self.save_path, 'slipWallSide.stl')
-        gmsh.write(fn_mesh)
-        gmsh.finalize()
-
-    def generate_symmetry_plane(self,):
-        '''Generate symmetry plane .stl with domain mesh size'''
-
-        gmsh.initialize()
-        gmsh.clear()
-        gmsh.option.setString("Geometry.OCCTargetUnit", "M")
-
-        ### make corner points
-        # inlet lower
-        p0      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = self.symmetry_y, 
-                                            z   = self.bottom_z )
-
-        # outlet lower
-        p1      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = self.symmetry_y, 
-                                            z   = self.bottom_z,  )
-
-        # outlet upper
-        p2      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = self.symmetry_y, 
-                                            z   = self.top_z,  )
-
-        # inlet upper
-        p3      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = self.symmetry_y, 
-                                            z   = self.top_z, )
-
-        ### make lines
-        line_p01 = gmsh.model.occ.add_line(p0, p1)
-        line_p12 = gmsh.model.occ.add_line(p1, p2)
-        line_p23 = gmsh.model.occ.add_line(p2, p3)
-        line_p30 = gmsh.model.occ.add_line(p3, p0)
-
-        ### make curve loop and plane
-        loop  = gmsh.model.occ.add_curve_loop([line_p01, line_p12, line_p23, line_p30])
-        plane = gmsh.model.occ.add_plane_surface([loop])
-
-        #get all points, set mesh size
-        if self.gmsh_domain_mesh_size is not None:
-            points = gmsh.model.occ.getEntities(0)
-            gmsh.model.occ.mesh.setSize(points, self.gmsh_domain_mesh_size)
-
-        gmsh.model.occ.synchronize()
-        gmsh.model.mesh.generate(2)
+    Used directly, every generate_* method initializes and finalizes gmsh itself.
+    Used as a context manager, gmsh is initialized once on entry and each component
+    is built as a separate named model inside that session, which is removed once
+    the component has been written:
 
-        fn_mesh = os.path.join(self.save_path, 'symmetryMesh.stl')
-        gmsh.write(fn_mesh)
-        gmsh.finalize()
+        with ahmed_stl_generator_v3_sym(slant_angle_deg=25) as generator:
+            generator.generate_body(is_surface_patches=True)
+            generator.generate_domain()
+    '''
 
-    def generate_top(self):
-        '''Generate top wall .stl with domain mesh size'''
+    is_session = False
+    # with False, patches are only kept in self.patches and not written to the sink
+    is_write_patches = True
+    profiler    = None
+    _component  = None
 
+    def __enter__(self):
         gmsh.initialize()
-        gmsh.clear()
         gmsh.option.setString("Geometry.OCCTargetUnit", "M")
+        self.is_session = True
+        return self
 
-        ### make corner points
-        # inlet inner corner
-        p0      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = self.symmetry_y, 
-                                            z   = self.top_z )
-
-        # inlet outer corner
-        p1      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.top_z,  )
-
-        # outlet outer corner
-        p2      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.top_z,  )
-
-        # outlet inner corner
-        p3      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = self.symmetry_y, 
-                                            z   = self.top_z, )
-
-        ### make lines
-        line_p01 = gmsh.model.occ.add_line(p0, p1)
-        line_p12 = gmsh.model.occ.add_line(p1, p2)
-        line_p23 = gmsh.model.occ.add_line(p2, p3)
-        line_p30 = gmsh.model.occ.add_line(p3, p0)
-
-        ### make curve loop and plane
-        loop  = gmsh.model.occ.add_curve_loop([line_p01, line_p12, line_p23, line_p30])
-        plane = gmsh.model.occ.add_plane_surface([loop])
-
-        #get all points, set mesh size
-        if self.gmsh_domain_mesh_size is not None:
-            points = gmsh.model.occ.getEntities(0)
-            gmsh.model.occ.mesh.setSize(points, self.gmsh_domain_mesh_size)
-
-        gmsh.model.occ.synchronize()
-        gmsh.model.mesh.generate(2)
-
-        fn_mesh = os.path.join(self.save_path, 'slipWallTop.stl')
-        gmsh.write(fn_mesh)
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.is_session = False
         gmsh.finalize()
+        return False
 
-    def generate_bottom(self):
-        '''Generate bottom wall .stl with domain mesh size'''
+    def _gmsh_begin(self, model_name):
+        '''Start a new model for a single component, initializing gmsh first if
+        not inside a session'''
 
-        gmsh.initialize()
-        gmsh.clear()
-        gmsh.option.setString("Geometry.OCCTargetUnit", "M")
-
-        ### make corner points
-        # inlet inner corner
-        p0      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = self.symmetry_y, 
-                                            z   = self.bottom_z )
-
-        # inlet outer corner
-        p1      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.bottom_z,  )
-
-        # outlet outer corner
-        p2      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.bottom_z,  )
-
-        # outlet inner corner
-        p3      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = self.symmetry_y, 
-                                            z   = self.bottom_z, )
-
-        ### make lines
-        line_p01 = gmsh.model.occ.add_line(p0, p1)
-        line_p12 = gmsh.model.occ.add_line(p1, p2)
-        line_p23 = gmsh.model.occ.add_line(p2, p3)
-        line_p30 = gmsh.model.occ.add_line(p3, p0)
-
-        ### make curve loop and plane
-        loop  = gmsh.model.occ.add_curve_loop([line_p01, line_p12, line_p23, line_p30])
-        plane = gmsh.model.occ.add_plane_surface([loop])
-
-        #get all points, set mesh size
-        if self.gmsh_domain_mesh_size is not None:
-            points = gmsh.model.occ.getEntities(0)
-            gmsh.model.occ.mesh.setSize(points, self.gmsh_domain_mesh_size)
+        self._component = model_name
+        if not self.is_session:
+            gmsh.initialize()
+            gmsh.clear()
+            gmsh.option.setString("Geometry.OCCTargetUnit", "M")
+        gmsh.model.add(model_name)
 
-        gmsh.model.occ.synchronize()
-        gmsh.model.mesh.generate(2)
+    def _gmsh_end(self):
+        '''Discard the current component model, or finalize gmsh if not inside a session'''
 
-        if self.is_freestream:
-            fn_local = 'slipWallBottom.stl'
+        if self.is_session:
+            gmsh.model.remove()
         else:
-            fn_local = 'wallBottom.stl'
-        fn_mesh = os.path.join(self.save_path, fn_local)
-        gmsh.write(fn_mesh)
-        gmsh.finalize()
+            gmsh.finalize()
 
-    def generate_outlet(self):
-        '''Generate outlet .stl with domain mesh size'''
-
-        gmsh.initialize()
-        gmsh.clear()
-        gmsh.option.setString("Geometry.OCCTargetUnit", "M")
+    def _profile(self, phase, counts = None):
+        '''Context timing a phase of the current component with self.profiler (see
+        geometry_profiler.py), does nothing without a profiler'''
 
-        ### make points
-        # lower inner corner
-        p0      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = self.symmetry_y, 
-                                            z   = self.bottom_z )
-
-        # lower outer corner
-        p1      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.bottom_z,  )
-
-        # upper outer corner
-        p2      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.top_z,  )
-
-        # inner upper corner
-        p3      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = self.symmetry_y, 
-                                            z   = self.top_z, )
-
-        ### make lines
-        line_p01 = gmsh.model.occ.add_line(p0, p1)
-        line_p12 = gmsh.model.occ.add_line(p1, p2)
-        line_p23 = gmsh.model.occ.add_line(p2, p3)
-        line_p30 = gmsh.model.occ.add_line(p3, p0)
-
-        ### make curve loop and plane
-        loop_outlet  = gmsh.model.occ.add_curve_loop([line_p01, line_p12, line_p23, line_p30])
-        plane_outlet = gmsh.model.occ.add_plane_surface([loop_outlet])
-
-        #get all points, set mesh size
-        if self.gmsh_domain_mesh_size is not None:
-            points = gmsh.model.occ.getEntities(0)
-            gmsh.model.occ.mesh.setSize(points, self.gmsh_domain_mesh_size)
-
-        gmsh.model.occ.synchronize()
-        gmsh.model.mesh.generate(2)
-
-        fn_mesh = os.path.join(self.save_path, 'outletMesh.stl')
-        gmsh.write(fn_mesh)
-        gmsh.finalize()
-
-    def generate_inlet(self):
-        '''Generate inlet .stl with domain mesh size'''
-
-        gmsh.initialize()
-        gmsh.clear()
-        gmsh.option.setString("Geometry.OCCTargetUnit", "M")
-
-        ###make points
-        #inlet lower inner corner
-        p0      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = self.symmetry_y, 
-                                            z   = self.bottom_z )
-
-        #inlet lower outer corner
-        p1      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.bottom_z,  )
-
-        #inlet upper outer corner
-        p2      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.top_z,  )
-
-        #inlet inner upper corner
-        p3      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = self.symmetry_y, 
-                                            z   = self.top_z, )
-
-        ###make lines
-        line_p01 = gmsh.model.occ.add_line(p0, p1)
-        line_p12 = gmsh.model.occ.add_line(p1, p2)
-        line_p23 = gmsh.model.occ.add_line(p2, p3)
-        line_p30 = gmsh.model.occ.add_line(p3, p0)
-
-        ### make curve loop and plane
-        loop_inlet   = gmsh.model.occ.add_curve_loop([line_p01, line_p12, line_p23, line_p30])
-        plane_inlet  = gmsh.model.occ.add_plane_surface([loop_inlet])
-
-        #get all points, set mesh size
-        if self.gmsh_domain_mesh_size is not None:
-            points = gmsh.model.occ.getEntities(0)
-            gmsh.model.occ.mesh.setSize(points, self.gmsh_domain_mesh_size)
+        if self.profiler is None:
+            return contextlib.nullcontext({})
+        return self.profiler.stage(self._component, phase, counts = counts)
 
-        gmsh.model.occ.synchronize()
-        gmsh.model.mesh.generate(2)
-
-        fn_mesh = os.path.join(self.save_path, 'inletMesh.stl')
-        gmsh.write(fn_mesh)
-        gmsh.finalize()
-
-    def generate_legs(self):
-        '''Generate leg .stl with legs mesh size'''
-
-        gmsh.initialize()
-        gmsh.clear()
-        gmsh.option.setString("Geometry.OCCTargetUnit", "M")
-
-        ahm = self.body_dims
-        front_circle_neg = gmsh.model.occ.addCircle(    x   = -(ahm['l_overall'] - ahm['dl_legs_front']), 
-                                                    y   = -(0.5*ahm['w_overall'] - ahm['dw_legs_outer']), 
-                                                    z   = self.bottom_z,
-                                                    r   = ahm['r_legs'])
+    def _synchronize_and_mesh(self):
+        '''Synchronize the OCC model and generate the surface mesh, profiled'''
 
-        front_leg_neg    = gmsh.model.occ.extrude(   dimTags = [(1,front_circle_neg),], 
-                                                dx      = 0,
-                                                dy      = 0,
-                                                dz      = ahm['h_legs'] )
-
-        rear_circle_neg = gmsh.model.occ.addCircle( x   = -ahm['dl_legs_back'], 
-                                                y   = -(0.5*ahm['w_overall'] - ahm['dw_legs_outer']), 
-                                                z   = self.bottom_z,
-                                                r   = ahm['r_legs'])
-
-        rear_leg_neg    = gmsh.model.occ.extrude(   dimTags = [(1,rear_circle_neg),], 
-                                                dx      = 0,
-                                                dy      = 0,
-                                                dz      = ahm['h_legs'] )
-
-        # get all points, set mesh size
-        points = gmsh.model.occ.getEntities(0)
-        gmsh.model.occ.mesh.setSize(points, self.gmsh_legs_mesh_size)
+        with self._profile('synchronize'):
+            gmsh.model.occ.synchronize()
+        with self._profile('mesh', counts = get_mesh_counts):
+            gmsh.model.mesh.generate(2)
 
-        gmsh.model.occ.synchronize()
-        gmsh.model.mesh.generate(2)
-        fn_mesh = os.path.join( self.save_path, 'wallLegsMesh.stl')
-        gmsh.write(fn_mesh)
-        gmsh.finalize()
+    def _gmsh_write(self, fn_save):
+        '''gmsh.write of the current model, profiled'''
 
-    def generate_body(self):
+        with self._profile('write') as record:
+            gmsh.write(fn_save)
+            record['bytes'] = os.path.getsize(fn_save)
+
+    @property
+    def save_path_base(self):
+        return self.sink.save_path_base
+
+    @property
+    def save_path(self):
+        '''Geometry folder of this case, created on first access'''
+        return self.case_save_path(self.slant_angle_deg)
+
+    def case_save_path(self, slant_angle_deg):
+        '''Geometry folder of the case with slant_angle_deg under save_path_base, created
+        if it does not exist'''
+
+        return self.sink.geometry_path(slant_angle_deg)
+
+    def _write_patch(self, patch_name, surface_tag = -1, nodes = None):
+        '''Take the surface triangles of the current model and save them as patch_name'''
+
+        with self._profile('extract') as record:
+            points, triangles = get_surface_triangles(surface_tag, nodes = nodes)
+            record.update(patch = patch_name, n_triangles = len(triangles))
+        self._save_patch(patch_name, points, triangles)
+
+    def _save_patch(self, patch_name, points, triangles):
+        '''Keep the triangles under patch_name for write_merged_stl and write them to
+        <patch_name>.stl with the patch name as solid name'''
+
+        self.patches[patch_name] = (points, triangles)
+        if self.is_write_patches:
+            with self._profile('write') as record:
+                fn_save = self.sink.write_stl(self.slant_angle_deg, '{}.stl'.format(patch_name), [(patch_name, points, triangles)])
+                record.update(patch = patch_name, bytes = os.path.getsize(fn_save) if fn_save is not None else 0)
+
+    def _generate_plane(self, patch_name, is_analytic = False):
+        '''Generate a rectangular domain plane from its corners in domain_planes(), with the
+        domain mesh size. With is_analytic the structured triangulation is built in numpy
+        without starting OpenCASCADE (see rectangle_triangulation).'''
+
+        corners = self.domain_planes()[patch_name]
+        if is_analytic:
+            self._component = patch_name
+            with self._profile('mesh') as record:
+                points, triangles = rectangle_triangulation(corners, self.gmsh_domain_mesh_size)
+                record.update(n_nodes = len(points), n_triangles = len(triangles))
+            self._save_patch(patch_name, points, triangles)
+            return
+
+        self._gmsh_begin(patch_name)
+        try:
+            ### make corner points, lines, curve loop and plane
+            with self._profile('occ'):
+                p      = [gmsh.model.occ.add_point(x = corner[0], y = corner[1], z = corner[2]) for corner in corners]
+                lines  = [gmsh.model.occ.add_line(p[i], p[(i+1) % 4]) for i in range(4)]
+                loop   = gmsh.model.occ.add_curve_loop(lines)
+                plane  = gmsh.model.occ.add_plane_surface([loop])
+
+            #get all points, set mesh size
+            if self.gmsh_domain_mesh_size is not None:
+                points = gmsh.model.occ.getEntities(0)
+                gmsh.model.occ.mesh.setSize(points, self.gmsh_domain_mesh_size)
+
+            self._synchronize_and_mesh()
+
+            self._write_patch(patch_name)
+        finally:
+            self._gmsh_end()
+
+    def generate_body(self, is_surface_patches = False, is_write_msh = True, is_write_vtk = False):
         '''Generate ahmed body mesh components for single case, defined by parameters
-        in self.body_dims'''
+        in self.body_dims
 
+        Args
+            is_surface_patches (bool)   : take the wallAhmed_<i> patches straight from the meshed
+                                          model, as body_surface_stl_separate would from body_full.msh
+            is_write_msh (bool)         : write body_full.msh, needed by body_surface_stl_separate
+            is_write_vtk (bool)         : write body_full.vtk, for inspection only
+        '''
         ahm = self.body_dims
-        
-        gmsh.initialize()
-        gmsh.clear()
-        gmsh.option.setString("Geometry.OCCTargetUnit", "M")
 
-        # extrude the body
-        llc         = [0, -0.5*ahm['w_overall'], ahm['h_legs']]
-        rectangle   = gmsh.model.occ.add_rectangle( x    = llc[0],
-                                                    y   = llc[1],
-                                                    z   = llc[2],
-                                                    dx  = -ahm['l_overall'], 
-                                                    dy  = 0.5*ahm['w_overall'])
+        self._gmsh_begin('body')
+        try:
+            with self._profile('occ'):
+                body = self._add_body_extrusion(ahm)
+
+            # manually make wedge to cut slant
+            if self.slant_angle_deg != 0:
+                with self._profile('occ'):
+                    wedge = self._add_slant_wedge(ahm)
+                self._cut_body(body, wedge)
+
+            # round the front, top-down then side-inward
+            with self._profile('occ'):
+                front_cut_top = self._add_front_cut_top(ahm)
+            self._cut_body(body, front_cut_top)
+            with self._profile('occ'):
+                front_cut_side = self._add_front_cut_side(ahm)
+            self._cut_body(body, front_cut_side)
+
+            # get all points, set mesh size
+            points = gmsh.model.occ.getEntities(0)
+            gmsh.model.occ.mesh.setSize(points, self.gmsh_mesh_size)
+
+            self._synchronize_and_mesh()
+            if is_write_vtk:
+                self._gmsh_write(os.path.join( self.save_path, 'body_full.vtk'))
+            if is_write_msh:
+                self._gmsh_write(os.path.join( self.save_path, 'body_full.msh'))
+            if is_surface_patches:
+                self._write_body_surfaces()
+        finally:
+            self._gmsh_end()
+
+    def generate_bodies(self, slant_angles):
+        '''Generate the body surfaces for many slant angles in one OCC model.
+
+        The extruded block and the two front-rounding cuts do not depend on the slant
+        angle, so they are built once. Each angle copies that shared shape and only cuts
+        its slant wedge, then the copy alone is meshed and written as wallAhmed_<i>.stl
+        to the geometry folder of that angle (see case_save_path). All other dimensions,
+        mesh sizes and save_path_base are taken from this generator.
+
+        Args
+            slant_angles (list of float) : slant angles in degrees
+        Returns
+            bodies (dict) : {angle : {patch_name : (points, triangles)}}
+        '''
+        ahm = self.body_dims
 
-        body        = gmsh.model.occ.extrude(   dimTags = [(2,rectangle),], 
-                                                dx      = 0,
-                                                dy      = 0,
-                                                dz      = ahm['dh_body'] )
+        self._gmsh_begin('bodies')
+        try:
+            gmsh.option.setNumber('Mesh.MeshOnlyVisible', 1)
+
+            base = self._add_body_extrusion(ahm)
+            self._cut_body(base, self._add_front_cut_top(ahm))
+            self._cut_body(base, self._add_front_cut_side(ahm))
+
+            bodies = {}
+            for angle in slant_angles:
+                body = gmsh.model.occ.copy([base])[0]
+                if angle != 0:
+                    ahm_angle = get_body_dims_mm(slant_angle_deg = angle, h_legs = ahm['h_legs'])
+                    with self._profile('occ'):
+                        wedge = self._add_slant_wedge(ahm_angle)
+                    self._cut_body(body, wedge)
+                with self._profile('synchronize'):
+                    gmsh.model.occ.synchronize()
+
+                points = gmsh.model.getBoundary([body], combined=False, recursive=True)
+                gmsh.model.mesh.setSize(points, self.gmsh_mesh_size)
+
+                # mesh only this body, not the shared shape or the other angles
+                gmsh.model.setVisibility(gmsh.model.getEntities(), 0, recursive=True)
+                gmsh.model.setVisibility([body], 1, recursive=True)
+                with self._profile('mesh', counts = get_mesh_counts):
+                    gmsh.model.mesh.generate(2)
+
+                nodes       = get_model_nodes()
+                surfaces    = sorted(gmsh.model.getBoundary([body], combined=False, oriented=False))
+                patches     = {}
+                for iSurf, surface in enumerate(surfaces):
+                    patch_name = 'wallAhmed_{:1.0f}'.format(iSurf)
+                    patches[patch_name] = get_surface_triangles(surface[1], nodes = nodes)
+                    self.sink.write_stl(angle, '{}.stl'.format(patch_name), [(patch_name,) + patches[patch_name]])
+                bodies[angle] = patches
+
+                gmsh.model.mesh.clear()
+                gmsh.model.occ.remove([body], recursive=True)
+        finally:
+            gmsh.option.setNumber('Mesh.MeshOnlyVisible', 0)
+            self._gmsh_end()
+        return bodies
+
+    def _cut_body(self, body, tool):
+        '''Boolean cut of tool from body, both volume dimTags, the body keeps its tag'''
+
+        with self._profile('cut'):
+            gmsh.model.occ.cut( objectDimTags   = [body],
+                                toolDimTags     = [tool],
+                                removeObject    = True,
+                                removeTool      = True      )
+
+    def _add_front_cut_top(self, ahm):
+        '''Make the volume rounding the front of the body seen from above, returns its
+        volume dimTag
+
+        write both halves of symmetry plane
+        place points 4 and 5 beyond end of body to avoid conincident lines'''
 
-        # manually make wedge to cut slant
-        if self.slant_angle_deg != 0:
-            w0  = gmsh.model.occ.add_point( x   = 0, 
-                                            y   = 0, 
-                                            z   = ahm['h_overall'],)
-            w1  = gmsh.model.occ.add_point( x   = 0, 
-                                            y   = 0, 
-                                            z   = ahm['h_overall']-ahm['dz_cut'],)
-
-            w2  = gmsh.model.occ.add_point( x   = -ahm['dx_cut'], 
-                                            y   = 0, 
-                                            z   = ahm['h_overall'],)
-
-            line_w01 = gmsh.model.occ.add_line(w0, w1)
-            line_w12 = gmsh.model.occ.add_line(w1, w2)
-            line_w20 = gmsh.model.occ.add_line(w2, w0)
-
-            loop_wedge  = gmsh.model.occ.add_curve_loop([line_w01, line_w12, line_w20])
-            plane_wedge = gmsh.model.occ.add_plane_surface([loop_wedge])
-            wedge_cut   = gmsh.model.occ.extrude(   dimTags     = [(2,plane_wedge)], 
-                                                    dx          = 0, 
-                                                    dy          = -0.5*ahm['w_overall'], 
-                                                    dz          = 0 )
-            
-            body_cut    = gmsh.model.occ.cut(   objectDimTags   = [body[1]],
-                                                toolDimTags     = [wedge_cut[1]],
-                                                removeObject    = True,
-                                                removeTool      = True      )
-
-        # ### front - top-down cut
-        # write both halves of symmetry plane
-        # place points 4 and 5 beyond end of body to avoid conincident lines 
         yc_circle = (0.5*ahm['w_overall']) - ahm['r_front']
         cen_yx1   = gmsh.model.occ.add_point(   x   = -(ahm['l_overall'] - ahm['r_front']), 
                                                 y   = -yc_circle, 
@@ -523,17 +310,15 @@ class ahmed_stl_generator_v3_sym():
                                                     dx          = 0, 
                                                     dy          = 0, 
                                                     dz          = -ahm['h_overall'] )
+        return volume_cut_top[1]
+
+    def _add_front_cut_side(self, ahm):
+        '''Make the volume rounding the front of the body seen from the side, returns its
+        volume dimTag
 
-        # cut 
-        body_cut_2    = gmsh.model.occ.cut( objectDimTags   = [body[1]],
-                                            toolDimTags     = [volume_cut_top[1]],
-                                            removeObject    = True,
-                                            removeTool      = True      )
+        draw sketch on -y face, extrude all the way through full body width
+        place points 4 and 5 beyond end of body to avoid conincident lines'''
 
- 
-        # ### front - side-inward cut
-        # draw sketch on -y face, extrude all the way through full body width
-        # place points 4 and 5 beyond end of body to avoid conincident lines
         zcen_1 = ahm['h_legs']+ ahm['r_front']
         zcen_2  = ahm['h_overall'] - ahm['r_front']
         y_c2 = -0.5*ahm['w_overall']
@@ -580,59 +365,73 @@ class ahmed_stl_generator_v3_sym():
                                                     dx          = 0, 
                                                     dy          = ahm['w_overall'], 
                                                     dz          = 0 )
-
-        body_cut_3    = gmsh.model.occ.cut(   objectDimTags   = [body[1]],
-                                            toolDimTags     = [volume_cut_side[1]],
-                                            removeObject    = True,
-                                            removeTool      = True      )
-
-        # get all points, set mesh size
-        points = gmsh.model.occ.getEntities(0)
-        gmsh.model.occ.mesh.setSize(points, self.gmsh_mesh_size)
-
-        gmsh.model.occ.synchronize()
-        gmsh.model.mesh.generate(2)
-        fn_vtk = os.path.join( self.save_path, 'body_full.vtk')
-        fn_msh = os.path.join( self.save_path, 'body_full.msh')
-        gmsh.write(fn_vtk)
-        gmsh.write(fn_msh)
-
-        gmsh.finalize()
+        return volume_cut_side[1]
 
     def body_surface_stl_separate(self):
+        '''Write each surface of body_full.msh to a separate wallAhmed_<i>.stl
 
-        gmsh.initialize()
-        gmsh.clear()
-        gmsh.option.setString("Geometry.OCCTargetUnit", "M")
-        fn_read = os.path.join(self.save_path, 'body_full.msh')
+        The mesh is read once, and the triangles of every surface are taken directly
+        from the loaded mesh rather than re-opening and re-meshing it per surface'''
 
-        gmsh.open(fn_read)
-        surfaces = gmsh.model.getEntities(2)
-
-        n_surf = len(surfaces)
-        for iSurf in np.arange(n_surf):
-            gmsh.clear()
-            gmsh.open(fn_read)
-            volumes = gmsh.model.getEntities(3)
-            n_volumes = len(volumes)
-            for iVol in np.arange(n_volumes):
-                gmsh.model.removeEntities( [volumes[iVol]], recursive=False)
+        self._gmsh_begin('body_surfaces')
+        try:
+            fn_read = os.path.join(self.save_path, 'body_full.msh')
+            with self._profile('read') as record:
+                gmsh.merge(fn_read)
+                record['bytes'] = os.path.getsize(fn_read)
+            self._write_body_surfaces()
+        finally:
+            self._gmsh_end()
 
-            for iRemove in np.arange(n_surf):
-                if iRemove != iSurf:
-                    gmsh.model.removeEntities( [surfaces[iRemove]], recursive=True)
+    def _write_body_surfaces(self):
+        '''Save every surface of the current (body) model as patch wallAhmed_<i>'''
 
-            gmsh.model.mesh.generate(2)
-
-            fn_save = os.path.join(self.save_path, 'wallAhmed_{:1.0f}.stl'.format(iSurf))
-            gmsh.write(fn_save)
-        gmsh.finalize()
+        nodes    = get_model_nodes()
+        surfaces = gmsh.model.getEntities(2)
+        for iSurf, surface in enumerate(surfaces):
+            self._write_patch('wallAhmed_{:1.0f}'.format(iSurf), surface_tag = surface[1], nodes = nodes)
+
+    def generate_surfaces(self, is_analytic_domain = False, is_legs = True, is_write_patches = False):
+        '''Build all surface patches of the case in memory: the body patches are taken straight
+        from the meshed model (no body_full.msh round trip), then the domain planes and legs.
+        Nothing is written unless is_write_patches, pass the result to write_merged_stl or
+        any other writer.
+
+        Args
+            is_analytic_domain (bool)   : triangulate the domain planes in numpy, see generate_domain
+            is_legs (bool)              : include the legs
+            is_write_patches (bool)     : also write each patch to <patch_name>.stl
+        Returns
+            patches (dict) : patch name -> (points (n_points, 3), triangles (n_triangles, 3))
+        '''
+        is_write_patches_saved, self.is_write_patches = self.is_write_patches, is_write_patches
+        try:
+            self.generate_body(is_surface_patches = True, is_write_msh = False)
+            self.generate_domain(is_analytic = is_analytic_domain)
+            if is_legs:
+                self.generate_legs()
+        finally:
+            self.is_write_patches = is_write_patches_saved
+        return self.patches
+
+    def write_merged_stl(self, is_binary = False):
+        '''Write all patches generated so far to geometry/domain_merged.stl, one named solid
+        per patch, and hard link (or reflink/copy) it to the case root for meshing.
+
+        Replaces modify_stl_patch_merge.sh, no renaming or concatenating of the component
+        .stl files is needed. Binary output keeps patches only as region indices, use ascii
+        when the patch names are needed by cfMesh.
+        '''
+        solids = [(name, *self.patches[name]) for name in sorted(self.patches.keys())]
+        return self.sink.write_stl( self.slant_angle_deg, 'domain_merged.stl', solids,
+                                    is_binary       = is_binary,
+                                    is_case_copy    = True)
 
 ########################################################################################################################
 
-class ahmed_stl_generator_v4_nonsym():
-    def __init__(self,  slant_angle_deg                 = 5,
-                        is_freestream                   = True,
+class ahmed_stl_generator_v3_sym(gmsh_session_base):
+    def __init__(self,  is_freestream                   = False,
+                        slant_angle_deg                 = 5,
                         gmsh_body_mesh_size             = 5,
                         gmsh_legs_mesh_size             = 5,
                         gmsh_domain_mesh_size           = None,
@@ -640,12 +439,14 @@ class ahmed_stl_generator_v4_nonsym():
                         domain_multiplier_height        = 20,
                         domain_multiplier_after_body    = 25,
                         domain_multiplier_before_body   = 25,
-                        save_path_base                  = None ):
+                        save_path_base                  = None,
+                        sink                            = None,
+                        profiler                        = None ):
 
-        '''Generator for non-symmetric ahmed body, free-stream or grounded.
-        Additional stl mesh-fineness controls added for body, front of body, and domain separately.
+        '''Generator for freestream ahmed body, additional stl mesh-fineness 
+        controls added for body, front of body, and domain separately.
 
-        Non-symmetric, freestream generator
+        All dimensions in millimeters
 
         ARGS:
             is_freestream           : if True, move body away from ground plane using domain_multiplier_height
@@ -657,8 +458,12 @@ class ahmed_stl_generator_v4_nonsym():
             domain_multiplier_height: control domain extent above, and below if is_freestream = True
             domain_multiplier_after_body    : control domain extent in wake behind body
             domain_multiplier_before_body   : control domain extent in front of body
-            save_path_base          : path to directory for saving individual component .stl files   
+            save_path_base          : path to directory for saving individual component .stl files 
+            sink                    : output_sink.directory_sink or memory_sink, replaces save_path_base
+            profiler                : optional geometry_profiler.stage_profiler, records every gmsh phase
         '''
+
+        #if freestream, set leg height to 0 so body bottom of body lies on z=0
         if is_freestream:
             self.body_dims          = get_body_dims_mm( slant_angle_deg = slant_angle_deg,
                                                         h_legs      = 0)
@@ -668,8 +473,9 @@ class ahmed_stl_generator_v4_nonsym():
         self.slant_angle_deg        = slant_angle_deg
 
         self.gmsh_mesh_size         = gmsh_body_mesh_size   #remove once depricated
+
         self.gmsh_body_mesh_size    = gmsh_body_mesh_size
-        self.legs_mesh_size         = gmsh_legs_mesh_size
+        self.gmsh_legs_mesh_size    = gmsh_legs_mesh_size
         self.gmsh_domain_mesh_size  = gmsh_domain_mesh_size
         self.domain_multiplier_before_body = domain_multiplier_before_body
         self.domain_multiplier_after_body  = domain_multiplier_after_body
@@ -678,339 +484,294 @@ class ahmed_stl_generator_v4_nonsym():
 
         self.inlet_x    = -1* (self.body_dims['l_overall'] * (1+domain_multiplier_before_body))
         self.outlet_x   = self.body_dims['l_overall']* domain_multiplier_after_body
-        self.bottom_z   = -1 * self.body_dims['h_overall'] * domain_multiplier_height
+        if self.is_freestream:
+            self.bottom_z   = -1 * self.body_dims['h_overall'] * domain_multiplier_height
+        else:
+            self.bottom_z   = 0
         self.top_z      = self.body_dims['h_overall'] * domain_multiplier_height
-        self.side_y     = self.body_dims['w_overall'] * domain_multiplier_width
+        self.symmetry_y = 0
+        self.side_y     = -0.5 * self.body_dims['w_overall'] * domain_multiplier_width
 
-        if save_path_base is None:
-            save_path_base = os.environ['AHMED_SLANT_PATH']
-
-        case_path = os.path.join(save_path_base, 'slant_angle_{:1.2f}'.format(slant_angle_deg))
-        save_path   = os.path.join(case_path, 'geometry')
-        if not os.path.exists(case_path):
-            os.mkdir(case_path)
-        if not os.path.exists(save_path):
-            os.mkdir(save_path)
-        self.save_path = save_path
-
-    def generate_domain(self):
-        self.generate_inlet()
-        self.generate_outlet()
-        self.generate_bottom()
-        self.generate_top()
-        self.generate_side_positive()
-        self.generate_side_negative()
-
-    def generate_side_positive(self,):
-        '''Generate side wall .stl with domain mesh size'''
-        gmsh.initialize()
-        gmsh.clear()
-        gmsh.option.setString("Geometry.OCCTargetUnit", "M")
+        # no folders are created until something is written
+        self.sink           = directory_sink(save_path_base) if sink is None else sink
+        self.profiler       = profiler
+        self.patches        = {}
 
-        ### make points
-        # inlet lower
-        p0      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.bottom_z )
-
-        # outlet lower
-        p1      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.bottom_z )
-
-        # outlet upper
-        p2      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.top_z )
-
-        # inlet upper
-        p3      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.top_z, )
-
-        ### make lines
-        line_p01 = gmsh.model.occ.add_line(p0, p1)
-        line_p12 = gmsh.model.occ.add_line(p1, p2)
-        line_p23 = gmsh.model.occ.add_line(p2, p3)
-        line_p30 = gmsh.model.occ.add_line(p3, p0)
-
-        ### make curve loop and plane
-        loop  = gmsh.model.occ.add_curve_loop([line_p01, line_p12, line_p23, line_p30])
-        plane = gmsh.model.occ.add_plane_surface([loop])
-
-        #get all points, set mesh size
-        if self.gmsh_domain_mesh_size is not None:
-            points = gmsh.model.occ.getEntities(0)
-            gmsh.model.occ.mesh.setSize(points, self.gmsh_domain_mesh_size)
+    def domain_planes(self):
+        '''Corner points (p0, p1, p2, p3) of each domain boundary plane, keyed by patch
+        name, in the order generated by generate_domain'''
 
-        gmsh.model.occ.synchronize()
-        gmsh.model.mesh.generate(2)
+        if self.is_freestream:
+            bottom_name = 'slipWallBottom'
+        else:
+            bottom_name = 'wallBottom'
 
-        fn_mesh = os.path.join(self.save_path, 'slipWallSidePos.stl')
-        gmsh.write(fn_mesh)
-        gmsh.finalize()
+        x0, x1  = self.inlet_x, self.outlet_x
+        y0, y1  = self.symmetry_y, self.side_y
+        z0, z1  = self.bottom_z, self.top_z
+        return {'inletMesh'     : [(x0, y0, z0), (x0, y1, z0), (x0, y1, z1), (x0, y0, z1)],
+                'outletMesh'    : [(x1, y0, z0), (x1, y1, z0), (x1, y1, z1), (x1, y0, z1)],
+                bottom_name     : [(x0, y0, z0), (x0, y1, z0), (x1, y1, z0), (x1, y0, z0)],
+                'slipWallTop'   : [(x0, y0, z1), (x0, y1, z1), (x1, y1, z1), (x1, y0, z1)],
+                'symmetryMesh'  : [(x0, y0, z0), (x1, y0, z0), (x1, y0, z1), (x0, y0, z1)],
+                'slipWallSide'  : [(x0, y1, z0), (x1, y1, z0), (x1, y1, z1), (x0, y1, z1)], }
 
-    def generate_side_negative(self,):
-        '''Generate side wall .stl with domain mesh size'''
-        gmsh.initialize()
-        gmsh.clear()
-        gmsh.option.setString("Geometry.OCCTargetUnit", "M")
+    def generate_domain(self, is_analytic = False):
+        '''Generate and save all domain .stl files
 
-        ### make points
-        # inlet lower
-        p0      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = -1*self.side_y, 
-                                            z   = self.bottom_z )
-
-        # outlet lower
-        p1      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = -1*self.side_y, 
-                                            z   = self.bottom_z )
-
-        # outlet upper
-        p2      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = -1*self.side_y, 
-                                            z   = self.top_z )
-
-        # inlet upper
-        p3      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = -1*self.side_y, 
-                                            z   = self.top_z, )
-
-        ### make lines
-        line_p01 = gmsh.model.occ.add_line(p0, p1)
-        line_p12 = gmsh.model.occ.add_line(p1, p2)
-        line_p23 = gmsh.model.occ.add_line(p2, p3)
-        line_p30 = gmsh.model.occ.add_line(p3, p0)
-
-        ### make curve loop and plane
-        loop  = gmsh.model.occ.add_curve_loop([line_p01, line_p12, line_p23, line_p30])
-        plane = gmsh.model.occ.add_plane_surface([loop])
-
-        #get all points, set mesh size
-        if self.gmsh_domain_mesh_size is not None:
-            points = gmsh.model.occ.getEntities(0)
-            gmsh.model.occ.mesh.setSize(points, self.gmsh_domain_mesh_size)
+        ARGS:
+            is_analytic : triangulate the planes directly in numpy instead of with gmsh
+        '''
+        for patch_name in self.domain_planes().keys():
+            self._generate_plane(patch_name, is_analytic = is_analytic)
 
-        gmsh.model.occ.synchronize()
-        gmsh.model.mesh.generate(2)
+    def generate_side(self, is_analytic = False):
+        '''Generate side wall .stl with domain mesh size'''
+        self._generate_plane('slipWallSide', is_analytic = is_analytic)
 
-        fn_mesh = os.path.join(self.save_path, 'slipWallSideNeg.stl')
-        gmsh.write(fn_mesh)
-        gmsh.finalize()
+    def generate_symmetry_plane(self, is_analytic = False):
+        '''Generate symmetry plane .stl with domain mesh size'''
+        self._generate_plane('symmetryMesh', is_analytic = is_analytic)
 
-    
-    def generate_top(self):
+    def generate_top(self, is_analytic = False):
         '''Generate top wall .stl with domain mesh size'''
+        self._generate_plane('slipWallTop', is_analytic = is_analytic)
 
-        gmsh.initialize()
-        gmsh.clear()
-        gmsh.option.setString("Geometry.OCCTargetUnit", "M")
+    def generate_bottom(self, is_analytic = False):
+        '''Generate bottom wall .stl with domain mesh size'''
+        if self.is_freestream:
+            self._generate_plane('slipWallBottom', is_analytic = is_analytic)
+        else:
+            self._generate_plane('wallBottom', is_analytic = is_analytic)
 
-        ### make points
-        # inlet negative corner
-        p0      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = -1*self.side_y, 
-                                            z   = self.top_z )
-
-        # inlet positive corner
-        p1      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.top_z,  )
-
-        # outlet positive corner
-        p2      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.top_z,  )
-
-        # outlet negative corner
-        p3      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = -1*self.side_y, 
-                                            z   = self.top_z, )
-
-        ### make lines
-        line_p01 = gmsh.model.occ.add_line(p0, p1)
-        line_p12 = gmsh.model.occ.add_line(p1, p2)
-        line_p23 = gmsh.model.occ.add_line(p2, p3)
-        line_p30 = gmsh.model.occ.add_line(p3, p0)
-
-        ### make curve loop and plane
-        loop  = gmsh.model.occ.add_curve_loop([line_p01, line_p12, line_p23, line_p30])
-        plane = gmsh.model.occ.add_plane_surface([loop])
-
-        #get all points, set mesh size
-        if self.gmsh_domain_mesh_size is not None:
+    def generate_outlet(self, is_analytic = False):
+        '''Generate outlet .stl with domain mesh size'''
+        self._generate_plane('outletMesh', is_analytic = is_analytic)
+
+    def generate_inlet(self, is_analytic = False):
+        '''Generate inlet .stl with domain mesh size'''
+        self._generate_plane('inletMesh', is_analytic = is_analytic)
+
+    def generate_legs(self):
+        '''Generate leg .stl with legs mesh size'''
+
+        self._gmsh_begin('legs')
+        try:
+            with self._profile('occ'):
+                self._add_legs(self.body_dims)
+
+            # get all points, set mesh size
             points = gmsh.model.occ.getEntities(0)
-            gmsh.model.occ.mesh.setSize(points, self.gmsh_domain_mesh_size)
+            gmsh.model.occ.mesh.setSize(points, self.gmsh_legs_mesh_size)
 
-        gmsh.model.occ.synchronize()
-        gmsh.model.mesh.generate(2)
+            self._synchronize_and_mesh()
+            self._write_patch('wallLegsMesh')
+        finally:
+            self._gmsh_end()
 
-        fn_mesh = os.path.join(self.save_path, 'slipWallTop.stl')
-        gmsh.write(fn_mesh)
-        gmsh.finalize()
+    def _add_legs(self, ahm):
+        '''Extruded leg cylinders, in the current model'''
 
-    def generate_bottom(self):
-        '''Generate bottom wall .stl with default mesh size'''
+        front_circle_neg = gmsh.model.occ.addCircle(    x   = -(ahm['l_overall'] - ahm['dl_legs_front']), 
+                                                    y   = -(0.5*ahm['w_overall'] - ahm['dw_legs_outer']), 
+                                                    z   = self.bottom_z,
+                                                    r   = ahm['r_legs'])
 
-        gmsh.initialize()
-        gmsh.clear()
-        gmsh.option.setString("Geometry.OCCTargetUnit", "M")
+        front_leg_neg    = gmsh.model.occ.extrude(   dimTags = [(1,front_circle_neg),], 
+                                                dx      = 0,
+                                                dy      = 0,
+                                                dz      = ahm['h_legs'] )
 
-        ### make points
-        # inlet negative corner
-        p0      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = -1*self.side_y, 
-                                            z   = self.bottom_z )
-
-        # inlet positive corner
-        p1      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.bottom_z,  )
-
-        # outlet positive corner
-        p2      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.bottom_z,  )
-
-        # outlet negative corner
-        p3      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = -1*self.side_y, 
-                                            z   = self.bottom_z, )
-
-        ### make lines
-        line_p01 = gmsh.model.occ.add_line(p0, p1)
-        line_p12 = gmsh.model.occ.add_line(p1, p2)
-        line_p23 = gmsh.model.occ.add_line(p2, p3)
-        line_p30 = gmsh.model.occ.add_line(p3, p0)
-
-        ### make curve loop and plane
-        loop  = gmsh.model.occ.add_curve_loop([line_p01, line_p12, line_p23, line_p30])
-        plane = gmsh.model.occ.add_plane_surface([loop])
-
-        #get all points, set mesh size
-        if self.gmsh_domain_mesh_size is not None:
-            points = gmsh.model.occ.getEntities(0)
-            gmsh.model.occ.mesh.setSize(points, self.gmsh_domain_mesh_size)
+        rear_circle_neg = gmsh.model.occ.addCircle( x   = -ahm['dl_legs_back'], 
+                                                y   = -(0.5*ahm['w_overall'] - ahm['dw_legs_outer']), 
+                                                z   = self.bottom_z,
+                                                r   = ahm['r_legs'])
+
+        rear_leg_neg    = gmsh.model.occ.extrude(   dimTags = [(1,rear_circle_neg),], 
+                                                dx      = 0,
+                                                dy      = 0,
+                                                dz      = ahm['h_legs'] )
+
+    def _add_body_extrusion(self, ahm):
+        '''Extrude the body block before any cuts, returns its volume dimTag'''
+
+        llc         = [0, -0.5*ahm['w_overall'], ahm['h_legs']]
+        rectangle   = gmsh.model.occ.add_rectangle( x    = llc[0],
+                                                    y   = llc[1],
+                                                    z   = llc[2],
+                                                    dx  = -ahm['l_overall'], 
+                                                    dy  = 0.5*ahm['w_overall'])
+
+        body        = gmsh.model.occ.extrude(   dimTags = [(2,rectangle),], 
+                                                dx      = 0,
+                                                dy      = 0,
+                                                dz      = ahm['dh_body'] )
+        return body[1]
+
+    def _add_slant_wedge(self, ahm):
+        '''Make the wedge cutting the slant, returns its volume dimTag'''
+
+        w0  = gmsh.model.occ.add_point( x   = 0, 
+                                        y   = 0, 
+                                        z   = ahm['h_overall'],)
+        w1  = gmsh.model.occ.add_point( x   = 0, 
+                                        y   = 0, 
+                                        z   = ahm['h_overall']-ahm['dz_cut'],)
+
+        w2  = gmsh.model.occ.add_point( x   = -ahm['dx_cut'], 
+                                        y   = 0, 
+                                        z   = ahm['h_overall'],)
+
+        line_w01 = gmsh.model.occ.add_line(w0, w1)
+        line_w12 = gmsh.model.occ.add_line(w1, w2)
+        line_w20 = gmsh.model.occ.add_line(w2, w0)
+
+        loop_wedge  = gmsh.model.occ.add_curve_loop([line_w01, line_w12, line_w20])
+        plane_wedge = gmsh.model.occ.add_plane_surface([loop_wedge])
+        wedge_cut   = gmsh.model.occ.extrude(   dimTags     = [(2,plane_wedge)], 
+                                                dx          = 0, 
+                                                dy          = -0.5*ahm['w_overall'], 
+                                                dz          = 0 )
+        return wedge_cut[1]
+
+########################################################################################################################
+
+class ahmed_stl_generator_v4_nonsym(gmsh_session_base):
+    def __init__(self,  slant_angle_deg                 = 5,
+                        is_freestream                   = True,
+                        gmsh_body_mesh_size             = 5,
+                        gmsh_legs_mesh_size             = 5,
+                        gmsh_domain_mesh_size           = None,
+                        domain_multiplier_width         = 20,
+                        domain_multiplier_height        = 20,
+                        domain_multiplier_after_body    = 25,
+                        domain_multiplier_before_body   = 25,
+                        save_path_base                  = None,
+                        sink                            = None,
+                        profiler                        = None ):
+
+        '''Generator for non-symmetric ahmed body, free-stream or grounded.
+        Additional stl mesh-fineness controls added for body, front of body, and domain separately.
+
+        Non-symmetric, freestream generator
+
+        ARGS:
+            is_freestream           : if True, move body away from ground plane using domain_multiplier_height
+            slant_angle_deg         : slant angle in degrees
+            gmsh_body_mesh_size     : mesh fineness on body
+            gmsh_legs_mesh_size     : mesh fineness on legs
+            gmsh_domain_mesh_size   : mesh fineness for domain
+            domain_multiplier_width : control domain extent on sides of body
+            domain_multiplier_height: control domain extent above, and below if is_freestream = True
+            domain_multiplier_after_body    : control domain extent in wake behind body
+            domain_multiplier_before_body   : control domain extent in front of body
+            save_path_base          : path to directory for saving individual component .stl files   
+            sink                    : output_sink.directory_sink or memory_sink, replaces save_path_base
+            profiler                : optional geometry_profiler.stage_profiler, records every gmsh phase
+        '''
+        if is_freestream:
+            self.body_dims          = get_body_dims_mm( slant_angle_deg = slant_angle_deg,
+                                                        h_legs      = 0)
+        else:
+            self.body_dims          = get_body_dims_mm( slant_angle_deg = slant_angle_deg,)
+        self.is_freestream          = is_freestream
+        self.slant_angle_deg        = slant_angle_deg
+
+        self.gmsh_mesh_size         = gmsh_body_mesh_size   #remove once depricated
+        self.gmsh_body_mesh_size    = gmsh_body_mesh_size
+        self.gmsh_legs_mesh_size    = gmsh_legs_mesh_size
+        self.gmsh_domain_mesh_size  = gmsh_domain_mesh_size
+        self.domain_multiplier_before_body = domain_multiplier_before_body
+        self.domain_multiplier_after_body  = domain_multiplier_after_body
+        self.domain_multiplier_height   = domain_multiplier_height
+        self.domain_multiplier_width    = domain_multiplier_width
+
+        self.inlet_x    = -1* (self.body_dims['l_overall'] * (1+domain_multiplier_before_body))
+        self.outlet_x   = self.body_dims['l_overall']* domain_multiplier_after_body
+        self.bottom_z   = -1 * self.body_dims['h_overall'] * domain_multiplier_height
+        self.top_z      = self.body_dims['h_overall'] * domain_multiplier_height
+        self.side_y     = self.body_dims['w_overall'] * domain_multiplier_width
+
+        # no folders are created until something is written
+        self.sink           = directory_sink(save_path_base) if sink is None else sink
+        self.profiler       = profiler
+        self.patches        = {}
 
-        gmsh.model.occ.synchronize()
-        gmsh.model.mesh.generate(2)
+    def domain_planes(self):
+        '''Corner points (p0, p1, p2, p3) of each domain boundary plane, keyed by patch
+        name, in the order generated by generate_domain'''
 
         if self.is_freestream:
-            fn_local = 'slipWallBottom.stl'
+            bottom_name = 'slipWallBottom'
         else:
-            fn_local = 'wallBottom.stl'
+            bottom_name = 'wallBottom'
 
-        fn_mesh = os.path.join(self.save_path, fn_local)
-        gmsh.write(fn_mesh)
-        gmsh.finalize()
+        x0, x1  = self.inlet_x, self.outlet_x
+        y0, y1  = -1*self.side_y, self.side_y
+        z0, z1  = self.bottom_z, self.top_z
+        return {'inletMesh'         : [(x0, y0, z0), (x0, y1, z0), (x0, y1, z1), (x0, y0, z1)],
+                'outletMesh'        : [(x1, y0, z0), (x1, y1, z0), (x1, y1, z1), (x1, y0, z1)],
+                bottom_name         : [(x0, y0, z0), (x0, y1, z0), (x1, y1, z0), (x1, y0, z0)],
+                'slipWallTop'       : [(x0, y0, z1), (x0, y1, z1), (x1, y1, z1), (x1, y0, z1)],
+                'slipWallSidePos'   : [(x0, y1, z0), (x1, y1, z0), (x1, y1, z1), (x0, y1, z1)],
+                'slipWallSideNeg'   : [(x0, y0, z0), (x1, y0, z0), (x1, y0, z1), (x0, y0, z1)], }
 
-    def generate_outlet(self):
-        '''Generate outlet .stl with domain mesh size'''
-        gmsh.initialize()
-        gmsh.clear()
-        gmsh.option.setString("Geometry.OCCTargetUnit", "M")
+    def generate_domain(self, is_analytic = False):
+        '''Generate and save all domain .stl files
 
-        ### make points
-        # lower negative corner
-        p0      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = -1*self.side_y, 
-                                            z   = self.bottom_z )
-
-        # lower positive corner
-        p1      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.bottom_z,  )
-
-        # upper positive corner
-        p2      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.top_z,  )
-
-        # upper negative corner
-        p3      = gmsh.model.occ.add_point( x   = self.outlet_x, 
-                                            y   = -1*self.side_y, 
-                                            z   = self.top_z, )
-
-        ### make lines
-        line_p01 = gmsh.model.occ.add_line(p0, p1)
-        line_p12 = gmsh.model.occ.add_line(p1, p2)
-        line_p23 = gmsh.model.occ.add_line(p2, p3)
-        line_p30 = gmsh.model.occ.add_line(p3, p0)
-
-        ### make curve loop and plane
-        loop_outlet  = gmsh.model.occ.add_curve_loop([line_p01, line_p12, line_p23, line_p30])
-        plane_outlet = gmsh.model.occ.add_plane_surface([loop_outlet])
-
-        #get all points, set mesh size
-        if self.gmsh_domain_mesh_size is not None:
-            points = gmsh.model.occ.getEntities(0)
-            gmsh.model.occ.mesh.setSize(points, self.gmsh_domain_mesh_size)
+        ARGS:
+            is_analytic : triangulate the planes directly in numpy instead of with gmsh
+        '''
+        for patch_name in self.domain_planes().keys():
+            self._generate_plane(patch_name, is_analytic = is_analytic)
 
-        gmsh.model.occ.synchronize()
-        gmsh.model.mesh.generate(2)
+    def generate_side_positive(self, is_analytic = False):
+        '''Generate side wall .stl with domain mesh size'''
+        self._generate_plane('slipWallSidePos', is_analytic = is_analytic)
 
-        fn_mesh = os.path.join(self.save_path, 'outletMesh.stl')
-        gmsh.write(fn_mesh)
-        gmsh.finalize()
+    def generate_side_negative(self, is_analytic = False):
+        '''Generate side wall .stl with domain mesh size'''
+        self._generate_plane('slipWallSideNeg', is_analytic = is_analytic)
 
-    def generate_inlet(self):
-        '''Generate inlet .stl with domain mesh size'''
-        gmsh.initialize()
-        gmsh.clear()
-        gmsh.option.setString("Geometry.OCCTargetUnit", "M")
+    def generate_top(self, is_analytic = False):
+        '''Generate top wall .stl with domain mesh size'''
+        self._generate_plane('slipWallTop', is_analytic = is_analytic)
 
-        ###make points
-        #inlet lower negative corner
-        p0      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = -1*self.side_y, 
-                                            z   = self.bottom_z )
-
-        #inlet lower positive corner
-        p1      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.bottom_z,  )
-
-        #inlet upper positive corner
-        p2      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = self.side_y, 
-                                            z   = self.top_z,  )
-
-        #inlet upper negative corner
-        p3      = gmsh.model.occ.add_point( x   = self.inlet_x, 
-                                            y   = -1*self.side_y, 
-                                            z   = self.top_z, )
-
-        ###make lines
-        line_p01 = gmsh.model.occ.add_line(p0, p1)
-        line_p12 = gmsh.model.occ.add_line(p1, p2)
-        line_p23 = gmsh.model.occ.add_line(p2, p3)
-        line_p30 = gmsh.model.occ.add_line(p3, p0)
-
-        ### make curve loop and plane
-        loop_inlet   = gmsh.model.occ.add_curve_loop([line_p01, line_p12, line_p23, line_p30])
-        plane_inlet  = gmsh.model.occ.add_plane_surface([loop_inlet])
-
-        #get all points, set mesh size
-        if self.gmsh_domain_mesh_size is not None:
-            points = gmsh.model.occ.getEntities(0)
-            gmsh.model.occ.mesh.setSize(points, self.gmsh_domain_mesh_size)
+    def generate_bottom(self, is_analytic = False):
+        '''Generate bottom wall .stl with domain mesh size'''
+        if self.is_freestream:
+            self._generate_plane('slipWallBottom', is_analytic = is_analytic)
+        else:
+            self._generate_plane('wallBottom', is_analytic = is_analytic)
 
-        gmsh.model.occ.synchronize()
-        gmsh.model.mesh.generate(2)
+    def generate_outlet(self, is_analytic = False):
+        '''Generate outlet .stl with domain mesh size'''
+        self._generate_plane('outletMesh', is_analytic = is_analytic)
 
-        fn_mesh = os.path.join(self.save_path, 'inletMesh.stl')
-        gmsh.write(fn_mesh)
-        gmsh.finalize()
+    def generate_inlet(self, is_analytic = False):
+        '''Generate inlet .stl with domain mesh size'''
+        self._generate_plane('inletMesh', is_analytic = is_analytic)
 
     def generate_legs(self):
         '''Generate leg .stl with body mesh size'''
 
-        gmsh.initialize()
-        gmsh.clear()
-        gmsh.option.setString("Geometry.OCCTargetUnit", "M")
+        self._gmsh_begin('legs')
+        try:
+            with self._profile('occ'):
+                self._add_legs(self.body_dims)
+
+            #get all points, set mesh size
+            points = gmsh.model.occ.getEntities(0)
+            gmsh.model.occ.mesh.setSize(points, self.gmsh_legs_mesh_size)
+
+            self._synchronize_and_mesh()
+            self._write_patch('wallLegsMesh')
+        finally:
+            self._gmsh_end()
+
+    def _add_legs(self, ahm):
+        '''Extruded leg cylinders, in the current model'''
 
-        ahm = self.body_dims
         front_circle_neg = gmsh.model.occ.addCircle(    x   = -(ahm['l_overall'] - ahm['dl_legs_front']), 
                                                     y   = -(0.5*ahm['w_overall'] - ahm['dw_legs_outer']), 
                                                     z   = self.bottom_z,
@@ -1052,27 +813,9 @@ class ahmed_stl_generator_v4_nonsym():
                                                 dy      = 0,
                                                 dz      = ahm['h_legs'] )
 
-        #get all points, set mesh size
-        points = gmsh.model.occ.getEntities(0)
-        gmsh.model.occ.mesh.setSize(points, self.gmsh_legs_mesh_size)
-
-        gmsh.model.occ.synchronize()
-        gmsh.model.mesh.generate(2)
-        fn_mesh = os.path.join( self.save_path, 'wallLegsMesh.stl')
-        gmsh.write(fn_mesh)
-        gmsh.finalize()
-
-    def generate_body(self):
-        '''Generate an ahmed body mesh components for single case, defined by parameters
-        in self.body_dims'''
-
-        ahm = self.body_dims
-        
-        gmsh.initialize()
-        gmsh.clear()
-        gmsh.option.setString("Geometry.OCCTargetUnit", "M")
+    def _add_body_extrusion(self, ahm):
+        '''Extrude the body block before any cuts, returns its volume dimTag'''
 
-        #extrude the body
         llc         = [0, -0.5*ahm['w_overall'], ahm['h_legs']]
         rectangle   = gmsh.model.occ.add_rectangle( x    = llc[0],
                                                     y   = llc[1],
@@ -1084,187 +827,33 @@ class ahmed_stl_generator_v4_nonsym():
                                                 dx      = 0,
                                                 dy      = 0,
                                                 dz      = ahm['dh_body'] )
-
-        #manually make wedge
-        if self.slant_angle_deg != 0:
-            w0  = gmsh.model.occ.add_point( x   = 0, 
-                                            y   = -0.5*ahm['w_overall'], 
-                                            z   = ahm['h_overall'],)
-            w1  = gmsh.model.occ.add_point( x   = 0, 
-                                            y   = -0.5*ahm['w_overall'], 
-                                            z   = ahm['h_overall']-ahm['dz_cut'],)
-
-            w2  = gmsh.model.occ.add_point( x   = -ahm['dx_cut'], 
-                                            y   = -0.5*ahm['w_overall'],
-                                            z   = ahm['h_overall'],)
-
-            line_w01 = gmsh.model.occ.add_line(w0, w1)
-            line_w12 = gmsh.model.occ.add_line(w1, w2)
-            line_w20 = gmsh.model.occ.add_line(w2, w0)
-
-            loop_wedge  = gmsh.model.occ.add_curve_loop([line_w01, line_w12, line_w20])
-            plane_wedge = gmsh.model.occ.add_plane_surface([loop_wedge])
-            wedge_cut   = gmsh.model.occ.extrude(   dimTags     = [(2,plane_wedge)], 
-                                                    dx          = 0, 
-                                                    dy          = ahm['w_overall'], 
-                                                    dz          = 0 )
-            
-            body_cut    = gmsh.model.occ.cut(   objectDimTags   = [body[1]],
-                                                toolDimTags     = [wedge_cut[1]],
-                                                removeObject    = True,
-                                                removeTool      = True      )
-
-        # ### front - top-down cut
-        # write both halves of symmetry plane
-        # place points 4 and 5 beyond end of body to avoid conincident lines 
-        yc_circle = (0.5*ahm['w_overall']) - ahm['r_front']
-        cen_yx1   = gmsh.model.occ.add_point(   x   = -(ahm['l_overall'] - ahm['r_front']), 
-                                                y   = -yc_circle, 
-                                                z   = ahm['h_overall'],  )
-        cen_yx2   = gmsh.model.occ.add_point(   x   = -(ahm['l_overall'] - ahm['r_front']), 
-                                                y   = yc_circle, 
-                                                z   = ahm['h_overall'], )
-
-        f0      = gmsh.model.occ.add_point( x   = -(ahm['l_overall'] - ahm['r_front']), 
-                                            y   = -0.5*ahm['w_overall'], 
-                                            z   = ahm['h_overall'], )
-        f1      = gmsh.model.occ.add_point( x   = -ahm['l_overall'], 
-                                            y   = -yc_circle, 
-                                            z   = ahm['h_overall'],  )
-
-        f2      = gmsh.model.occ.add_point( x   = -ahm['l_overall'], 
-                                            y   = yc_circle, 
-                                            z   = ahm['h_overall'],  )
-        f3      = gmsh.model.occ.add_point( x   = -(ahm['l_overall'] - ahm['r_front']), 
-                                            y   = 0.5*ahm['w_overall'], 
-                                            z   = ahm['h_overall'], )
-        f4      = gmsh.model.occ.add_point( x   = -(ahm['l_overall']+1), 
-                                            y   = 0.5*ahm['w_overall'],
-                                            z   = ahm['h_overall'],  )
-        f5      = gmsh.model.occ.add_point( x   = -(ahm['l_overall']+1), 
-                                            y   = -0.5*ahm['w_overall'], 
-                                            z   = ahm['h_overall'],  )
-
-        # #start from f0, create line segments
-        line_f01 = gmsh.model.occ.add_circle_arc(f0, cen_yx1, f1)
-        line_f12 = gmsh.model.occ.add_line(f1, f2)
-        line_f23 = gmsh.model.occ.add_circle_arc(f2, cen_yx2, f3)
-        line_f34 = gmsh.model.occ.add_line(f3, f4)
-        line_f45 = gmsh.model.occ.add_line(f4, f5)
-        line_f50 = gmsh.model.occ.add_line(f5, f0)
-
-        #create loop, plane, volume
-        loop_front_top = gmsh.model.occ.add_curve_loop([line_f01, line_f12, line_f23,
-                                                        line_f34, line_f45, line_f50])
-        plane_front_top = gmsh.model.occ.add_plane_surface([loop_front_top])
-        volume_cut_top  = gmsh.model.occ.extrude(   dimTags     = [(2,plane_front_top)], 
-                                                    dx          = 0, 
-                                                    dy          = 0, 
-                                                    dz          = -ahm['h_overall'] )
-
-        #cut 
-        body_cut_2    = gmsh.model.occ.cut( objectDimTags   = [body[1]],
-                                            toolDimTags     = [volume_cut_top[1]],
-                                            removeObject    = True,
-                                            removeTool      = True      )
-
- 
-        # ### front - side-inward cut
-        # draw sketch on -y face, extrude all the way through full body width
-        # place points 4 and 5 beyond end of body to avoid conincident lines
-        zcen_1 = ahm['h_legs']+ ahm['r_front']
-        zcen_2  = ahm['h_overall'] - ahm['r_front']
-        y_c2 = -0.5*ahm['w_overall']
-        
-        
-        cen_xz1   = gmsh.model.occ.add_point(   x   = -(ahm['l_overall'] - ahm['r_front']), 
-                                                y   =  y_c2, 
-                                                z   = zcen_1,  )
-        cen_xz2   = gmsh.model.occ.add_point(   x   = -(ahm['l_overall'] - ahm['r_front']), 
-                                                y   = y_c2, 
-                                                z   = zcen_2,  )
-
-        s0 = gmsh.model.occ.add_point(  x   = -(ahm['l_overall'] - ahm['r_front']), 
-                                        y   = y_c2, 
-                                        z   = ahm['h_legs'] )
-        s1 = gmsh.model.occ.add_point(  x   = -ahm['l_overall'], 
-                                        y   = y_c2, 
-                                        z   = zcen_1)
-        s2 = gmsh.model.occ.add_point(  x   = -ahm['l_overall'], 
-                                        y   = y_c2, 
-                                        z   = zcen_2)
-        s3 = gmsh.model.occ.add_point(  x   = -(ahm['l_overall'] - ahm['r_front']), 
-                                        y   = y_c2, 
-                                        z   = ahm['h_overall'])
-        s4 = gmsh.model.occ.add_point(  x   = -(ahm['l_overall']+1), 
-                                        y   = y_c2, 
-                                        z   = ahm['h_overall'] )
-        s5 = gmsh.model.occ.add_point(  x   = -(ahm['l_overall']+1), 
-                                        y   = y_c2, 
-                                        z   = ahm['h_legs'] )
-
-        # #start from s0, create line segments
-        line_s01 = gmsh.model.occ.add_circle_arc(s0, cen_xz1, s1)
-        line_s12 = gmsh.model.occ.add_line(s1, s2)
-        line_s23 = gmsh.model.occ.add_circle_arc(s2, cen_xz2, s3)
-        line_s34 = gmsh.model.occ.add_line(s3, s4)
-        line_s45 = gmsh.model.occ.add_line(s4, s5)
-        line_s50 = gmsh.model.occ.add_line(s5, s0)
-
-        loop_front_side = gmsh.model.occ.add_curve_loop([line_s01, line_s12, line_s23,
-                                                        line_s34, line_s45, line_s50])
-        plane_front_side = gmsh.model.occ.add_plane_surface([loop_front_side])
-        volume_cut_side  = gmsh.model.occ.extrude(  dimTags     = [(2,plane_front_side)], 
-                                                    dx          = 0, 
-                                                    dy          = ahm['w_overall'], 
-                                                    dz          = 0 )
-
-        body_cut_3    = gmsh.model.occ.cut(   objectDimTags   = [body[1]],
-                                            toolDimTags     = [volume_cut_side[1]],
-                                            removeObject    = True,
-                                            removeTool      = True      )
-
-        #get all points, set mesh size
-        points = gmsh.model.occ.getEntities(0)
-        gmsh.model.occ.mesh.setSize(points, self.gmsh_mesh_size)
-
-        gmsh.model.occ.synchronize()
-        gmsh.model.mesh.generate(2)
-        fn_vtk = os.path.join( self.save_path, 'body_full.vtk')
-        fn_msh = os.path.join( self.save_path, 'body_full.msh')
-        gmsh.write(fn_vtk)
-        gmsh.write(fn_msh)
-
-        gmsh.finalize()
-
-    def body_surface_stl_separate(self):
-
-        gmsh.initialize()
-        gmsh.clear()
-        gmsh.option.setString("Geometry.OCCTargetUnit", "M")
-        fn_read = os.path.join(self.save_path, 'body_full.msh')
-
-        gmsh.open(fn_read)
-        surfaces = gmsh.model.getEntities(2)
-
-        n_surf = len(surfaces)
-        for iSurf in np.arange(n_surf):
-            gmsh.clear()
-            gmsh.open(fn_read)
-            volumes = gmsh.model.getEntities(3)
-            n_volumes = len(volumes)
-            for iVol in np.arange(n_volumes):
-                gmsh.model.removeEntities( [volumes[iVol]], recursive=False)
-
-            for iRemove in np.arange(n_surf):
-                if iRemove != iSurf:
-                    gmsh.model.removeEntities( [surfaces[iRemove]], recursive=True)
-
-            gmsh.model.mesh.generate(2)
-
-            fn_save = os.path.join(self.save_path, 'wallAhmed_{:1.0f}.stl'.format(iSurf))
-            gmsh.write(fn_save)
-        gmsh.finalize()
+        return body[1]
+
+    def _add_slant_wedge(self, ahm):
+        '''Make the wedge cutting the slant, returns its volume dimTag'''
+
+        w0  = gmsh.model.occ.add_point( x   = 0, 
+                                        y   = -0.5*ahm['w_overall'], 
+                                        z   = ahm['h_overall'],)
+        w1  = gmsh.model.occ.add_point( x   = 0, 
+                                        y   = -0.5*ahm['w_overall'], 
+                                        z   = ahm['h_overall']-ahm['dz_cut'],)
+
+        w2  = gmsh.model.occ.add_point( x   = -ahm['dx_cut'], 
+                                        y   = -0.5*ahm['w_overall'],
+                                        z   = ahm['h_overall'],)
+
+        line_w01 = gmsh.model.occ.add_line(w0, w1)
+        line_w12 = gmsh.model.occ.add_line(w1, w2)
+        line_w20 = gmsh.model.occ.add_line(w2, w0)
+
+        loop_wedge  = gmsh.model.occ.add_curve_loop([line_w01, line_w12, line_w20])
+        plane_wedge = gmsh.model.occ.add_plane_surface([loop_wedge])
+        wedge_cut   = gmsh.model.occ.extrude(   dimTags     = [(2,plane_wedge)], 
+                                                dx          = 0, 
+                                                dy          = ahm['w_overall'], 
+                                                dz          = 0 )
+        return wedge_cut[1]
 
 ########################################################################################################################
 
@@ -1280,13 +869,126 @@ def get_body_dims_mm(   w_overall       = 389,
                         dh_body         = 288,
                         l_diag          = 222,
                         slant_angle_deg = 25):
+    '''Ahmed body dimensions in mm and the dimensions derived from them (h_overall,
+    slang_angle_rad, dx_cut, dz_cut, p0_z).
+
+    Scalar calls are memoized. Any argument may also be an array, e.g. slant_angle_deg of
+    many candidate angles, then the derived dimensions are arrays broadcast over the
+    arguments, computed without a per-angle loop.
 
+    Returns
+        ahm (dict) : all arguments and derived dimensions
+    '''
     ahm = locals()
+    try:
+        return dict(_body_dims_mm_scalar(*ahm.values()))
+    except TypeError:
+        # unhashable (array) arguments
+        pass
+
+    ahm = {name : np.asarray(value) if np.ndim(value) > 0 else value for name, value in ahm.items()}
+    derived = _derive_body_dims(ahm)
+    shape = np.broadcast(*derived.values()).shape
+    ahm.update({name : np.broadcast_to(value, shape) for name, value in derived.items()})
+    return ahm
+
+def _derive_body_dims(ahm):
+    h_overall       = ahm['h_legs'] + ahm['dh_body']
+    slang_angle_rad = ahm['slant_angle_deg'] * np.pi / 180
+    dz_cut          = ahm['l_diag'] * np.sin(slang_angle_rad)
+    return {'h_overall'         : h_overall,
+            'slang_angle_rad'   : slang_angle_rad,
+            'dx_cut'            : ahm['l_diag'] * np.cos(slang_angle_rad),
+            'dz_cut'            : dz_cut,
+            'p0_z'              : h_overall - dz_cut, }
+
+@functools.lru_cache(maxsize = 4096, typed = True)
+def _body_dims_mm_scalar(*values):
+    ahm = dict(zip(_BODY_DIMS_ARGS, values))
+    ahm.update(_derive_body_dims(ahm))
+    return ahm
+
+_BODY_DIMS_ARGS = get_body_dims_mm.__code__.co_varnames[:get_body_dims_mm.__code__.co_argcount]
 
-    ahm['h_overall'] = ahm['h_legs'] + ahm['dh_body']
-    ahm['slang_angle_rad'] = ahm['slant_angle_deg'] * np.pi / 180
-    ahm['dx_cut']   = ahm['l_diag'] * np.cos( ahm['slang_angle_rad'])
-    ahm['dz_cut']   = ahm['l_diag'] * np.sin( ahm['slang_angle_rad'])
-    ahm['p0_z']     = ahm['h_overall'] - ahm['dz_cut']
+########################################################################################################################
 
-    return ahm
\ No newline at end of file
+def get_model_nodes():
+    '''Return all mesh nodes of the current gmsh model, sorted by node tag
+
+    Returns
+        node_tags (np.ndarray)  : (n_nodes,) sorted node tags
+        coords (np.ndarray)     : (n_nodes, 3) node coordinates, ordered as node_tags
+    '''
+    node_tags, coords, _ = gmsh.model.mesh.getNodes()
+    coords  = np.asarray(coords).reshape(-1, 3)
+    order   = np.argsort(node_tags)
+    return np.asarray(node_tags)[order], coords[order]
+
+def get_mesh_counts():
+    '''Number of nodes and triangles of the current gmsh model'''
+
+    node_tags, _, _ = gmsh.model.mesh.getNodes()
+    elem_types, elem_tags, _ = gmsh.model.mesh.getElements(2)
+    n_triangles = sum(len(tags) for elem_type, tags in zip(elem_types, elem_tags) if elem_type == 2)
+    return {'n_nodes' : len(node_tags), 'n_triangles' : n_triangles}
+
+def get_surface_triangles(surface_tag = -1, nodes = None):
+    '''Return the triangles of a meshed surface of the current gmsh model as arrays
+
+    Args
+        surface_tag (int)   : surface entity tag, -1 for all surfaces
+        nodes (tuple)       : output of get_model_nodes(), pass in when extracting many surfaces
+    Returns
+        points (np.ndarray)     : (n_points, 3) coordinates of the nodes used by the surface
+        triangles (np.ndarray)  : (n_triangles, 3) zero-based indices into points
+    '''
+    if nodes is None:
+        nodes = get_model_nodes()
+    node_tags, coords = nodes
+
+    # element type 2 is the 3-node triangle
+    elem_types, _, elem_node_tags = gmsh.model.mesh.getElements(2, surface_tag)
+    tri_node_tags = [np.asarray(tags) for elem_type, tags in zip(elem_types, elem_node_tags) if elem_type == 2]
+    if len(tri_node_tags) == 0:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+    tri_node_tags = np.concatenate(tri_node_tags)
+
+    used_tags, triangles = np.unique(tri_node_tags, return_inverse=True)
+    points = coords[np.searchsorted(node_tags, used_tags)]
+    return points, triangles.reshape(-1, 3)
+
+def rectangle_triangulation(corners, mesh_size = None):
+    '''Structured triangulation of the planar rectangle p0, p1, p2, p3, without gmsh
+
+    The edges p0-p1 and p0-p3 are divided into ceil(length / mesh_size) equal segments
+    (a single segment if mesh_size is None) and each cell is split into two triangles,
+    wound like the curve loop p0 -> p1 -> p2 -> p3.
+
+    Args
+        corners (list)      : four corner points, p2 = p1 + p3 - p0
+        mesh_size (float)   : target edge length
+    Returns
+        points (np.ndarray)     : (n_points, 3) coordinates
+        triangles (np.ndarray)  : (n_triangles, 3) zero-based indices into points
+    '''
+    p0, p1, _, p3 = [np.asarray(corner, dtype=float) for corner in corners]
+    edge_u, edge_v = p1 - p0, p3 - p0
+
+    if mesh_size is None:
+        n_u, n_v = 1, 1
+    else:
+        n_u = max(1, int(np.ceil(np.linalg.norm(edge_u) / mesh_size)))
+        n_v = max(1, int(np.ceil(np.linalg.norm(edge_v) / mesh_size)))
+
+    u, v   = np.meshgrid(np.linspace(0, 1, n_u+1), np.linspace(0, 1, n_v+1), indexing='ij')
+    points = p0 + u.reshape(-1, 1) * edge_u + v.reshape(-1, 1) * edge_v
+
+    # lower left node of each cell, node index = i_u * (n_v+1) + i_v
+    i_u, i_v = np.meshgrid(np.arange(n_u), np.arange(n_v), indexing='ij')
+    n00 = (i_u * (n_v+1) + i_v).ravel()
+    n10 = n00 + (n_v+1)
+    n11 = n10 + 1
+    n01 = n00 + 1
+    triangles = np.concatenate([np.stack([n00, n10, n11], axis=1),
+                                np.stack([n00, n11, n01], axis=1)], axis=0)
+    return points, triangles
@@ -0,0 +1,79 @@
+import numpy as np
+
+# one ascii facet, formatted for many facets at once by repeating the template
+FACET_ASCII = ( 'facet normal %.6e %.6e %.6e\n'
+                '  outer loop\n'
+                '    vertex %.6e %.6e %.6e\n'
+                '    vertex %.6e %.6e %.6e\n'
+                '    vertex %.6e %.6e %.6e\n'
+                '  endloop\n'
+                'endfacet\n' )
+
+# binary stl facet record, 50 bytes
+FACET_BINARY_DTYPE = np.dtype([ ('normal',      '<f4', (3,)),
+                                ('vertices',    '<f4', (3, 3)),
+                                ('attribute',   '<u2'), ])
+
+def facet_normals(points, triangles):
+    '''Unit facet normals from the triangle winding, zero for degenerate triangles
+
+    Args
+        points (np.ndarray)     : (n_points, 3) coordinates
+        triangles (np.ndarray)  : (n_triangles, 3) indices into points
+    Returns
+        normals (np.ndarray) : (n_triangles, 3)
+    '''
+    vertices = points[triangles]
+    normals  = np.cross(vertices[:,1] - vertices[:,0], vertices[:,2] - vertices[:,0])
+    lengths  = np.linalg.norm(normals, axis=1, keepdims=True)
+    return normals / np.where(lengths > 0, lengths, 1)
+
+def write_solid_ascii(f, solid_name, points, triangles, chunk_size = 65536):
+    '''Write one named ascii solid to an open text file, chunk_size facets at a time'''
+
+    f.write('solid {}\n'.format(solid_name))
+    for i0 in range(0, len(triangles), chunk_size):
+        tri_chunk = triangles[i0:i0+chunk_size]
+        data = np.concatenate([ facet_normals(points, tri_chunk),
+                                points[tri_chunk].reshape(-1, 9)], axis=1)
+        f.write((FACET_ASCII * data.shape[0]) % tuple(data.ravel()))
+    f.write('endsolid {}\n'.format(solid_name))
+
+def write_solids_binary(f, solids):
+    '''Write all solids to an open binary file as a single binary stl.
+
+    Binary stl has no solid names. The facet attribute holds the solid index instead,
+    which OpenFOAM surface readers map to a region/patch index, and the solid names
+    are listed, as far as they fit, in the 80 byte header.
+    '''
+    names  = [solid[0] for solid in solids]
+    header = 'binary stl, regions: {}'.format(' '.join(names)).encode('ascii')[:80]
+    f.write(header.ljust(80, b' '))
+
+    n_facets = sum(len(solid[2]) for solid in solids)
+    f.write(np.array([n_facets], dtype='<u4').tobytes())
+    for index, (_, points, triangles) in enumerate(solids):
+        records = np.empty(len(triangles), dtype=FACET_BINARY_DTYPE)
+        records['normal']       = facet_normals(points, triangles)
+        records['vertices']     = points[triangles]
+        records['attribute']    = index
+        f.write(records.tobytes())
+
+def write_stl(fn, solids, is_binary = False):
+    '''Write one or more named solids to a single .stl file
+
+    Args
+        fn (str)            : output file
+        solids (dict/list)  : {name : (points, triangles)} or list of (name, points, triangles)
+        is_binary (bool)    : write binary stl, solid names are then only kept as region indices
+    '''
+    if isinstance(solids, dict):
+        solids = [(name, points, triangles) for name, (points, triangles) in solids.items()]
+
+    if is_binary:
+        with open(fn, 'wb') as f:
+            write_solids_binary(f, solids)
+    else:
+        with open(fn, 'w') as f:
+            for name, points, triangles in solids:
+                write_solid_ascii(f, name, points, triangles)
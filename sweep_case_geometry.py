@@ -0,0 +1,129 @@
+import os
+import sys
+import time
+import argparse
+import importlib
+import traceback
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+def generate_geometry_sweep(slant_angles,
+                            n_workers       = None,
+                            is_nolegs       = False,
+                            fn_summary      = None,
+                            **geometry_kwargs ):
+    '''Generate the geometry for many slant angles, one case per worker process.
+
+    gmsh keeps global state per process, so each case is built entirely inside a
+    single worker. A failure for one angle is recorded and does not stop the others.
+
+    Args
+        slant_angles (list of float)    : slant angles in degrees
+        n_workers (int)                 : number of worker processes, defaults to os.cpu_count()
+        is_nolegs (bool)                : use generate_case_geometry_nolegs instead of generate_case_geometry
+        fn_summary (str)                : optional path, write the summary table here as well
+        geometry_kwargs                 : passed on to generate_geometry_slant
+    Returns
+        results (list of dict) : angle, status ('ok' or 'failed'), wall_time [s] and error, in input order
+    '''
+
+    module_name = 'generate_case_geometry_nolegs' if is_nolegs else 'generate_case_geometry'
+
+    t0 = time.perf_counter()
+    results = {}
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = {executor.submit(_generate_case, module_name, angle, geometry_kwargs) : angle
+                   for angle in slant_angles}
+        for future in as_completed(futures):
+            angle = futures[future]
+            try:
+                result = future.result()
+            except Exception:
+                # worker process died (e.g. a crash inside gmsh), not raised by the case itself
+                result = {'angle'       : angle,
+                          'status'      : 'failed',
+                          'wall_time'   : time.perf_counter() - t0,
+                          'error'       : traceback.format_exc()}
+            results[angle] = result
+            print('slant_angle {:6.2f}: {:6s} {:8.2f} s'.format(result['angle'], result['status'], result['wall_time']),
+                  flush=True)
+    t_total = time.perf_counter() - t0
+
+    results = [results[angle] for angle in slant_angles]
+    summary = format_sweep_summary(results, t_total)
+    print(summary)
+    if fn_summary is not None:
+        with open(fn_summary, 'w') as f:
+            f.write(summary)
+    return results
+
+def _generate_case(module_name, angle, geometry_kwargs):
+    '''Worker: build a single case, catching any exception so it is reported per angle'''
+
+    t0 = time.perf_counter()
+    try:
+        module = importlib.import_module(module_name)
+        module.generate_geometry_slant(slant_angle_deg = angle, **geometry_kwargs)
+        status, error = 'ok', None
+    except Exception:
+        status, error = 'failed', traceback.format_exc()
+    return {'angle'     : angle,
+            'status'    : status,
+            'wall_time' : time.perf_counter() - t0,
+            'error'     : error}
+
+def format_sweep_summary(results, t_total):
+    '''Tabulate wall time per case, with totals and the traceback of any failed case'''
+
+    lines = ['{:>10s} {:>8s} {:>12s}'.format('angle', 'status', 'wall_time/s')]
+    for result in results:
+        lines.append('{:10.2f} {:>8s} {:12.2f}'.format(result['angle'], result['status'], result['wall_time']))
+
+    wall_times  = np.array([result['wall_time'] for result in results])
+    failed      = [result for result in results if result['status'] != 'ok']
+    lines.append('cases: {:d}, failed: {:d}, mean case time: {:.2f} s, sweep wall time: {:.2f} s'.format(
+                    len(results), len(failed), wall_times.mean() if len(results) else 0, t_total))
+    for result in failed:
+        lines.append('--- slant_angle {:.2f} failed:'.format(result['angle']))
+        lines.append(result['error'].rstrip())
+    return '\n'.join(lines) + '\n'
+
+def parse_angles(angles = None, angle_range = None):
+    '''Combine an explicit list of angles and/or a (start, stop, step) range, stop inclusive'''
+
+    slant_angles = []
+    if angles is not None:
+        slant_angles.extend(angles)
+    if angle_range is not None:
+        start, stop, step = angle_range
+        n_steps = int(np.floor((stop - start) / step + 1e-9))
+        slant_angles.extend(start + step * np.arange(n_steps + 1))
+    return sorted(set(round(float(angle), 2) for angle in slant_angles))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate the geometry for a sweep of slant angles in parallel')
+    parser.add_argument('angles', nargs='*', type=float, help='slant angles in degrees')
+    parser.add_argument('--range', nargs=3, type=float, metavar=('START', 'STOP', 'STEP'), dest='angle_range',
+                        help='slant angle range, stop inclusive')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--nolegs', action='store_true', help='use generate_case_geometry_nolegs')
+    parser.add_argument('--summary', default=None, help='file to write the wall time summary to')
+    parser.add_argument('--cache', default=None, help='geometry cache folder, reuse components across runs and angles')
+    parser.add_argument('--cache-max-gb', type=float, default=20, help='size bound of the geometry cache')
+    parser.add_argument('--analytic-domain', action='store_true', help='triangulate the domain planes in numpy, without gmsh')
+    parser.add_argument('--profile', action='store_true', help='record each gmsh phase in geometry/geometry_profile.jsonl')
+    args = parser.parse_args()
+
+    slant_angles = parse_angles(args.angles, args.angle_range)
+    if len(slant_angles) == 0:
+        parser.error('no slant angles given')
+
+    results = generate_geometry_sweep(  slant_angles    = slant_angles,
+                                        n_workers       = args.workers,
+                                        is_nolegs       = args.nolegs,
+                                        fn_summary      = args.summary,
+                                        cache_path      = args.cache,
+                                        cache_max_gb    = args.cache_max_gb,
+                                        is_analytic_domain = args.analytic_domain,
+                                        is_profile      = args.profile )
+    sys.exit(int(any(result['status'] != 'ok' for result in results)))
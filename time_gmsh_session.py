@@ -0,0 +1,65 @@
+import sys
+import os
+import time
+import shutil
+import tempfile
+import numpy as np
+
+from stl_generator_slant_angle import ahmed_stl_generator_v3_sym
+from generate_case_geometry import build_geometry
+
+def time_gmsh_session(  slant_angles                    = (0, 12.5, 25, 35),
+                        n_sweep                         = 200,
+                        gmsh_body_mesh_size             = 10,
+                        gmsh_legs_mesh_size             = 10,
+                        gmsh_domain_mesh_size           = None, ):
+    '''Compare the per-case wall-clock time of building the full geometry with one
+    gmsh initialize/finalize per component against a single gmsh session per case.
+
+    Cases are written to a temporary directory which is removed afterwards.
+
+    Args
+        slant_angles (list of float)    : angles to time, each built once per mode
+        n_sweep (int)                   : number of angles used to extrapolate the sweep saving
+        gmsh_*_mesh_size                : mesh sizes passed to the generator
+    Returns
+        timings (dict) : per-case wall time in seconds for 'per_component' and 'session'
+    '''
+
+    save_path_base = tempfile.mkdtemp(prefix='ahmed_session_timing_')
+    timings = {'per_component' : [], 'session' : []}
+    try:
+        for mode in timings.keys():
+            os.mkdir(os.path.join(save_path_base, mode))
+            for angle in slant_angles:
+                generator = ahmed_stl_generator_v3_sym( slant_angle_deg         = angle,
+                                                        gmsh_body_mesh_size     = gmsh_body_mesh_size,
+                                                        gmsh_legs_mesh_size     = gmsh_legs_mesh_size,
+                                                        gmsh_domain_mesh_size   = gmsh_domain_mesh_size,
+                                                        save_path_base          = os.path.join(save_path_base, mode))
+                t0 = time.perf_counter()
+                if mode == 'session':
+                    with generator:
+                        build_geometry(generator)
+                else:
+                    build_geometry(generator)
+                timings[mode].append(time.perf_counter() - t0)
+    finally:
+        shutil.rmtree(save_path_base, ignore_errors=True)
+
+    t_component = np.mean(timings['per_component'])
+    t_session   = np.mean(timings['session'])
+    print('{:>10s} {:>16s} {:>10s}'.format('angle', 'per_component/s', 'session/s'))
+    for angle, t_c, t_s in zip(slant_angles, timings['per_component'], timings['session']):
+        print('{:10.2f} {:16.3f} {:10.3f}'.format(angle, t_c, t_s))
+    print('mean per case: per_component {:.3f} s, session {:.3f} s, saving {:.3f} s ({:.1f}%)'.format(
+            t_component, t_session, t_component - t_session, 100 * (t_component - t_session) / t_component))
+    print('extrapolated saving for {:d} angles: {:.1f} s'.format(n_sweep, n_sweep * (t_component - t_session)))
+
+    return timings
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        time_gmsh_session( slant_angles = [float(angle) for angle in sys.argv[1:]])
+    else:
+        time_gmsh_session()
@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+
+from parse_solve_log import parse_solve_log, gather_log
+
+def write_synthetic_log(fn_log, n_iterations = 1500, n_ortho_corrector = 1, seed = 0):
+    '''Write a simpleFoam (kOmegaSST, forceCoeffs) log with random residuals, in the
+    OpenFOAM v2006 format, for timing and checking the log parsers'''
+
+    rng = np.random.default_rng(seed)
+    with open(fn_log, 'w') as f:
+        f.write('Starting time loop\n\n')
+        for it in range(1, n_iterations + 1):
+            r = 10**rng.uniform(-8, 0, size=32)
+            lines = ['Time = {:d}\n'.format(it)]
+            for ii, field in enumerate(['Ux', 'Uy', 'Uz']):
+                lines.append('smoothSolver:  Solving for {}, Initial residual = {:.6g}, Final residual = {:.6g}, '
+                             'No Iterations 2\n'.format(field, r[2*ii], r[2*ii+1]))
+            for ii in range(n_ortho_corrector + 1):
+                lines.append('GAMG:  Solving for p, Initial residual = {:.6g}, Final residual = {:.6g}, '
+                             'No Iterations 7\n'.format(r[6+2*ii], r[7+2*ii]))
+            lines.append('time step continuity errors : sum local = {:.6g}, global = {:.6g}, cumulative = {:.6g}\n'.format(
+                            r[20], -r[21], r[22]))
+            for ii, field in enumerate(['omega', 'k']):
+                lines.append('smoothSolver:  Solving for {}, Initial residual = {:.6g}, Final residual = {:.6g}, '
+                             'No Iterations 3\n'.format(field, r[24+2*ii], r[25+2*ii]))
+            lines.append('ExecutionTime = {:.2f} s  ClockTime = {:d} s\n\n'.format(4.1 * it, 4 * it))
+            lines.append('forceCoeffs forceCoeffs1 write:\n'
+                         '    Coefficients\n'
+                         '        Cm       : {0:.6g}\t(pressure: {0:.6g}\tviscous: 0)\n'
+                         '        Cd       : {1:.6g}\t(pressure: {1:.6g}\tviscous: 0)\n'
+                         '        Cl       : {2:.6g}\t(pressure: {2:.6g}\tviscous: 0)\n'
+                         '        Cl(f)    : {2:.6g}\n'
+                         '        Cl(r)    : {2:.6g}\n\n'.format(r[28], 0.3 + 0.01*r[29], r[30]))
+            f.writelines(lines)
+        f.write('End\n\n')
+
+def time_log_parser(n_iterations = 1500, n_repeat = 3, repo_path = None):
+    '''Compare gather_residuals.sh + gather_cd.sh against the single-pass python parser
+    on a synthetic log, and check that both extract the same values.
+
+    Returns
+        timings (dict) : best wall time in seconds for 'shell' and 'python'
+    '''
+    if repo_path is None:
+        repo_path = os.path.dirname(os.path.abspath(__file__))
+
+    save_path_base = tempfile.mkdtemp(prefix='ahmed_log_timing_')
+    case_path = os.path.join(save_path_base, 'slant_angle_25.00')
+    os.mkdir(case_path)
+    fn_log = os.path.join(case_path, 'timing_solve.log')
+    env = dict(os.environ, AHMED_SLANT_PATH = save_path_base)
+    try:
+        write_synthetic_log(fn_log, n_iterations = n_iterations)
+        timings = {'shell' : [], 'python' : []}
+        for _ in range(n_repeat):
+            t0 = time.perf_counter()
+            for script in ['gather_residuals.sh', 'gather_cd.sh']:
+                subprocess.run(['bash', os.path.join(repo_path, script), '25.00'], env=env, check=True)
+            timings['shell'].append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            history = gather_log('25.00', save_path_base = save_path_base)
+            timings['python'].append(time.perf_counter() - t0)
+
+        # shell keeps every p solve, the parser the first one per iteration
+        res_path = os.path.join(case_path, 'residuals')
+        p_shell = np.loadtxt(os.path.join(res_path, 'p.txt')).reshape(len(history), -1)[:,0]
+        is_equal = (np.allclose(np.loadtxt(os.path.join(res_path, 'ux.txt')), history['Ux_initial'])
+                    and np.allclose(p_shell, history['p_initial'])
+                    and np.allclose(np.loadtxt(os.path.join(res_path, 'continuity.txt')), history['continuity_local'])
+                    and np.allclose(np.loadtxt(os.path.join(res_path, 'k.txt')), history['k_initial'])
+                    and np.allclose(np.loadtxt(os.path.join(res_path, 'cd.txt')), history['Cd']))
+        size_mb = os.path.getsize(fn_log) / 2**20
+    finally:
+        shutil.rmtree(save_path_base, ignore_errors=True)
+
+    timings = {mode : min(t) for mode, t in timings.items()}
+    print('log: {:d} iterations, {:.1f} MB'.format(n_iterations, size_mb))
+    print('shell (gather_residuals.sh + gather_cd.sh): {:.3f} s'.format(timings['shell']))
+    print('python (parse_solve_log.py)               : {:.3f} s, {:.1f}x'.format(
+            timings['python'], timings['shell'] / timings['python']))
+    print('same values: {}'.format(is_equal))
+    return timings
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        time_log_parser(n_iterations = int(sys.argv[1]))
+    else:
+        time_log_parser()